@@ -1,15 +1,19 @@
 import os
 import json
-from typing import Dict, List
+from typing import Dict, List, Optional
 from openai import OpenAI
 from dotenv import load_dotenv
+from llm_cache import get_llm_cache
+from llm_batcher import MicroBatcher, build_batch_messages, parse_batch_response
+from rate_limits import get_rate_limiter, limited_completion
+from agents.bias_rules import SENSITIVE_LOCATIONS, SUBJECTIVE_KEYWORDS, get_bias_rule_engine
 
 load_dotenv()
 
 # Initialize Together AI Client
 client = OpenAI(
     api_key=os.environ.get("TOGETHER_API_KEY", ""),
-    base_url="https://api.together.xyz/v1"
+    base_url=os.environ.get("LLM_BASE_URL", "https://api.together.xyz/v1")  # Any OpenAI-compatible endpoint
 )
 
 # Using even cheaper model for bias checks (~$0.20 per 1M tokens)
@@ -40,9 +44,12 @@ class BiasGuard:
     Uses Groq Llama 3.3 70B for nuanced understanding, with keyword fallback.
     """
     
-    # Fallback Keywords
-    SUBJECTIVE_KEYWORDS = ["suspicious", "sketchy", "out of place", "loitering", "gang"]
-    SENSITIVE_LOCATIONS = ["Kibera", "Mathare"]
+    # Fallback Keywords (compiled with any BIAS_RULES_PATH rules in agents.bias_rules)
+    SUBJECTIVE_KEYWORDS = SUBJECTIVE_KEYWORDS
+    SENSITIVE_LOCATIONS = SENSITIVE_LOCATIONS
+
+    BIAS_FIELDS = ("bias_score", "status")
+    _batcher: Optional[MicroBatcher] = None
 
     @staticmethod
     def check(analysis: Dict) -> Dict:
@@ -55,81 +62,117 @@ class BiasGuard:
         if not api_key:
             return BiasGuard._fallback_check(analysis)
 
+        # Circuit open: keyword rules now instead of a call that is likely to fail
+        if not get_rate_limiter("together").available():
+            return BiasGuard._fallback_check(analysis)
+
         try:
-            # Construct the input for the AI
-            report_context = json.dumps({
-                "type": analysis.get("type"),
-                "severity": analysis.get("severity"),
-                "location": analysis.get("location"),
-                "summary": analysis.get("summary")
-            })
-
-            chat_completion = client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": SYSTEM_PROMPT,
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Analyze this report for bias:\n{report_context}",
-                    }
-                ],
-                model=MODEL,  # Using cost-efficient Mistral 7B
-                temperature=0,
-                response_format={"type": "json_object"},
-            )
-            
-            result = chat_completion.choices[0].message.content
-            bias_data = json.loads(result)
-            
-            # Merge AI result into analysis
-            analysis["bias_check"] = {
-                "checked": True,
-                "method": "AI_Llama_3.3",
-                "score": bias_data.get("bias_score", 0.0),
-                "status": bias_data.get("status", "Clear"),
-                "warnings": bias_data.get("warnings", []),
-                "reasoning": bias_data.get("reasoning", "")
-            }
+            report_context = BiasGuard._report_context(analysis)
+
+            # Same report context at temperature=0 gives the same verdict; reuse it
+            cache = get_llm_cache()
+            cache_key = cache.make_key(report_context, MODEL, SYSTEM_PROMPT)
+            bias_data = cache.get(cache_key)
+            if bias_data is None:
+                bias_data = BiasGuard._complete(report_context)
+                cache.set(cache_key, bias_data)
             
-            return analysis
+            return BiasGuard._merge(analysis, bias_data)
 
         except Exception as e:
             print(f"BiasGuard AI Error: {e}. Reverting to fallback.")
             return BiasGuard._fallback_check(analysis)
 
     @staticmethod
-    def _fallback_check(analysis: Dict) -> Dict:
+    async def check_async(analysis: Dict) -> Dict:
         """
-        Keyword-based fallback if AI service is unavailable.
+        Same as check(), but concurrent callers share one micro-batched completion.
         """
-        warnings = []
-        bias_score = 0.0
-        
-        description = str(analysis.get("summary", "")).lower() + " " + str(analysis.get("location", "")).lower()
-        
-        # 1. Subjectivity Check
-        if analysis.get("severity") in ["High", "Critical"]:
-            for word in BiasGuard.SUBJECTIVE_KEYWORDS:
-                if word in description:
-                    warnings.append(f"High severity assigned with subjective keyword: '{word}'. Verify objective threat.")
-                    bias_score += 0.3
+        api_key = os.environ.get("TOGETHER_API_KEY", "")
+        if not api_key or not get_rate_limiter("together").available():
+            return BiasGuard._fallback_check(analysis)
+
+        try:
+            report_context = BiasGuard._report_context(analysis)
+            cache = get_llm_cache()
+            cache_key = cache.make_key(report_context, MODEL, SYSTEM_PROMPT)
+            bias_data = await cache.get_async(cache_key)
+            if bias_data is None:
+                if BiasGuard._batcher is None:
+                    BiasGuard._batcher = MicroBatcher(BiasGuard._complete_batch, BiasGuard._complete, name="bias_guard",
+                                                       limiter=get_rate_limiter("together"))
+                bias_data = await BiasGuard._batcher.submit(report_context)
+                await cache.set_async(cache_key, bias_data)
+
+            return BiasGuard._merge(analysis, bias_data)
+
+        except Exception as e:
+            print(f"BiasGuard AI Error: {e}. Reverting to fallback.")
+            return BiasGuard._fallback_check(analysis)
+
+    @staticmethod
+    def _report_context(analysis: Dict) -> str:
+        """Construct the input for the AI"""
+        return json.dumps({
+            "type": analysis.get("type"),
+            "severity": analysis.get("severity"),
+            "location": analysis.get("location"),
+            "summary": analysis.get("summary")
+        })
+
+    @staticmethod
+    def _complete(report_context: str) -> Dict:
+        chat_completion = limited_completion(
+            "together", "bias_guard", "single", client.chat.completions,
+            messages=[
+                {
+                    "role": "system",
+                    "content": SYSTEM_PROMPT,
+                },
+                {
+                    "role": "user",
+                    "content": f"Analyze this report for bias:\n{report_context}",
+                }
+            ],
+            model=MODEL,  # Using cost-efficient Mistral 7B
+            temperature=0,
+            response_format={"type": "json_object"},
+        )
         
-        # 2. Location Bias Check
-        for loc in BiasGuard.SENSITIVE_LOCATIONS:
-            if loc.lower() in description and analysis.get("severity") == "Critical":
-                 warnings.append(f"Critical severity in sensitive zone '{loc}'. Ensure severity matches specific threat indicators.")
-                 bias_score += 0.2
+        result = chat_completion.choices[0].message.content
+        return json.loads(result)
 
-        bias_score = min(bias_score, 1.0)
+    @staticmethod
+    def _complete_batch(report_contexts: List[str]) -> List[Optional[Dict]]:
+        """Check several reports with one completion; malformed items come back as None"""
+        chat_completion = limited_completion(
+            "together", "bias_guard", "batch", client.chat.completions,
+            messages=build_batch_messages(SYSTEM_PROMPT, [json.loads(context) for context in report_contexts]),
+            model=MODEL,
+            temperature=0,
+            response_format={"type": "json_object"},
+        )
         
+        result = chat_completion.choices[0].message.content
+        return parse_batch_response(result, len(report_contexts), BiasGuard.BIAS_FIELDS)
+
+    @staticmethod
+    def _merge(analysis: Dict, bias_data: Dict) -> Dict:
+        """Merge AI result into analysis"""
         analysis["bias_check"] = {
             "checked": True,
-            "method": "Keyword_Fallback",
-            "score": bias_score,
-            "warnings": warnings,
-            "status": "Flagged" if bias_score > 0.4 else "Clear"
+            "method": "AI_Llama_3.3",
+            "score": bias_data.get("bias_score", 0.0),
+            "status": bias_data.get("status", "Clear"),
+            "warnings": bias_data.get("warnings", []),
+            "reasoning": bias_data.get("reasoning", "")
         }
-        
+        return analysis
+
+    @staticmethod
+    def _fallback_check(analysis: Dict) -> Dict:
+        """
+        Keyword-based fallback if AI service is unavailable.
+        """
+        analysis["bias_check"] = get_bias_rule_engine().score(analysis)
         return analysis
@@ -0,0 +1,241 @@
+"""
+Bias Rule Engine for Community Shield
+Compiles BiasGuard's subjective-language and sensitive-location lists, plus
+operator-supplied JSON rule files, into one word-boundary-aware regular
+expression (an alternation of every pattern, longest first).
+Used by BiasGuard._fallback_check; rule files are hot-reloaded on change.
+
+Rule file format (BIAS_RULES_PATH), a JSON list or {"rules": [...]}:
+    {"id": "subjective:thug", "patterns": ["thug", "thugs"],
+     "severities": ["High", "Critical"], "weight": 0.3,
+     "message": "High severity assigned with subjective keyword: '{pattern}'. Verify objective threat."}
+"""
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Pattern, Sequence, Tuple
+
+BIAS_RULES_PATH = os.environ.get("BIAS_RULES_PATH", "")
+BIAS_RULES_CHECK_INTERVAL = float(os.environ.get("BIAS_RULES_CHECK_INTERVAL", "2.0"))
+BIAS_FLAG_THRESHOLD = 0.4
+
+SUBJECTIVE_KEYWORDS = ["suspicious", "sketchy", "out of place", "loitering", "gang"]
+SENSITIVE_LOCATIONS = ["Kibera", "Mathare"]
+
+SUBJECTIVE_MESSAGE = "High severity assigned with subjective keyword: '{pattern}'. Verify objective threat."
+LOCATION_MESSAGE = "Critical severity in sensitive zone '{pattern}'. Ensure severity matches specific threat indicators."
+
+_VERDICTS_MAX = 4096  # Distinct (matches, severity) outcomes remembered per rule set
+
+
+class BiasRule(NamedTuple):
+    id: str
+    patterns: Tuple[str, ...]
+    severities: Tuple[str, ...]  # Empty means any severity
+    weight: float
+    message: str
+
+
+def builtin_rules() -> List[BiasRule]:
+    """The keyword lists BiasGuard has always checked."""
+    rules = [
+        BiasRule(f"subjective:{word}", (word,), ("High", "Critical"), 0.3, SUBJECTIVE_MESSAGE)
+        for word in SUBJECTIVE_KEYWORDS
+    ]
+    rules += [
+        BiasRule(f"location:{loc.lower()}", (loc,), ("Critical",), 0.2, LOCATION_MESSAGE)
+        for loc in SENSITIVE_LOCATIONS
+    ]
+    return rules
+
+
+def load_rule_file(path: str) -> List[BiasRule]:
+    """Parse a JSON rule file; raises ValueError on malformed rules."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    entries = data.get("rules", []) if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        raise ValueError("rule file must be a list or an object with a 'rules' list")
+
+    rules = []
+    for position, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError(f"rule {position} is not an object")
+        patterns = entry.get("patterns") or ([entry["pattern"]] if entry.get("pattern") else [])
+        if not isinstance(patterns, list):
+            raise ValueError(f"rule {position}: patterns must be a list")
+        if not patterns:
+            raise ValueError(f"rule {position} has no patterns")
+        severities = entry.get("severities", [])
+        if not isinstance(severities, list):
+            raise ValueError(f"rule {position}: severities must be a list")
+        message = str(entry.get("message", SUBJECTIVE_MESSAGE))
+        try:
+            # Formatted on every match: a bad placeholder must fail here, not while scoring
+            message.format(pattern=str(patterns[0]))
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"rule {position}: bad message template ({e!r}); only {{pattern}} is available")
+        rules.append(BiasRule(
+            id=str(entry.get("id", f"{os.path.basename(path)}:{position}")),
+            patterns=tuple(str(p) for p in patterns),
+            severities=tuple(str(s) for s in severities),
+            weight=float(entry.get("weight", 0.3)),
+            message=message,
+        ))
+    return rules
+
+
+class _CompiledRules(NamedTuple):
+    rules: Tuple[BiasRule, ...]
+    regex: Optional[Pattern]
+    # Lowercased pattern -> every (rule index, pattern) a match of it counts for
+    hits: Dict[str, Tuple[Tuple[int, str], ...]]
+    patterns: int
+    # (matched patterns, severity) -> (score, warnings): few distinct outcomes, many reports
+    verdicts: Dict[Tuple[FrozenSet[str], Optional[str]], Tuple[float, Tuple[str, ...]]]
+
+
+def _alternative(key: str) -> str:
+    """A pattern as a regex branch: word boundaries only on edges that are word characters
+    ("gang" does not match "Gangway", "c/o" still matches mid-word)."""
+    start = r"\b" if key[0].isalnum() or key[0] == "_" else ""
+    end = r"\b" if key[-1].isalnum() or key[-1] == "_" else ""
+    return start + re.escape(key) + end
+
+
+def compile_rules(rules: Sequence[BiasRule]) -> _CompiledRules:
+    owners: Dict[str, List[Tuple[int, str]]] = {}
+    for index, rule in enumerate(rules):
+        for pattern in rule.patterns:
+            key = pattern.lower().strip()
+            if key:
+                owners.setdefault(key, []).append((index, pattern))
+    if not owners:
+        return _CompiledRules(tuple(rules), None, {}, 0, {})
+
+    branches = {key: _alternative(key) for key in owners}
+    # Matches do not overlap, so a longer pattern hides the patterns inside it ("gang" in
+    # "gang violence"); a match of it counts for those as well
+    hits = {
+        key: tuple(hit for other in owners if other == key or re.search(branches[other], key)
+                   for hit in owners[other])
+        for key in owners
+    }
+    regex = re.compile("|".join(branches[key] for key in sorted(owners, key=len, reverse=True)))
+    return _CompiledRules(tuple(rules), regex, hits, sum(len(hit) for hit in owners.values()), {})
+
+
+class BiasRuleEngine:
+    """
+    Scores incident analyses against the compiled rules. Each rule counts at
+    most once per incident, when the incident's severity is one the rule
+    applies to.
+    """
+
+    def __init__(self, rules_path: Optional[str] = BIAS_RULES_PATH,
+                 check_interval: float = BIAS_RULES_CHECK_INTERVAL):
+        self.rules_path = rules_path or None
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self.reloads = 0
+        self._compiled = compile_rules(builtin_rules())
+        self.maybe_reload(force=True)
+
+    @property
+    def rules(self) -> Tuple[BiasRule, ...]:
+        return self._compiled.rules
+
+    def maybe_reload(self, force: bool = False) -> bool:
+        """Recompile if the rule file changed; a broken file keeps the previous rules."""
+        if not self.rules_path:
+            return False
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return False
+        with self._lock:
+            self._next_check = now + self.check_interval
+            try:
+                mtime = os.path.getmtime(self.rules_path)
+            except OSError:
+                mtime = None
+            if mtime == self._mtime and not force:
+                return False
+            try:
+                extra = load_rule_file(self.rules_path) if mtime is not None else []
+                # Swap in one assignment so concurrent scorers see the old or new set, never a mix
+                self._compiled = compile_rules(builtin_rules() + extra)
+                self._mtime = mtime
+                self.reloads += 1
+                if mtime is not None:
+                    print(f"🛡️ Loaded {len(extra)} bias rules from {self.rules_path}")
+                return True
+            except Exception as e:
+                self._mtime = mtime
+                print(f"❌ Bias rules error in {self.rules_path}: {e}. Keeping previous rules.")
+                return False
+
+    @staticmethod
+    def _description(analysis: Dict) -> str:
+        return str(analysis.get("summary", "")) + " " + str(analysis.get("location", ""))
+
+    def score(self, analysis: Dict) -> Dict:
+        """The bias_check dict for one analysis."""
+        self.maybe_reload()
+        compiled = self._compiled
+        keys = frozenset(compiled.regex.findall(self._description(analysis).lower()) if compiled.regex else ())
+        severity = analysis.get("severity")
+        verdict = compiled.verdicts.get((keys, severity))
+        if verdict is None:
+            verdict = self._verdict(compiled, keys, severity)
+            if len(compiled.verdicts) < _VERDICTS_MAX:
+                compiled.verdicts[(keys, severity)] = verdict
+        bias_score, warnings = verdict
+        return {
+            "checked": True,
+            "method": "Keyword_Fallback",
+            "score": bias_score,
+            "warnings": list(warnings),
+            "status": "Flagged" if bias_score > BIAS_FLAG_THRESHOLD else "Clear",
+        }
+
+    @staticmethod
+    def _verdict(compiled: _CompiledRules, keys: FrozenSet[str],
+                 severity: Optional[str]) -> Tuple[float, Tuple[str, ...]]:
+        matched: Dict[int, str] = {}
+        for key in sorted(keys):
+            for rule_index, pattern in compiled.hits[key]:
+                matched.setdefault(rule_index, pattern)
+        warnings = []
+        bias_score = 0.0
+        for rule_index in sorted(matched):
+            rule = compiled.rules[rule_index]
+            if rule.severities and severity not in rule.severities:
+                continue
+            warnings.append(rule.message.format(pattern=matched[rule_index]))
+            bias_score += rule.weight
+        return min(bias_score, 1.0), tuple(warnings)
+
+    def stats(self) -> Dict:
+        return {
+            "rules": len(self._compiled.rules),
+            "patterns": self._compiled.patterns,
+            "rules_path": self.rules_path,
+            "reloads": self.reloads,
+        }
+
+
+_engine: Optional[BiasRuleEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_bias_rule_engine() -> BiasRuleEngine:
+    """Process-wide rule engine used by BiasGuard's fallback."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = BiasRuleEngine()
+    return _engine
@@ -1,9 +1,88 @@
-import math
-from typing import List
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 from models import Incident, PatrolUnit
+from spatial_index import EARTH_RADIUS_KM, UnitIndex, haversine_km
+
+# Severity weights for batch dispatch: a kilometre of response distance on a
+# Critical incident costs four times as much as one on a Low incident
+SEVERITY_WEIGHTS = {"Critical": 4.0, "High": 3.0, "Medium": 2.0, "Low": 1.0}
+UNSERVED_PENALTY_KM = 50.0  # Cost of leaving an incident without a unit in this window
+
+# Road routing: the straight-line nearest candidates are re-ranked by travel time on the road graph
+ROUTING_CANDIDATES = int(os.environ.get("ROUTING_CANDIDATES", "25"))
+ROUTE_SIMPLIFY_METERS = float(os.environ.get("ROUTE_SIMPLIFY_METERS", "10"))
+STRAIGHT_LINE_SPEED_KMH = float(os.environ.get("STRAIGHT_LINE_SPEED_KMH", "30"))  # ETA estimate without a road graph
+
+
+def distance_matrix_km(lats1, lngs1, lats2, lngs2) -> np.ndarray:
+    """Pairwise haversine distances (len1 x len2) in kilometres."""
+    phi1 = np.radians(np.asarray(lats1, dtype=float))[:, None]
+    phi2 = np.radians(np.asarray(lats2, dtype=float))[None, :]
+    dlmb = np.radians(np.asarray(lngs2, dtype=float))[None, :] - np.radians(np.asarray(lngs1, dtype=float))[:, None]
+    a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def solve_assignment(cost: np.ndarray, deadline: float) -> Tuple[np.ndarray, bool]:
+    """
+    Min-cost assignment of rows to distinct columns (rows <= columns) using the
+    shortest-augmenting-path Hungarian method, vectorized over columns.
+    Returns (column per row, -1 if unassigned) and whether it finished before deadline.
+    Rows already augmented when the deadline hits keep an optimal partial matching.
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)    # p[j] = row (1-based) matched to column j
+    way = np.zeros(m + 1, dtype=int)
+
+    for i in range(1, n + 1):
+        if time.perf_counter() > deadline:
+            break
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            masked = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(masked)) + 1
+            delta = masked[j1 - 1]
+            used_cols = np.nonzero(used)[0]
+            u[p[used_cols]] += delta
+            v[used_cols] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    else:
+        i = n + 1
+
+    assignment = np.full(n, -1, dtype=int)
+    for j in range(1, m + 1):
+        if p[j]:
+            assignment[p[j] - 1] = j - 1
+    return assignment, i > n
+
 
 class Commander:
-    def __init__(self):
+    def __init__(self, roads=None):
+        # Optional road_graph.RoadGraph; without one, ranking and routes are straight-line
+        self.roads = roads
+
         # Initialize some dummy patrol units around Nairobi
         self.units: List[PatrolUnit] = [
             PatrolUnit(id="U-001", name="Alpha 1", lat=-1.2834, lng=36.8235, status="Idle"), # CBD
@@ -13,50 +92,260 @@ class Commander:
             PatrolUnit(id="U-005", name="Echo 5", lat=-1.2921, lng=36.8219, status="Idle"), # Upper Hill
         ]
 
+        # Location index of Idle units, updated incrementally on status/position changes
+        self.idle_index = UnitIndex()
+        self._units_by_id: Dict[str, PatrolUnit] = {}
+        for unit in self.units:
+            self._track(unit)
+
     def _calculate_distance(self, lat1, lng1, lat2, lng2):
-        # Simple Euclidean distance for demo speed (approximate)
-        return math.sqrt((lat1 - lat2)**2 + (lng1 - lng2)**2)
+        # Great-circle distance in kilometres
+        return haversine_km(lat1, lng1, lat2, lng2)
+
+    def _track(self, unit: PatrolUnit):
+        self._units_by_id[unit.id] = unit
+        if unit.status == "Idle":
+            self.idle_index.upsert(unit.id, unit.lat, unit.lng)
+        else:
+            self.idle_index.remove(unit.id)
+
+    def update_unit(self, unit_id: str, status: Optional[str] = None,
+                    lat: Optional[float] = None, lng: Optional[float] = None):
+        """Apply a status or position change to a known unit and keep the index in sync."""
+        unit = self._units_by_id.get(unit_id)
+        if unit is None:
+            return
+        if status is not None:
+            unit.status = status
+        if lat is not None and lng is not None:
+            unit.lat, unit.lng = float(lat), float(lng)
+        self._track(unit)
+
+    def on_unit_change(self, unit, origin=None):
+        """StateStore watcher: mirror a unit record into the dispatch index."""
+        known = self._units_by_id.get(unit.id)
+        if known is None:
+            known = PatrolUnit(id=unit.id, name=unit.name, lat=unit.lat, lng=unit.lng, status=unit.status,
+                               current_incident_id=unit.current_incident_id)
+            self.units.append(known)
+            self._track(known)
+            return
+        known.current_incident_id = unit.current_incident_id
+        if (known.status, known.lat, known.lng) != (unit.status, unit.lat, unit.lng):
+            self.update_unit(unit.id, unit.status, unit.lat, unit.lng)
+
+    def sync_units(self, rows: List[Dict]):
+        """
+        Reconcile with unit rows from the database.
+        Only units whose status or position changed touch the index.
+        """
+        seen = set()
+        for row in rows:
+            unit_id = str(row["id"])
+            seen.add(unit_id)
+            lat, lng = float(row["lat"]), float(row["lng"])
+            unit = self._units_by_id.get(unit_id)
+            if unit is None:
+                unit = PatrolUnit(id=unit_id, name=row.get("name", unit_id), lat=lat, lng=lng,
+                                  status=row.get("status", "Idle"),
+                                  current_incident_id=row.get("current_incident_id"))
+                self.units.append(unit)
+                self._track(unit)
+            elif unit.status != row.get("status", unit.status) or (unit.lat, unit.lng) != (lat, lng):
+                self.update_unit(unit_id, row.get("status"), lat, lng)
+
+        # Units missing from the database are no longer dispatchable
+        for unit in self.units:
+            if unit.id not in seen:
+                self.idle_index.remove(unit.id)
+        self.units = [unit for unit in self.units if unit.id in seen]
+        self._units_by_id = {unit.id: unit for unit in self.units}
+
+    def nearest_idle(self, lat: float, lng: float, k: int = 1) -> List[Tuple[float, PatrolUnit]]:
+        """The k nearest Idle units as (distance_km, unit), nearest first."""
+        return [(dist, self._units_by_id[unit_id]) for dist, unit_id in self.idle_index.nearest(lat, lng, k)]
+
+    def idle_within(self, lat: float, lng: float, radius_km: float) -> List[Tuple[float, PatrolUnit]]:
+        """All Idle units within radius_km as (distance_km, unit), nearest first."""
+        return [(dist, self._units_by_id[unit_id]) for dist, unit_id in self.idle_index.within(lat, lng, radius_km)]
+
+    def fastest_idle(self, lat: float, lng: float, k: int = 1) -> List[Tuple[float, PatrolUnit]]:
+        """
+        The k Idle units with the shortest travel time as (eta_seconds, unit), fastest first.
+        With a road graph, the ROUTING_CANDIDATES straight-line nearest are ranked by
+        road travel time; without one, ETA is straight-line distance at STRAIGHT_LINE_SPEED_KMH.
+        """
+        nearby = self.nearest_idle(lat, lng, max(k, ROUTING_CANDIDATES if self.roads is not None else k))
+        return self._rank(lat, lng, nearby, k)
+
+    async def fastest_idle_async(self, lat: float, lng: float, k: int = 1) -> List[Tuple[float, PatrolUnit]]:
+        """
+        fastest_idle() for the event loop: the index lookup stays on the loop
+        (the index changes there), the road search runs in a worker thread.
+        """
+        nearby = self.nearest_idle(lat, lng, max(k, ROUTING_CANDIDATES if self.roads is not None else k))
+        if self.roads is None or not nearby:
+            return self._rank(lat, lng, nearby, k)
+        return await asyncio.to_thread(self._rank, lat, lng, nearby, k)
+
+    def _rank(self, lat: float, lng: float, nearby: List[Tuple[float, PatrolUnit]],
+              k: int) -> List[Tuple[float, PatrolUnit]]:
+        if self.roads is None or not nearby:
+            return [(dist / STRAIGHT_LINE_SPEED_KMH * 3600, unit) for dist, unit in nearby[:k]]
+        seconds = self.roads.travel_times(lat, lng, [(unit.lat, unit.lng) for _, unit in nearby], k=k)
+        ranked = sorted((eta, i) for i, eta in enumerate(seconds) if eta is not None)
+        return [(eta, nearby[i][1]) for eta, i in ranked[:k]]
+
+    def plan_route(self, unit: PatrolUnit, lat: float, lng: float) -> List[List[float]]:
+        """Polyline from the unit to (lat, lng), along roads when a road graph is loaded; attached to the unit."""
+        unit.current_route = self._route(unit.name, unit.lat, unit.lng, lat, lng)
+        return unit.current_route
+
+    async def plan_route_async(self, unit: PatrolUnit, lat: float, lng: float) -> List[List[float]]:
+        """plan_route() with the road search in a worker thread."""
+        if self.roads is None:
+            return self.plan_route(unit, lat, lng)
+        unit.current_route = await asyncio.to_thread(self._route, unit.name, unit.lat, unit.lng, lat, lng)
+        return unit.current_route
+
+    def _route(self, name: str, from_lat: float, from_lng: float, lat: float, lng: float) -> List[List[float]]:
+        route = [[from_lat, from_lng], [lat, lng]]
+        if self.roads is not None:
+            try:
+                route = self.roads.route(from_lat, from_lng, lat, lng, tolerance_m=ROUTE_SIMPLIFY_METERS).polyline
+            except ValueError as e:
+                print(f"⚠️ Routing failed for {name}: {e}")
+        return route
+
+    def assign_batch(self, incidents: List[Dict], units: Optional[List[PatrolUnit]] = None,
+                     time_budget_ms: float = 50.0, commit: bool = True) -> Dict:
+        """
+        Severity-weighted optimal assignment for a window of pending incidents.
+        incidents are dicts with id, lat, lng and severity; units defaults to every Idle unit.
+        Minimizes sum(weight * distance_km) instead of serving incidents one at a time, and
+        reports the greedy nearest-unit baseline for the same window alongside.
+        """
+        started = time.perf_counter()
+        if units is None:
+            units = [unit for unit in self.units if unit.status == "Idle"]
+
+        result = {
+            "assignments": [],
+            "unassigned": [incident["id"] for incident in incidents],
+            "total_distance_km": 0.0,
+            "greedy_distance_km": 0.0,
+            "weighted_cost": 0.0,
+            "greedy_weighted_cost": 0.0,
+            "solver": "hungarian",
+            "elapsed_ms": 0.0,
+        }
+        if not incidents or not units:
+            return result
+
+        weights = np.array([SEVERITY_WEIGHTS.get(incident.get("severity"), 2.0) for incident in incidents])
+        distances = distance_matrix_km(
+            [incident["lat"] for incident in incidents], [incident["lng"] for incident in incidents],
+            [unit.lat for unit in units], [unit.lng for unit in units],
+        )
+        n, m = distances.shape
+
+        # Dummy "unserved" columns let the solver leave the lowest-severity incidents waiting
+        # when there are more incidents than units
+        cost = weights[:, None] * distances
+        if n > m:
+            cost = np.hstack([cost, np.repeat((weights * UNSERVED_PENALTY_KM)[:, None], n - m, axis=1)])
+
+        deadline = started + time_budget_ms / 1000
+        columns, finished = solve_assignment(cost, deadline)
+        if not finished:
+            result["solver"] = "hungarian+greedy"
+            taken = set(int(c) for c in columns if c >= 0)
+            for i in np.argsort(-weights, kind="stable"):
+                if columns[i] >= 0:
+                    continue
+                free = [j for j in range(m) if j not in taken]
+                if not free:
+                    break
+                j = min(free, key=lambda col: distances[i, col])
+                columns[i] = j
+                taken.add(j)
+
+        assignments, unassigned = [], []
+        for i, j in enumerate(columns):
+            if 0 <= j < m:
+                assignments.append((incidents[i]["id"], units[j].id, float(distances[i, j])))
+                result["weighted_cost"] += float(cost[i, j])
+            else:
+                unassigned.append(incidents[i]["id"])
+                result["weighted_cost"] += float(weights[i] * UNSERVED_PENALTY_KM)
+
+        # Greedy baseline: arrival order, nearest free unit
+        free = set(range(m))
+        for i in range(n):
+            if not free:
+                result["greedy_weighted_cost"] += float(weights[i] * UNSERVED_PENALTY_KM)
+                continue
+            j = min(free, key=lambda col: distances[i, col])
+            free.discard(j)
+            result["greedy_distance_km"] += float(distances[i, j])
+            result["greedy_weighted_cost"] += float(cost[i, j])
+
+        if commit:
+            self._commit(assignments)
+
+        result["assignments"] = assignments
+        result["unassigned"] = unassigned
+        result["total_distance_km"] = sum(dist for _, _, dist in assignments)
+        result["elapsed_ms"] = (time.perf_counter() - started) * 1000
+        return result
+
+    async def assign_batch_async(self, incidents: List[Dict], time_budget_ms: float = 50.0,
+                                 commit: bool = True) -> Dict:
+        """
+        assign_batch() for the event loop: the Idle units are picked on the loop,
+        the solver runs in a worker thread and the assignments are committed
+        back on the loop, so the index is only ever changed there. Incidents
+        whose unit stopped being Idle while the solver ran are listed under
+        "preempted" instead of "assignments".
+        """
+        units = [unit for unit in self.units if unit.status == "Idle"]
+        result = await asyncio.to_thread(self.assign_batch, incidents, units, time_budget_ms, False)
+        assignments, result["preempted"] = [], []
+        for incident_id, unit_id, distance_km in result["assignments"]:
+            unit = self._units_by_id.get(unit_id)
+            if unit is not None and unit.status == "Idle":
+                assignments.append((incident_id, unit_id, distance_km))
+            else:
+                result["preempted"].append(incident_id)
+        result["assignments"] = assignments
+        if commit:
+            self._commit(result["assignments"])
+        return result
+
+    def _commit(self, assignments: List[Tuple[str, str, float]]):
+        for incident_id, unit_id, _ in assignments:
+            self.update_unit(unit_id, status="EnRoute")
+            self._units_by_id[unit_id].current_incident_id = incident_id
 
     def assign_unit(self, incident: Incident):
-        """Finds the nearest Idle unit and assigns it to the incident."""
+        """Finds the fastest Idle unit to reach the incident and assigns it."""
         if incident.status != "New":
             return None
 
-        nearest_unit = None
-        min_dist = float('inf')
-
-        for unit in self.units:
-            if unit.status == "Idle":
-                dist = self._calculate_distance(incident.lat, incident.lng, unit.lat, unit.lng)
-                if dist < min_dist:
-                    min_dist = dist
-                    nearest_unit = unit
+        fastest = self.fastest_idle(incident.lat, incident.lng)
+        nearest_unit = fastest[0][1] if fastest else None
 
         if nearest_unit:
-            nearest_unit.status = "EnRoute"
+            self.update_unit(nearest_unit.id, status="EnRoute")
             nearest_unit.current_incident_id = incident.id
             incident.status = "Assigned"
-            
-            # Simulate a route (Start -> Midpoint -> End) for visualization
-            # In a real app, this would come from OSRM/Google Maps
-            mid_lat = (nearest_unit.lat + incident.lat) / 2
-            mid_lng = (nearest_unit.lng + incident.lng) / 2
-            
-            # Add a slight curve to the route
-            mid_lat += 0.001 
-            
-            route = [
-                [nearest_unit.lat, nearest_unit.lng],
-                [mid_lat, mid_lng],
-                [incident.lat, incident.lng]
-            ]
-            
-            # Attach route to unit (dynamically for MVP visualization)
-            nearest_unit.current_route = route
-            
+            self.plan_route(nearest_unit, incident.lat, incident.lng)
             return nearest_unit
-        
+
         return None
 
     def get_units(self):
         return self.units
+
+    def get_unit(self, unit_id: str) -> Optional[PatrolUnit]:
+        return self._units_by_id.get(unit_id)
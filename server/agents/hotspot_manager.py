@@ -1,39 +1,363 @@
-import random
-from typing import List, Dict
+import asyncio
+import math
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from agents.commander import SEVERITY_WEIGHTS
+from gazetteer import NAIROBI_BOUNDS, nearest_place
+from spatial_index import KM_PER_DEG_LAT
+
+# Kernel density settings (override via .env)
+HOTSPOT_CELL_KM = float(os.environ.get("HOTSPOT_CELL_KM", "0.25"))
+HOTSPOT_BANDWIDTH_KM = float(os.environ.get("HOTSPOT_BANDWIDTH_KM", "0.5"))
+HOTSPOT_HALF_LIFE_HOURS = float(os.environ.get("HOTSPOT_HALF_LIFE_HOURS", "72"))
+HOTSPOT_RETENTION_HOURS = int(os.environ.get("HOTSPOT_RETENTION_HOURS", "168"))  # Hourly slices kept for window queries
+HOTSPOT_RISK_SCALE = float(os.environ.get("HOTSPOT_RISK_SCALE", "4.0"))  # Weighted incidents nearby for risk ~0.63
+HOTSPOT_TOP_K = int(os.environ.get("HOTSPOT_TOP_K", "10"))
+HOTSPOT_PUBLISH_INTERVAL = float(os.environ.get("HOTSPOT_PUBLISH_INTERVAL", "60"))
+HOTSPOT_WARM_LIMIT = int(os.environ.get("HOTSPOT_WARM_LIMIT", "1000"))
+
+BBox = Tuple[float, float, float, float]  # (min_lat, min_lng, max_lat, max_lng)
+
+
+def _parse_timestamp(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            return parsed.timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
 
 class HotspotManager:
     """
-    Simulates predictive analysis by generating hotspots based on 'historical' data patterns.
-    In a real app, this would query a database of past incidents + lighting data.
+    Predictive hotspots from a gridded, time-decayed kernel density estimate
+    of past incidents. Each incident adds a severity-weighted Gaussian kernel
+    to the grid in O(kernel size); decay is applied lazily through a shared
+    scale factor, so nothing is recomputed from history. Hourly slices of the
+    undecayed density answer arbitrary time-window queries.
     """
-    
-    def __init__(self):
-        # Base locations (Nairobi)
-        self.base_hotspots = [
-            {"name": "Globe Cinema Roundabout", "lat": -1.2810, "lng": 36.8150, "risk_factor": "Lighting"},
-            {"name": "River Road Junction", "lat": -1.2850, "lng": 36.8280, "risk_factor": "History"},
-            {"name": "Uhuru Park Corner", "lat": -1.2900, "lng": 36.8180, "risk_factor": "Social Sentiment"},
-            {"name": "Ngong Road/Prestige", "lat": -1.3000, "lng": 36.7800, "risk_factor": "Traffic Pattern"},
-        ]
+
+    def __init__(self, bounds: BBox = NAIROBI_BOUNDS, cell_km: float = HOTSPOT_CELL_KM,
+                 bandwidth_km: float = HOTSPOT_BANDWIDTH_KM, half_life_hours: float = HOTSPOT_HALF_LIFE_HOURS,
+                 retention_hours: int = HOTSPOT_RETENTION_HOURS, risk_scale: float = HOTSPOT_RISK_SCALE):
+        self.bounds = bounds
+        min_lat, min_lng, max_lat, max_lng = bounds
+        self.dlat = cell_km / KM_PER_DEG_LAT
+        self.dlng = cell_km / (KM_PER_DEG_LAT * math.cos(math.radians((min_lat + max_lat) / 2)))
+        self.rows = int(math.ceil((max_lat - min_lat) / self.dlat))
+        self.cols = int(math.ceil((max_lng - min_lng) / self.dlng))
+        self.decay_rate = math.log(2) / (half_life_hours * 3600)
+        self.retention_hours = retention_hours
+        self.risk_scale = risk_scale
+
+        # Gaussian kernel out to 3 bandwidths, peak 1.0 so density reads as "weighted incidents nearby"
+        radius = max(1, int(math.ceil(3 * bandwidth_km / cell_km)))
+        offsets = np.arange(-radius, radius + 1) * cell_km
+        self.kernel_radius = radius
+        self.kernel = np.exp(-(offsets[:, None] ** 2 + offsets[None, :] ** 2) / (2 * bandwidth_km ** 2))
+
+        # density * exp(-decay_rate * (now - reference_time)) is the decayed density at `now`
+        self.density = np.zeros((self.rows, self.cols))
+        self.reference_time = time.time()
+        self.counts = np.zeros((self.rows, self.cols), dtype=np.int32)
+        self.last_incident = np.zeros((self.rows, self.cols))
+        self.slices: Dict[int, np.ndarray] = {}  # hour -> undecayed density of incidents in that hour
+
+        self.incidents = 0
+        self._rows_by_cell: Dict[Tuple[int, int], str] = {}  # Published hotspot row per grid cell
+        self._spare_rows: List[str] = []
+        self._published: Dict[str, Dict] = {}  # Row id -> columns as last written
+        self._task: Optional[asyncio.Task] = None
+
+    # --- grid -----------------------------------------------------------
+    def cell_of(self, lat: float, lng: float) -> Optional[Tuple[int, int]]:
+        min_lat, min_lng, _, _ = self.bounds
+        row = int((lat - min_lat) / self.dlat)
+        col = int((lng - min_lng) / self.dlng)
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row, col
+        return None
+
+    def cell_center(self, row: int, col: int) -> Tuple[float, float]:
+        min_lat, min_lng, _, _ = self.bounds
+        return min_lat + (row + 0.5) * self.dlat, min_lng + (col + 0.5) * self.dlng
+
+    def _window(self, row: int, col: int):
+        """Grid slice covered by the kernel centred on (row, col), and the matching kernel slice."""
+        r = self.kernel_radius
+        r0, r1 = max(row - r, 0), min(row + r + 1, self.rows)
+        c0, c1 = max(col - r, 0), min(col + r + 1, self.cols)
+        grid = (slice(r0, r1), slice(c0, c1))
+        kernel = (slice(r0 - row + r, r1 - row + r), slice(c0 - col + r, c1 - col + r))
+        return grid, kernel
+
+    def _bbox_slice(self, bbox: Optional[BBox]):
+        if bbox is None:
+            return slice(0, self.rows), slice(0, self.cols)
+        min_lat, min_lng, max_lat, max_lng = bbox
+        b_min_lat, b_min_lng, _, _ = self.bounds
+        r0 = max(int((min_lat - b_min_lat) / self.dlat), 0)
+        r1 = min(int((max_lat - b_min_lat) / self.dlat) + 1, self.rows)
+        c0 = max(int((min_lng - b_min_lng) / self.dlng), 0)
+        c1 = min(int((max_lng - b_min_lng) / self.dlng) + 1, self.cols)
+        return slice(r0, max(r0, r1)), slice(c0, max(c0, c1))
+
+    # --- updates --------------------------------------------------------
+    def add_incident(self, lat, lng, severity: str = "Medium", timestamp=None) -> bool:
+        """Add one incident to the estimate. Returns False if it falls outside the grid."""
+        if lat is None or lng is None:
+            return False
+        cell = self.cell_of(float(lat), float(lng))
+        if cell is None:
+            return False
+        ts = _parse_timestamp(timestamp)
+        weight = SEVERITY_WEIGHTS.get(severity, 2.0)
+
+        # Rebase before exp() overflows; O(grid) but only once per ~50 half-lives' worth of drift
+        exponent = self.decay_rate * (ts - self.reference_time)
+        if exponent > 50:
+            self.density *= math.exp(-exponent)
+            self.reference_time = ts
+            exponent = 0.0
+
+        grid, kernel = self._window(*cell)
+        contribution = weight * self.kernel[kernel]
+        self.density[grid] += contribution * math.exp(exponent)
+
+        hour = int(ts // 3600)
+        if hour > time.time() // 3600 - self.retention_hours:
+            if hour not in self.slices:
+                self.slices[hour] = np.zeros((self.rows, self.cols), dtype=np.float32)
+                self._prune_slices()
+            self.slices[hour][grid] += contribution
+
+        self.counts[cell] += 1
+        self.last_incident[cell] = max(self.last_incident[cell], ts)
+        self.incidents += 1
+        return True
+
+    def _prune_slices(self):
+        oldest = int(time.time() // 3600) - self.retention_hours
+        for hour in [h for h in self.slices if h <= oldest]:
+            del self.slices[hour]
+
+    def _reset(self):
+        self.density[:] = 0
+        self.reference_time = time.time()
+        self.counts[:] = 0
+        self.last_incident[:] = 0
+        self.slices = {}
+        self.incidents = 0
+
+    async def warm(self, repo, limit: int = HOTSPOT_WARM_LIMIT, reset: bool = False) -> int:
+        """Seed the grid from the most recent incidents in the database (replacing it, if reset)."""
+        try:
+            rows = await repo.list_incidents(limit=limit)
+        except Exception as e:
+            print(f"Error loading incident history for hotspots: {e}")
+            return 0
+        if reset:
+            self._reset()
+        added = sum(
+            1 for row in reversed(rows)
+            if self.add_incident(row.get("lat"), row.get("lng"), row.get("severity"), row.get("created_at"))
+        )
+        if not reset:
+            print(f"🔥 Hotspot engine warmed with {added} incidents")
+        return added
+
+    # --- queries --------------------------------------------------------
+    def density_at(self, now: Optional[float] = None, bbox: Optional[BBox] = None,
+                   start: Optional[float] = None, end: Optional[float] = None) -> Tuple[np.ndarray, int, int]:
+        """
+        Decayed density over bbox as (grid, row_offset, col_offset).
+        With start/end (epoch seconds) only incidents in that window count,
+        at hourly resolution, decayed relative to the window end.
+        """
+        rows, cols = self._bbox_slice(bbox)
+        if start is None and end is None:
+            now = time.time() if now is None else now
+            grid = self.density[rows, cols] * math.exp(-self.decay_rate * (now - self.reference_time))
+            return grid, rows.start, cols.start
+
+        end = time.time() if end is None else end
+        start = 0.0 if start is None else start
+        first, last = int(start // 3600), int(end // 3600)
+        grid = np.zeros((rows.stop - rows.start, cols.stop - cols.start))
+        for hour, hourly in self.slices.items():
+            if first <= hour <= last:
+                age = max(end - (hour + 0.5) * 3600, 0.0)
+                grid += hourly[rows, cols] * math.exp(-self.decay_rate * age)
+        return grid, rows.start, cols.start
+
+    def risk(self, density):
+        """Map weighted-incident density to a 0-1 risk score."""
+        return 1.0 - np.exp(-np.asarray(density) / self.risk_scale)
+
+    def query(self, bbox: Optional[BBox] = None, start: Optional[float] = None, end: Optional[float] = None,
+              k: int = HOTSPOT_TOP_K, min_risk: float = 0.05) -> List[Dict]:
+        """Top-k density peaks (local maxima, so one cluster yields one hotspot), highest risk first."""
+        grid, row0, col0 = self.density_at(bbox=bbox, start=start, end=end)
+        if grid.size == 0 or k <= 0:
+            return []
+
+        padded = np.pad(grid, 1, constant_values=-np.inf)
+        peaks = grid > 0
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                if dr or dc:
+                    neighbour = padded[1 + dr:1 + dr + grid.shape[0], 1 + dc:1 + dc + grid.shape[1]]
+                    peaks &= grid >= neighbour
+        candidates = np.flatnonzero(peaks)
+        if candidates.size == 0:
+            return []
+        values = grid.ravel()[candidates]
+        if candidates.size > k:
+            keep = np.argpartition(-values, k - 1)[:k]
+            candidates, values = candidates[keep], values[keep]
+        order = np.argsort(-values, kind="stable")
+
+        hotspots = []
+        for index in candidates[order]:
+            row, col = divmod(int(index), grid.shape[1])
+            row, col = row + row0, col + col0
+            risk_score = float(self.risk(grid.ravel()[index]))
+            if risk_score < min_risk:
+                break
+            hotspots.append(self._describe(row, col, risk_score))
+        return hotspots
+
+    def _describe(self, row: int, col: int, risk_score: float) -> Dict:
+        lat, lng = self.cell_center(row, col)
+        (r_slice, c_slice), _ = self._window(row, col)
+        last = float(self.last_incident[r_slice, c_slice].max())
+        return {
+            "cell": (row, col),
+            "location": f"Near {nearest_place(lat, lng)['name']}",
+            "lat": round(lat, 6),
+            "lng": round(lng, 6),
+            "risk_score": round(risk_score, 2),
+            "incident_count": int(self.counts[r_slice, c_slice].sum()),
+            "last_incident_at": datetime.fromtimestamp(last, timezone.utc).isoformat() if last else None,
+        }
 
     def get_predictive_hotspots(self) -> List[Dict]:
         """
         Returns a list of current high-risk zones.
         """
-        current_hotspots = []
-        
-        for spot in self.base_hotspots:
-            # Simulate dynamic risk levels
-            risk_score = random.uniform(0.6, 0.95)
-            
-            if risk_score > 0.7:
-                current_hotspots.append({
-                    "name": spot["name"],
-                    "lat": spot["lat"],
-                    "lng": spot["lng"],
-                    "risk_score": round(risk_score, 2),
-                    "reason": f"High risk detected due to {spot['risk_factor']}",
-                    "recommended_action": "Deploy visible patrol"
-                })
-                
-        return current_hotspots
+        return [
+            {
+                "name": spot["location"],
+                "lat": spot["lat"],
+                "lng": spot["lng"],
+                "risk_score": spot["risk_score"],
+                "reason": f"{spot['incident_count']} recent incidents nearby",
+                "recommended_action": "Deploy visible patrol"
+            }
+            for spot in self.query(min_risk=0.7)
+        ]
+
+    # --- publishing -----------------------------------------------------
+    async def publish(self, repo, k: int = HOTSPOT_TOP_K) -> int:
+        """
+        Write the current top-k to the hotspots table. Rows are reused: a cell
+        that stays hot keeps its row, new cells take over rows that dropped out,
+        and inserts only happen while fewer than k rows exist. Only rows whose
+        columns changed since the last publish are written, in one bulk upsert.
+        """
+        if not self._rows_by_cell and not self._spare_rows:
+            try:
+                for row in await repo.list_hotspots():
+                    self._spare_rows.append(row["id"])
+                    self._published[row["id"]] = {
+                        "location": row.get("location"), "lat": float(row["lat"]), "lng": float(row["lng"]),
+                        "risk_score": float(row["risk_score"]), "incident_count": row.get("incident_count", 0),
+                        "last_incident_at": row.get("last_incident_at"),
+                    }
+            except Exception as e:
+                print(f"Error loading hotspots: {e}")
+
+        top = self.query(k=k)
+        cells = {spot["cell"] for spot in top}
+        for cell in [cell for cell in self._rows_by_cell if cell not in cells]:
+            self._spare_rows.append(self._rows_by_cell.pop(cell))
+
+        inserts, changed = [], {}
+        for spot in top:
+            cell = spot.pop("cell")
+            row_id = self._rows_by_cell.get(cell) or (self._spare_rows.pop() if self._spare_rows else None)
+            if row_id is None:
+                inserts.append((cell, spot))
+                continue
+            self._rows_by_cell[cell] = row_id
+            if self._published.get(row_id) != spot:
+                changed[row_id] = spot
+
+        # Rows left over show zero risk rather than a stale hotspot
+        for row_id in self._spare_rows:
+            published = self._published.get(row_id)
+            if published is not None and published["risk_score"] != 0.0:
+                changed[row_id] = {**published, "risk_score": 0.0}
+
+        if changed:
+            await repo.upsert_hotspots([{"id": row_id, **spot} for row_id, spot in changed.items()])
+            self._published.update(changed)
+        if inserts:
+            created = await repo.insert_hotspots([spot for _, spot in inserts])
+            for (cell, spot), row in zip(inserts, created):
+                self._rows_by_cell[cell] = row["id"]
+                self._published[row["id"]] = spot
+        return len(top)
+
+    async def _run(self, repo, interval: float, rebuild: bool):
+        while True:
+            try:
+                if rebuild:
+                    await self.warm(repo, reset=True)
+                await self.publish(repo)
+            except Exception as e:
+                print(f"Error publishing hotspots: {e}")
+            await asyncio.sleep(interval)
+
+    def start(self, repo, interval: float = HOTSPOT_PUBLISH_INTERVAL, rebuild: bool = False):
+        """
+        Publish every interval. With rebuild the grid is reloaded from the
+        database first, for a publisher that does not see every incident
+        written (the leader in a multi-worker deployment).
+        """
+        self._task = asyncio.create_task(self._run(repo, interval, rebuild), name="hotspots")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "incidents": self.incidents,
+            "grid": [self.rows, self.cols],
+            "hourly_slices": len(self.slices),
+            "published_rows": len(self._rows_by_cell),
+        }
+
+
+_hotspot_manager: Optional[HotspotManager] = None
+
+
+def get_hotspot_manager() -> HotspotManager:
+    """Process-wide hotspot engine fed by the pipeline and the Twitter monitor."""
+    global _hotspot_manager
+    if _hotspot_manager is None:
+        _hotspot_manager = HotspotManager()
+    return _hotspot_manager
@@ -2,15 +2,16 @@ import random
 import time
 from datetime import datetime
 import uuid
+from gazetteer import coords
 
 CRIME_TYPES = ["Robbery", "Assault", "Traffic Accident", "Gunfire", "Suspicious Activity", "Medical Emergency"]
 LOCATIONS = [
-    {"name": "CBD near Archives", "lat": -1.2834, "lng": 36.8235},
-    {"name": "Westlands near Sarit", "lat": -1.2635, "lng": 36.8024},
-    {"name": "Kibera near DC", "lat": -1.3120, "lng": 36.7890},
-    {"name": "Eastleigh 1st Ave", "lat": -1.2760, "lng": 36.8480},
-    {"name": "Karen Shopping Center", "lat": -1.3200, "lng": 36.7050},
-    {"name": "Thika Road Mall", "lat": -1.2200, "lng": 36.8900},
+    {"name": "CBD near Archives", **coords("archives")},
+    {"name": "Westlands near Sarit", **coords("sarit")},
+    {"name": "Kibera near DC", **coords("kibera_dc")},
+    {"name": "Eastleigh 1st Ave", **coords("eastleigh_1st_ave")},
+    {"name": "Karen Shopping Center", **coords("karen_shopping_center")},
+    {"name": "Thika Road Mall", **coords("thika_road_mall")},
 ]
 SOURCES = ["Police Radio", "Twitter", "ShotSpotter", "Anonymous Tip"]
 
@@ -0,0 +1,90 @@
+"""
+Bias rule engine benchmark for Community Shield
+Scores synthetic incident summaries with BiasRuleEngine.score and with the
+original per-keyword substring loops, on one core.
+
+Usage (from server/):
+    python benchmarks/bias_rules.py --summaries 50000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+os.environ["DATABASE_BACKEND"] = "memory"
+
+from agents.bias_rules import SENSITIVE_LOCATIONS, SUBJECTIVE_KEYWORDS, BiasRuleEngine
+from gazetteer import AREAS, CRIME_TYPES
+
+FILLER = ["reported", "near", "the", "junction", "by", "witnesses", "vehicle", "heading", "north",
+          "two", "people", "seen", "running", "from", "shop", "after", "incident", "Gangway"]
+
+
+def make_analyses(count: int):
+    places = [area["name"] for area in AREAS.values()] + ["Mathare"]
+    words = FILLER + SUBJECTIVE_KEYWORDS
+    analyses = []
+    for _ in range(count):
+        crime_type = random.choice(list(CRIME_TYPES))
+        analyses.append({
+            "type": crime_type,
+            "severity": random.choice(["Low", "Medium", "High", "Critical"]),
+            "location": random.choice(places),
+            "summary": " ".join(random.choice(words) for _ in range(random.randint(5, 15))),
+        })
+    return analyses
+
+
+def substring_scores(analyses):
+    """The pre-automaton fallback: nested `word in description` loops."""
+    scores = []
+    for analysis in analyses:
+        score = 0.0
+        description = str(analysis.get("summary", "")).lower() + " " + str(analysis.get("location", "")).lower()
+        if analysis.get("severity") in ["High", "Critical"]:
+            for word in SUBJECTIVE_KEYWORDS:
+                if word in description:
+                    score += 0.3
+        for loc in SENSITIVE_LOCATIONS:
+            if loc.lower() in description and analysis.get("severity") == "Critical":
+                score += 0.2
+        scores.append(min(score, 1.0))
+    return scores
+
+
+def main(args):
+    random.seed(args.seed)
+    analyses = make_analyses(args.summaries)
+    engine = BiasRuleEngine(rules_path=args.rules)
+
+    started = time.perf_counter()
+    results = [engine.score(analysis) for analysis in analyses]
+    engine_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    baseline = substring_scores(analyses)
+    baseline_seconds = time.perf_counter() - started
+
+    # The substring loops also fire on "Gangway"; count where the two disagree
+    differing = sum(1 for r, b in zip(results, baseline) if abs(r["score"] - b) > 1e-9)
+    flagged = sum(1 for r in results if r["status"] == "Flagged")
+
+    print("=" * 60)
+    print(f"Bias rules: {args.summaries} summaries, {engine.stats()['patterns']} patterns")
+    print("=" * 60)
+    print(f"  rule engine      : {args.summaries / engine_seconds:12,.0f} summaries/s")
+    print(f"  substring loops  : {args.summaries / baseline_seconds:12,.0f} summaries/s")
+    print(f"  flagged          : {flagged} ({flagged / args.summaries:.1%})")
+    print(f"  scores differing : {differing} (substring false positives such as 'Gangway')")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--summaries", type=int, default=50000)
+    parser.add_argument("--rules", default=None, help="Optional JSON rule file")
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
@@ -0,0 +1,117 @@
+"""
+Dispatch contention benchmark for Community Shield
+Runs several dispatchers, each with its own state store and Commander as
+separate server replicas would have, against one shared stand-in database.
+Incidents land in a few neighbourhoods so every replica wants the same
+units. Compares claiming with the database's claim_unit compare-and-set
+against claiming in each replica's local store: units double-booked, claim
+conflicts and next-nearest retries, and dispatch throughput.
+
+Usage (from server/):
+    python benchmarks/dispatch_contention.py --replicas 1 2 4 8 --incidents 400 --units 300
+    python benchmarks/dispatch_contention.py --modes database --db-latency-ms 20 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+os.environ["DATABASE_BACKEND"] = "memory"
+os.environ.setdefault("TOGETHER_API_KEY", "benchmark")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from agents.commander import Commander
+from pipeline import CLAIMS, CLAIMED, INCIDENT_CLOSED, UNIT_TAKEN, IncidentPipeline
+from repository import InMemoryRepository
+
+# Neighbourhoods the incidents cluster around (CBD, Westlands, Kibera, Eastleigh)
+HOTSPOTS = [(-1.2834, 36.8235), (-1.2635, 36.8024), (-1.3120, 36.7890), (-1.2760, 36.8480)]
+
+
+def replica_repo(shared: InMemoryRepository, latency: float) -> InMemoryRepository:
+    """A connection of its own to the shared tables: only this replica's listeners hear its writes."""
+    repo = InMemoryRepository(latency=latency, seed=False)
+    repo.tables = shared.tables
+    return repo
+
+
+def claim_counts() -> dict:
+    return {outcome: CLAIMS.labels(outcome).value for outcome in (CLAIMED, UNIT_TAKEN, INCIDENT_CLOSED)}
+
+
+async def run(mode: str, replicas: int, args) -> dict:
+    rng = random.Random(args.seed)
+    latency = args.db_latency_ms / 1000
+    shared = InMemoryRepository(seed=False)
+
+    def near(spread):
+        lat, lng = rng.choice(HOTSPOTS)
+        return lat + rng.uniform(-spread, spread), lng + rng.uniform(-spread, spread)
+
+    await shared.insert_units([{"name": f"Unit-{i}", "status": "Idle", "lat": lat, "lng": lng}
+                               for i, (lat, lng) in enumerate(near(0.05) for _ in range(args.units))])
+    incidents = [await shared.insert_incident({"type": "Robbery", "severity": "High", "location": f"Hotspot {i}",
+                                               "lat": lat, "lng": lng})
+                 for i, (lat, lng) in enumerate(near(0.01) for _ in range(args.incidents))]
+
+    pipelines = [IncidentPipeline(replica_repo(shared, latency), Commander(), lambda *a, **k: None,
+                                  workers={"dispatch": args.workers}, claims=mode)
+                 for _ in range(replicas)]
+    for pipeline in pipelines:
+        await pipeline.state.warm()
+        pipeline.start(run_sentinel=False)
+
+    claims_before = claim_counts()
+    started = time.perf_counter()
+    for i, row in enumerate(incidents):
+        item = {"incident_id": row["id"], "raw": {}, "persisted_at": time.perf_counter(),
+                "incident": {key: row[key] for key in ("type", "severity", "location", "lat", "lng")}}
+        await pipelines[i % replicas].stages[-1].put(item)
+    for pipeline in pipelines:
+        await pipeline.join()
+    elapsed = time.perf_counter() - started
+    for pipeline in pipelines:
+        await pipeline.stop()  # Writes behind whatever local claims are still pending
+
+    claims = {outcome: int(value - claims_before[outcome]) for outcome, value in claim_counts().items()}
+    assigned = Counter(row["assigned_unit_id"] for row in shared.tables["incidents"]
+                       if row.get("assigned_unit_id") is not None)
+    double_booked = {unit_id: count for unit_id, count in assigned.items() if count > 1}
+    return {
+        "dispatched": sum(assigned.values()),
+        "double_booked_units": len(double_booked),
+        "incidents_sharing_a_unit": sum(double_booked.values()),
+        "claims": claims,
+        "per_s": len(incidents) / elapsed,
+        "elapsed_s": elapsed,
+    }
+
+
+async def main(args):
+    print(f"{args.incidents} incidents, {args.units} units around {len(HOTSPOTS)} hotspots, "
+          f"{args.workers} dispatch worker(s) per replica, {args.db_latency_ms:.0f} ms database round trip\n")
+    print(f"{'claims':>9} {'replicas':>9} {'dispatched':>11} {'double-booked':>14} {'sharing':>8} "
+          f"{'conflicts':>10} {'per s':>8}")
+    for mode in args.modes:
+        for replicas in args.replicas:
+            result = await run(mode, replicas, args)
+            print(f"{mode:>9} {replicas:>9} {result['dispatched']:>11} {result['double_booked_units']:>14} "
+                  f"{result['incidents_sharing_a_unit']:>8} {result['claims'][UNIT_TAKEN]:>10} "
+                  f"{result['per_s']:>8.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=["database", "local"], default=["database", "local"])
+    parser.add_argument("--replicas", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--incidents", type=int, default=400)
+    parser.add_argument("--units", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=2, help="Dispatch workers per replica")
+    parser.add_argument("--db-latency-ms", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,374 @@
+"""
+End-to-end benchmark suite for Community Shield
+Runs Sentinel reports through Analyst -> BiasGuard -> Persistence -> Commander
+and then the dashboard endpoints, against a fake OpenAI-compatible server
+(benchmarks/fake_llm.py) and the in-memory repository with emulated PostgREST
+latency. Reports throughput, per-stage latency percentiles and memory, and
+writes JSON that --compare diffs against an earlier run (e.g. another commit).
+
+Usage (from server/):
+    python benchmarks/e2e.py --reports 500 --output .cache/bench-base.json
+    python benchmarks/e2e.py --reports 500 --compare .cache/bench-base.json
+    python benchmarks/e2e.py --llm-only --llm-latency-ms 800 --reports 200   # Skip the gazetteer fast path
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+os.environ["DATABASE_BACKEND"] = "memory"
+os.environ["LLM_CACHE_PATH"] = ""  # Memory-only, so no run inherits another's answers
+os.environ["TOGETHER_API_KEY"] = "benchmark"
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+SUITE = "community-shield-e2e"
+SUITE_VERSION = 1
+# Absolute changes below these never count as regressions (timer and allocator noise)
+NOISE_FLOOR = {"_ms": 1.0, "_kib": 1024, "_per_s": 0.0}
+ENDPOINTS = ["/api/incidents", "/api/units", "/api/logs", "/api/hotspots", "/api/bias-checks"]
+
+
+def summarize(samples: List[float]) -> Dict:
+    """Count and latency percentiles (samples in seconds, results in ms)."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": pct(50),
+        "p90_ms": pct(90),
+        "p99_ms": pct(99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def rss_kib() -> int:
+    """Current resident set size, or the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def timed(handler, samples: List[float]):
+    """Wrap a stage handler to record its service time (excluding time queued)."""
+    async def wrapper(arg):
+        started = time.perf_counter()
+        try:
+            return await handler(arg)
+        finally:
+            samples.append(time.perf_counter() - started)
+    return wrapper
+
+
+async def bench_pipeline(args) -> Dict:
+    from agents.commander import Commander
+    from agents.sentinel import generate_raw_report
+    from gazetteer import fast_path_stats
+    from llm_cache import get_llm_cache
+    from log_sink import BufferedLogSink
+    from pipeline import IncidentPipeline
+    from repository import InMemoryRepository
+
+    repo = InMemoryRepository(latency=args.db_latency_ms / 1000)
+    rng = random.Random(args.seed)
+    fleet = [{"name": f"Bench-{i}", "type": "Patrol", "status": "Idle", "current_incident_id": None,
+              "lat": -1.2921 + rng.uniform(-0.08, 0.08), "lng": 36.8219 + rng.uniform(-0.08, 0.08)}
+             for i in range(args.units)]
+    await repo.insert_units(fleet)
+
+    loop = asyncio.get_running_loop()
+    releases = []
+
+    def release_units(table: str, op: str, rows: List[Dict]):
+        # Units go back to Idle shortly after dispatch, so a long run doesn't just exhaust the fleet
+        for row in rows:
+            if table == "incidents" and op == "UPDATE" and row.get("assigned_unit_id"):
+                releases.append(loop.call_later(
+                    args.release_ms / 1000, lambda unit_id=row["assigned_unit_id"]: loop.create_task(
+                        repo.update_unit(unit_id, {"status": "Idle", "current_incident_id": None}))))
+    repo.add_listener(release_units)
+
+    log_sink = BufferedLogSink(repo)
+    pipeline = IncidentPipeline(repo, Commander(), log_sink.emit, dispatch_mode=args.dispatch)
+    stage_samples: Dict[str, List[float]] = {stage.name: [] for stage in pipeline.stages}
+    peak_depth = {stage.name: 0 for stage in pipeline.stages}
+    end_to_end: List[float] = []
+    for stage in pipeline.stages:
+        stage.handler = timed(stage.handler, stage_samples[stage.name])
+
+    dispatch = pipeline.stages[-1]
+    dispatch_handler = dispatch.handler
+
+    async def dispatch_and_record(arg):
+        result = await dispatch_handler(arg)
+        now = time.perf_counter()
+        for item in arg if isinstance(arg, list) else [arg]:
+            end_to_end.append(now - item["raw"]["submitted"])
+        return result
+    dispatch.handler = dispatch_and_record
+
+    async def sample_depths():
+        while True:
+            for stage in pipeline.stages:
+                peak_depth[stage.name] = max(peak_depth[stage.name], stage.queue.qsize())
+            await asyncio.sleep(0.02)
+
+    cache = get_llm_cache()
+    cache_before = (cache.hits, cache.misses)
+    fast_before, cached_before, llm_before = fast_path_stats.fast, fast_path_stats.cached, fast_path_stats.llm
+    rss_before = rss_kib()
+
+    log_sink.start()
+    pipeline.start(run_sentinel=False)
+    sampler = asyncio.create_task(sample_depths())
+    submit_blocked = []
+    started = time.perf_counter()
+    for i in range(args.reports):
+        raw_data = generate_raw_report()
+        if args.unique:
+            raw_data["raw_text"] += f" Ref B-{i}."
+        if args.rate:
+            await asyncio.sleep(rng.expovariate(args.rate))
+        raw_data["submitted"] = time.perf_counter()
+        await pipeline.submit(raw_data)
+        submit_blocked.append(time.perf_counter() - raw_data["submitted"])
+    await pipeline.join()
+    elapsed = time.perf_counter() - started
+
+    sampler.cancel()
+    await asyncio.gather(sampler, return_exceptions=True)
+    for handle in releases:
+        handle.cancel()
+    await pipeline.stop()
+    await log_sink.stop()
+    rss_after = rss_kib()
+
+    hits, misses = cache.hits - cache_before[0], cache.misses - cache_before[1]
+    return {
+        "reports": args.reports,
+        "completed": len(end_to_end),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(args.reports / elapsed, 2),
+        "end_to_end": summarize(end_to_end),
+        "submit_blocked": summarize(submit_blocked),
+        "stages": {name: {**summarize(samples), "peak_queue_depth": peak_depth[name],
+                          "failed": pipeline.stats()[name]["failed"]}
+                   for name, samples in stage_samples.items()},
+        "fast_path": {"fast": fast_path_stats.fast - fast_before, "cached": fast_path_stats.cached - cached_before,
+                      "llm": fast_path_stats.llm - llm_before},
+        "llm_cache": {"hits": hits, "misses": misses},
+        "memory": {"rss_before_kib": rss_before, "rss_after_kib": rss_after,
+                   "rss_growth_kib": rss_after - rss_before},
+    }
+
+
+async def bench_endpoints(args) -> Dict:
+    import httpx
+
+    os.environ["MEMORY_DB_LATENCY_MS"] = "0"
+    import main
+
+    for i in range(args.seed_incidents):
+        incident = await main.repo.insert_incident({
+            "type": "Robbery", "severity": "High", "location": "CBD, Moi Avenue",
+            "lat": -1.2834, "lng": 36.8235, "summary": f"Benchmark incident {i}",
+            "raw_text": "benchmark", "source": "Benchmark", "status": "Active",
+        })
+        await main.repo.insert_log({"message": f"Benchmark log {i}", "log_type": "info"})
+        await main.repo.insert_bias_check({"incident_id": incident["id"], "method": "Keyword_Fallback",
+                                           "bias_score": 0.0, "status": "Clear", "warnings": []})
+    main.repo.latency = args.db_latency_ms / 1000
+    await main.state_store.warm()  # Normally done by the startup event; /api/units waits for it
+
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for mode in ("cached", "uncached"):
+            latencies: Dict[str, List[float]] = {endpoint: [] for endpoint in ENDPOINTS}
+
+            async def hit(i):
+                endpoint = ENDPOINTS[i % len(ENDPOINTS)]
+                async with semaphore:
+                    if mode == "uncached":
+                        main.response_cache.clear()
+                    start = time.perf_counter()
+                    response = await client.get(endpoint)
+                    latencies[endpoint].append(time.perf_counter() - start)
+                    response.raise_for_status()
+
+            started = time.perf_counter()
+            await asyncio.gather(*(hit(i) for i in range(args.requests)))
+            elapsed = time.perf_counter() - started
+            results[mode] = {
+                "throughput_per_s": round(args.requests / elapsed, 2),
+                "all": summarize([value for samples in latencies.values() for value in samples]),
+                **{endpoint: summarize(samples) for endpoint, samples in latencies.items()},
+            }
+    return results
+
+
+def git_revision() -> Dict:
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+# --- comparison ---------------------------------------------------------
+def flatten(tree: Dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in tree.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """Print metric deltas; returns the metrics that got worse by more than threshold percent."""
+    if baseline.get("config") != current.get("config"):
+        changed = sorted(key for key in set(baseline.get("config", {})) | set(current.get("config", {}))
+                         if baseline.get("config", {}).get(key) != current.get("config", {}).get(key))
+        print(f"⚠️ Configurations differ ({', '.join(changed)}); deltas may not be comparable")
+
+    old, new = flatten(baseline["results"]), flatten(current["results"])
+    regressions = []
+    print(f"{'metric':<52} {'base':>11} {'current':>11} {'delta':>8}")
+    for name in sorted(old.keys() & new.keys()):
+        suffix = next((suffix for suffix in NOISE_FLOOR if name.endswith(suffix)), None)
+        if suffix is None:
+            continue  # Counts and config-derived values
+        higher_is_better = suffix == "_per_s"
+        before, after = old[name], new[name]
+        delta = (after - before) / before * 100 if before else 0.0
+        worse = (delta < -threshold if higher_is_better else delta > threshold) \
+            and abs(after - before) > NOISE_FLOOR[suffix]
+        if worse:
+            regressions.append(name)
+        print(f"{name:<52} {before:>11.2f} {after:>11.2f} {delta:>+7.1f}% {'🔴' if worse else ''}")
+    base_commit, current_commit = baseline.get("git", {}).get("commit"), current.get("git", {}).get("commit")
+    print(f"{len(regressions)} regression(s) over {threshold:g}% ({base_commit} -> {current_commit})")
+    return regressions
+
+
+def print_summary(report: Dict):
+    pipeline = report["results"].get("pipeline")
+    print("=" * 70)
+    print(f"E2E BENCHMARK  commit={report['git']['commit']}{'+dirty' if report['git']['dirty'] else ''}  "
+          f"llm={report['config']['llm_latency_ms']}ms  db={report['config']['db_latency_ms']}ms")
+    print("=" * 70)
+    if pipeline:
+        print(f"Pipeline: {pipeline['reports']} reports in {pipeline['elapsed_s']}s "
+              f"({pipeline['throughput_per_s']}/s), fast path {pipeline['fast_path']}, "
+              f"LLM server {report['results']['llm_server']}")
+        e2e = pipeline["end_to_end"]
+        print(f"  {'end-to-end':<14} n={e2e.get('count', 0):<6} p50={e2e.get('p50_ms')}ms p99={e2e.get('p99_ms')}ms")
+        for name, stage in pipeline["stages"].items():
+            print(f"  {name:<14} n={stage.get('count', 0):<6} p50={stage.get('p50_ms')}ms "
+                  f"p99={stage.get('p99_ms')}ms peak_queue={stage['peak_queue_depth']} failed={stage['failed']}")
+        print(f"  memory: RSS +{pipeline['memory']['rss_growth_kib']} KiB")
+    for mode, endpoints in report["results"].get("endpoints", {}).items():
+        print(f"Endpoints ({mode}): {endpoints['throughput_per_s']} req/s, "
+              f"p50={endpoints['all']['p50_ms']}ms p99={endpoints['all']['p99_ms']}ms")
+    print(f"Peak RSS: {report['results']['memory']['peak_rss_kib']} KiB")
+
+
+def main(args):
+    if args.llm_only:
+        os.environ["GAZETTEER_MIN_CONFIDENCE"] = "2"  # Above any confidence: every report goes to the LLM
+
+    from fake_llm import FakeLLM
+    fake = FakeLLM(args.llm_latency_ms, args.llm_jitter_ms, args.llm_per_item_ms, args.llm_error_rate, args.seed)
+    os.environ["LLM_BASE_URL"] = fake.start()
+    random.seed(args.seed)
+
+    results: Dict = {}
+    try:
+        if "pipeline" in args.scenarios:
+            results["pipeline"] = asyncio.run(bench_pipeline(args))
+            results["llm_server"] = fake.stats()
+        if "endpoints" in args.scenarios:
+            results["endpoints"] = asyncio.run(bench_endpoints(args))
+    finally:
+        fake.stop()
+    results["memory"] = {"peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+    config = {key: value for key, value in vars(args).items()
+              if key not in ("output", "compare", "threshold", "fail_on_regression")}
+    report = {
+        "suite": SUITE,
+        "version": SUITE_VERSION,
+        "git": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": config,
+        "results": results,
+    }
+    print_summary(report)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=("pipeline", "endpoints"), default=["pipeline", "endpoints"])
+    parser.add_argument("--reports", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=0.0, help="Poisson arrivals per second (0: as fast as accepted)")
+    parser.add_argument("--unique", action="store_true", help="Make every report text unique (defeats the LLM cache)")
+    parser.add_argument("--llm-only", action="store_true", help="Disable the gazetteer fast path")
+    parser.add_argument("--units", type=int, default=100)
+    parser.add_argument("--release-ms", type=float, default=2000.0, help="Dispatched units return to Idle after this")
+    parser.add_argument("--dispatch", choices=("greedy", "batch"), default="greedy")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--llm-per-item-ms", type=float, default=10.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--db-latency-ms", type=float, default=20.0)
+    parser.add_argument("--seed-incidents", type=int, default=100, help="Rows seeded for the endpoint scenario")
+    parser.add_argument("--requests", type=int, default=2000, help="Endpoint requests per mode")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--compare", metavar="BASELINE", help="Diff against an earlier --output file")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    main(parser.parse_args())
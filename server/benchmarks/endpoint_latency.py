@@ -0,0 +1,88 @@
+"""
+Endpoint latency benchmark for Community Shield
+Fires concurrent GET requests at the dashboard endpoints against the in-memory
+repository (with emulated PostgREST round-trip latency) and reports p50/p99.
+
+Usage (from server/):
+    python benchmarks/endpoint_latency.py --concurrency 50 --requests 2000 --db-latency-ms 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+os.environ["DATABASE_BACKEND"] = "memory"
+os.environ.setdefault("TOGETHER_API_KEY", "benchmark")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+ENDPOINTS = ["/api/incidents", "/api/units", "/api/logs", "/api/hotspots", "/api/bias-checks"]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def seed(repo, incidents: int):
+    for i in range(incidents):
+        incident = await repo.insert_incident({
+            "type": "Robbery", "severity": "High", "location": "CBD, Moi Avenue",
+            "lat": -1.2834, "lng": 36.8235, "summary": f"Benchmark incident {i}",
+            "raw_text": "benchmark", "source": "Benchmark", "status": "Active",
+        })
+        await repo.insert_log({"message": f"Benchmark log {i}", "log_type": "info"})
+        await repo.insert_bias_check({"incident_id": incident["id"], "method": "Keyword_Fallback",
+                                      "bias_score": 0.0, "status": "Clear", "warnings": []})
+
+
+async def run(args):
+    import httpx
+    import main
+
+    main.repo.latency = 0
+    await seed(main.repo, 100)
+    main.repo.latency = args.db_latency_ms / 1000
+    await main.state_store.warm()  # Normally done by the startup event
+
+    transport = httpx.ASGITransport(app=main.app)
+    latencies = {endpoint: [] for endpoint in ENDPOINTS}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def hit(i):
+            endpoint = ENDPOINTS[i % len(ENDPOINTS)]
+            async with semaphore:
+                if args.uncached:
+                    main.response_cache.clear()
+                start = time.perf_counter()
+                response = await client.get(endpoint)
+                latencies[endpoint].append((time.perf_counter() - start) * 1000)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(hit(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+    print("=" * 60)
+    print(f"ENDPOINT LATENCY  concurrency={args.concurrency} db_latency={args.db_latency_ms}ms "
+          f"cache={'off' if args.uncached else 'on'}")
+    print("=" * 60)
+    for endpoint, samples in latencies.items():
+        print(f"{endpoint:<20} n={len(samples):<5} p50={statistics.median(samples):7.2f}ms "
+              f"p99={percentile(samples, 99):7.2f}ms")
+    print("-" * 60)
+    print(f"Throughput: {args.requests / elapsed:.0f} req/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--db-latency-ms", type=float, default=20.0)
+    parser.add_argument("--uncached", action="store_true", help="Drop cached responses before every request")
+    asyncio.run(run(parser.parse_args()))
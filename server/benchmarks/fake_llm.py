@@ -0,0 +1,190 @@
+"""
+Fake OpenAI-compatible LLM server for Community Shield benchmarks
+Answers /v1/chat/completions for the Analyst and BiasGuard prompts (single
+and micro-batched) after a configurable delay, so the pipeline can be
+measured without network calls or token spend. Point the server at it with
+LLM_BASE_URL.
+
+Usage (from server/):
+    python benchmarks/fake_llm.py --port 8089 --latency-ms 400 --jitter-ms 100
+    LLM_BASE_URL=http://127.0.0.1:8089/v1 TOGETHER_API_KEY=fake uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+import gazetteer
+from agents.bias_rules import get_bias_rule_engine
+
+
+def analyst_answer(raw_text: str) -> Dict:
+    """What a well-behaved extraction model would return: the gazetteer's reading of the text."""
+    analysis = gazetteer.extract(raw_text)
+    return {key: analysis[key] for key in ("type", "severity", "location", "lat", "lng", "summary")}
+
+
+def bias_answer(context) -> Dict:
+    report = json.loads(context.split("\n", 1)[-1]) if isinstance(context, str) else context
+    verdict = get_bias_rule_engine().score(report)
+    return {"bias_score": verdict["score"], "status": verdict["status"], "warnings": verdict["warnings"],
+            "reasoning": "Benchmark verdict from the keyword rules."}
+
+
+class FakeLLM:
+    """
+    Latency per completion is latency_ms ± jitter_ms plus per_item_ms for
+    each item in a batch. error_rate returns HTTP 500 for that share of
+    requests (the OpenAI client retries them). rpm, if set, is a per-minute
+    request quota reported in Together-style x-ratelimit-* headers; requests
+    over it get a 429 with retry-after.
+    """
+
+    def __init__(self, latency_ms: float = 300.0, jitter_ms: float = 0.0, per_item_ms: float = 0.0,
+                 error_rate: float = 0.0, seed: Optional[int] = None, rpm: Optional[int] = None):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.per_item = per_item_ms / 1000
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self._window_start = time.monotonic()
+        self._window_used = 0
+        self._rng = random.Random(seed)
+        self.app = FastAPI()
+        self.app.post("/v1/chat/completions")(self.completions)
+        self.app.get("/stats")(self.stats)
+        self._server: Optional[uvicorn.Server] = None
+        self._thread: Optional[threading.Thread] = None
+        self.port: Optional[int] = None
+
+        # Counters
+        self.requests = 0
+        self.items = 0
+        self.errors = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def _answer(self, system: str, user: str) -> str:
+        analyst = "Police Dispatch Analyst" in system
+        answer = analyst_answer if analyst else bias_answer
+        if "JSON array of items" in system:
+            inputs = json.loads(user)
+            self.items += len(inputs)
+            return json.dumps({"results": [{"index": item["index"], **answer(item["input"])} for item in inputs]})
+        self.items += 1
+        return json.dumps(answer(user))
+
+    def _quota_headers(self) -> Optional[Dict[str, str]]:
+        """Take one request from the minute's quota; None if it is spent."""
+        now = time.monotonic()
+        if now - self._window_start >= 60:
+            self._window_start, self._window_used = now, 0
+        reset = 60 - (now - self._window_start)
+        if self._window_used >= self.rpm:
+            return None
+        self._window_used += 1
+        return {"x-ratelimit-limit": str(self.rpm), "x-ratelimit-remaining": str(self.rpm - self._window_used),
+                "x-ratelimit-reset": f"{reset:.2f}"}
+
+    async def completions(self, request: Request):
+        headers = {}
+        if self.rpm:
+            headers = self._quota_headers()
+            if headers is None:
+                self.throttled += 1
+                reset = 60 - (time.monotonic() - self._window_start)
+                return JSONResponse({"error": {"message": "rate limit exceeded", "type": "rate_limit"}},
+                                    status_code=429, headers={"retry-after": f"{reset:.2f}",
+                                                              "x-ratelimit-limit": str(self.rpm),
+                                                              "x-ratelimit-remaining": "0",
+                                                              "x-ratelimit-reset": f"{reset:.2f}"})
+        body = await request.json()
+        messages = {message["role"]: message["content"] for message in body.get("messages", [])}
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            content = self._answer(messages.get("system", ""), messages.get("user", ""))
+            items = json.loads(content).get("results")
+            delay = self.latency + self._rng.uniform(-self.jitter, self.jitter) + self.per_item * len(items or [1])
+            await asyncio.sleep(max(0.0, delay))
+            # Rough 4-characters-per-token estimate, so token metrics have something to count
+            prompt_tokens = sum(len(text) for text in messages.values()) // 4
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                     "total_tokens": prompt_tokens + len(content) // 4}
+            if self.error_rate and self._rng.random() < self.error_rate:
+                self.errors += 1
+                return JSONResponse({"error": {"message": "injected failure", "type": "server_error"}},
+                                    status_code=500)
+            return JSONResponse({
+                "id": f"chatcmpl-bench-{self.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            }, headers=headers)
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "items": self.items,
+            "errors": self.errors,
+            "throttled": self.throttled,
+            "peak_in_flight": self.peak_in_flight,
+            "items_per_request": round(self.items / self.requests, 2) if self.requests else 0.0,
+        }
+
+    # --- background serving ---------------------------------------------
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def start(self, port: int = 0) -> str:
+        """Serve on a background thread; returns the base URL for LLM_BASE_URL."""
+        if not port:
+            with socket.socket() as probe:
+                probe.bind(("127.0.0.1", 0))
+                port = probe.getsockname()[1]
+        self.port = port
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, name="fake-llm", daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self.base_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+            self._server = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--per-item-ms", type=float, default=0.0, help="Extra delay per item in a batch")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=None, help="Per-minute request quota (429 beyond it)")
+    args = parser.parse_args()
+    fake = FakeLLM(args.latency_ms, args.jitter_ms, args.per_item_ms, args.error_rate, rpm=args.rpm)
+    uvicorn.run(fake.app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,114 @@
+"""
+Ingest burst benchmark for Community Shield
+Appends a burst of Sentinel reports to the durable ingest log far faster
+than the stand-in Analyst can take them, then drains it through a handler
+with fixed concurrency and per-call latency. The Analyst is down for part of
+the drain (every call fails, so records back off and retry) and the consumer
+is restarted midway, as a deploy or crash would. Reports how fast the burst
+was absorbed, how long it took to drain, and checks that every report was
+handled at least once.
+
+Usage (from server/):
+    python benchmarks/ingest_burst.py --reports 5000 --llm-concurrency 8 --llm-latency-ms 40
+    python benchmarks/ingest_burst.py --outage-s 2 --restart-after-s 3 --fsync-interval 0
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agents.sentinel import generate_raw_report
+from ingest_log import IngestLog
+
+
+def create_log(path: str, args) -> IngestLog:
+    return IngestLog(path, segment_bytes=args.segment_kb * 1024, fsync_interval=args.fsync_interval,
+                     commit_interval=0.2, max_in_flight=args.max_in_flight, max_attempts=args.max_attempts,
+                     retry_base=args.retry_base, retry_max=args.retry_max)
+
+
+async def run(args):
+    path = tempfile.mkdtemp(prefix="ingest_burst_")
+    handled = Counter()
+    calls = Counter()
+    llm = asyncio.Semaphore(args.llm_concurrency)
+    outage = {"until": 0.0}
+
+    async def analyze(report):
+        async with llm:
+            await asyncio.sleep(args.llm_latency_ms / 1000)
+            if time.monotonic() < outage["until"]:
+                calls["failed"] += 1
+                raise RuntimeError("analysis failed: LLM unavailable")
+            calls["ok"] += 1
+            handled[report["id"]] += 1
+
+    log = create_log(path, args)
+    log.handle("report", analyze)
+    log.start()
+
+    reports = [generate_raw_report() for _ in range(args.reports)]
+    started = time.perf_counter()
+    for report in reports:
+        await log.put("report", report)
+    absorb = time.perf_counter() - started
+    outage["until"] = time.monotonic() + args.outage_s
+
+    restarted = False
+    while True:
+        await asyncio.sleep(0.05)
+        if not restarted and time.perf_counter() - started >= args.restart_after_s:
+            await log.stop()
+            log = create_log(path, args)
+            log.handle("report", analyze)
+            log.start()
+            restarted = True
+        stats = log.stats()
+        if restarted and stats["lag"] == 0:
+            break
+        if time.perf_counter() - started > args.timeout_s:
+            print("Timed out draining the log")
+            break
+    drain = time.perf_counter() - started
+    await log.stop()
+    on_disk = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    shutil.rmtree(path, ignore_errors=True)
+
+    ids = {report["id"] for report in reports}
+    missing = len(ids - set(handled))
+    duplicates = sum(count - 1 for count in handled.values())
+    print(f"Reports:            {args.reports}")
+    print(f"Absorbed in:        {absorb * 1000:.0f} ms ({args.reports / absorb:,.0f} appends/s)")
+    print(f"Analyst capacity:   {args.llm_concurrency / (args.llm_latency_ms / 1000):,.0f} reports/s")
+    print(f"Drained in:         {drain:.1f} s (outage {args.outage_s:.1f} s, restart at {args.restart_after_s:.1f} s)")
+    print(f"Analyst calls:      {calls['ok']} ok, {calls['failed']} failed and retried")
+    print(f"Lost:               {missing}")
+    print(f"Handled twice:      {duplicates} (in flight at the restart)")
+    print(f"Left on disk:       {on_disk} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=5000)
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency-ms", type=float, default=40)
+    parser.add_argument("--outage-s", type=float, default=1.0)
+    parser.add_argument("--restart-after-s", type=float, default=2.0)
+    parser.add_argument("--max-in-flight", type=int, default=100)
+    parser.add_argument("--max-attempts", type=int, default=20)
+    parser.add_argument("--retry-base", type=float, default=0.1)
+    parser.add_argument("--retry-max", type=float, default=1.0)
+    parser.add_argument("--segment-kb", type=int, default=256)
+    parser.add_argument("--fsync-interval", type=float, default=1.0)
+    parser.add_argument("--timeout-s", type=float, default=300)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Rate limit benchmark for Community Shield
+Offers BiasGuard checks faster than a fake LLM's per-minute quota allows
+(benchmarks/fake_llm.py --rpm) and then takes the fake down for a while.
+Shows the shared limiter converging on the quota the x-ratelimit-* headers
+report (few or no 429s, the rest of the load answered by the keyword rules),
+and the circuit breaker opening during the outage so checks fail over at
+once instead of waiting out retries, then closing again on recovery.
+Budget is taken on the event loop before a check is handed to a worker
+thread, so fallbacks over quota are answered at once rather than after
+queueing behind threads that wait for budget.
+
+Usage (from server/):
+    python benchmarks/rate_limits.py --rpm 300 --offered-rps 20 --duration-s 20
+    python benchmarks/rate_limits.py --outage-s 10 --llm-latency-ms 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+os.environ["LLM_CACHE_PATH"] = ""  # Memory-only, and every check below is distinct anyway
+os.environ["TOGETHER_API_KEY"] = "benchmark"
+os.environ.setdefault("LLM_BATCH_MAX_ITEMS", "1")  # One completion per check, so calls map to the quota
+
+
+async def offer(args, label: str, seconds: float, counter: Counter, start_index: int) -> int:
+    """Start checks at offered_rps for the given time; returns how many were started."""
+    from agents.bias_guard import BiasGuard
+
+    async def check(i: int):
+        started = time.perf_counter()
+        analysis = await BiasGuard.check_async({"type": "Robbery", "severity": "High", "location": "CBD",
+                                                "summary": f"{label} report {i}"})
+        method = "llm" if analysis["bias_check"]["method"].startswith("AI") else "keyword fallback"
+        counter[method] += 1
+        counter[f"{method} seconds"] += time.perf_counter() - started
+
+    tasks = []
+    interval = 1 / args.offered_rps
+    deadline = time.perf_counter() + seconds
+    i = start_index
+    while time.perf_counter() < deadline:
+        tasks.append(asyncio.create_task(check(i)))
+        i += 1
+        await asyncio.sleep(interval)
+    await asyncio.gather(*tasks)
+    return i - start_index
+
+
+def summarize(label: str, offered: int, counter: Counter, elapsed: float, limiter, fake, before: dict):
+    stats = limiter.stats()
+    print(f"{label}: {offered} checks offered over {elapsed:.1f}s")
+    for method in ("llm", "keyword fallback"):
+        count = counter[method]
+        average = counter[f"{method} seconds"] / count * 1000 if count else 0.0
+        print(f"  {method + ':':<20} {count} ({count / elapsed:.2f}/s, avg {average:.0f} ms)")
+    print(f"  server 429s:         {fake.throttled - before['throttled']}, "
+          f"server errors: {fake.errors - before['errors']}")
+    print(f"  limiter:             {stats['rate_rps']} rps, concurrency {stats['concurrency']}, "
+          f"breaker {stats['state']}, trips {stats['trips']}, short-circuited {stats['short_circuited']}, "
+          f"rejected {stats['rejected']}")
+
+
+async def run(args, fake):
+    from rate_limits import get_rate_limiter
+
+    limiter = get_rate_limiter("together")
+    print(f"Quota: {args.rpm} requests/min ({args.rpm / 60:.1f}/s); offering {args.offered_rps}/s\n")
+
+    counter, before, started = Counter(), {"throttled": fake.throttled, "errors": fake.errors}, time.perf_counter()
+    offered = await offer(args, "quota", args.duration_s, counter, 0)
+    summarize("Over quota", offered, counter, time.perf_counter() - started, limiter, fake, before)
+
+    fake.error_rate = 1.0
+    counter, before, started = Counter(), {"throttled": fake.throttled, "errors": fake.errors}, time.perf_counter()
+    offered = await offer(args, "outage", args.outage_s, counter, 100000)
+    summarize("\nOutage", offered, counter, time.perf_counter() - started, limiter, fake, before)
+
+    fake.error_rate = 0.0
+    counter, before, started = Counter(), {"throttled": fake.throttled, "errors": fake.errors}, time.perf_counter()
+    offered = await offer(args, "recovery", args.recovery_s, counter, 200000)
+    summarize("\nRecovery", offered, counter, time.perf_counter() - started, limiter, fake, before)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rpm", type=int, default=300)
+    parser.add_argument("--offered-rps", type=float, default=20)
+    parser.add_argument("--duration-s", type=float, default=20)
+    parser.add_argument("--outage-s", type=float, default=10)
+    parser.add_argument("--recovery-s", type=float, default=25)
+    parser.add_argument("--llm-latency-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    # Short breaker timings so the whole cycle fits in one run
+    os.environ.setdefault("BREAKER_COOLDOWN", "5")
+    os.environ.setdefault("BREAKER_WINDOW", "10")
+    os.environ.setdefault("RATE_LIMIT_MAX_WAIT", "2")
+
+    from fake_llm import FakeLLM
+    fake = FakeLLM(args.llm_latency_ms, rpm=args.rpm)
+    os.environ["LLM_BASE_URL"] = fake.start()
+    try:
+        asyncio.run(run(args, fake))
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Road routing benchmark for Community Shield
+Measures route queries with and without ALT landmarks, ranking candidate
+units per incident with one backward search against one route per unit,
+and how often the fastest unit by road differs from the straight-line
+nearest one (and the ETA that saves).
+
+Usage (from server/):
+    python benchmarks/routing.py --queries 200 --units 40
+    python benchmarks/routing.py --graph .cache/nairobi_roads.npz
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agents.commander import Commander
+from gazetteer import NAIROBI_BOUNDS
+from road_graph import RoadGraph, synthetic_grid
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    if args.graph:
+        graph, build_ms = timed(RoadGraph.load, args.graph)
+    else:
+        graph, build_ms = timed(synthetic_grid, spacing_km=args.spacing_km, seed=args.seed)
+        _, landmark_ms = timed(graph.precompute_landmarks, args.landmarks)
+        print(f"Synthetic grid: {graph.n} nodes, {len(graph.targets)} edges, "
+              f"built in {build_ms:.0f} ms, {args.landmarks} landmarks in {landmark_ms:.0f} ms")
+    plain = RoadGraph(graph.lat, graph.lng, graph.offsets, graph.targets, graph.seconds, graph.meters)
+
+    # Point-to-point: the same pairs with and without landmark bounds
+    pairs = [(rng.randrange(graph.n), rng.randrange(graph.n)) for _ in range(args.queries)]
+    alt_ms, plain_ms, alt_settled, plain_settled = [], [], 0, 0
+    for source, target in pairs:
+        before = graph.settled
+        (seconds, _), ms = timed(graph.shortest_path, source, target)
+        alt_ms.append(ms)
+        alt_settled += graph.settled - before
+        before = plain.settled
+        (plain_seconds, _), ms = timed(plain.shortest_path, source, target)
+        plain_ms.append(ms)
+        plain_settled += plain.settled - before
+        assert abs(seconds - plain_seconds) < 0.05, (source, target, seconds, plain_seconds)
+    print(f"\nRoute query (city-wide pairs, {args.queries}):")
+    print(f"  ALT A*    p50 {statistics.median(alt_ms):7.2f} ms  max {max(alt_ms):7.2f} ms  "
+          f"settled {alt_settled / len(pairs):8.0f} nodes")
+    print(f"  Dijkstra  p50 {statistics.median(plain_ms):7.2f} ms  max {max(plain_ms):7.2f} ms  "
+          f"settled {plain_settled / len(pairs):8.0f} nodes")
+
+    # Ranking: a fleet spread over the city, fastest unit per incident
+    min_lat, min_lng, max_lat, max_lng = NAIROBI_BOUNDS
+    commander = Commander(roads=graph)
+    commander.sync_units([{"id": f"U-{i}", "name": f"Unit {i}", "status": "Idle",
+                           "lat": rng.uniform(min_lat, max_lat), "lng": rng.uniform(min_lng, max_lng)}
+                          for i in range(args.units)])
+    rank_ms, routes_ms, differs, saved = [], [], 0, []
+    for _ in range(args.queries):
+        lat, lng = rng.uniform(min_lat, max_lat), rng.uniform(min_lng, max_lng)
+        fastest, ms = timed(commander.fastest_idle, lat, lng)
+        rank_ms.append(ms)
+        candidates = commander.nearest_idle(lat, lng, args.units)
+        etas, ms = timed(lambda: [graph.route(unit.lat, unit.lng, lat, lng).seconds for _, unit in candidates])
+        routes_ms.append(ms)
+        nearest_eta = etas[0]
+        if fastest[0][1].id != candidates[0][1].id:
+            differs += 1
+            saved.append(nearest_eta - fastest[0][0])
+        assert fastest[0][0] <= min(etas) + 0.05
+    print(f"\nRanking {args.units} units per incident ({args.queries} incidents):")
+    print(f"  fastest_idle (1 backward search)  p50 {statistics.median(rank_ms):7.2f} ms")
+    print(f"  one route per unit                p50 {statistics.median(routes_ms):7.2f} ms")
+    print(f"  fastest unit is not the straight-line nearest for {differs}/{args.queries} incidents"
+          + (f", saving {statistics.median(saved) / 60:.1f} min median ETA" if saved else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--graph", help="Prebuilt .npz graph (default: synthetic grid)")
+    parser.add_argument("--spacing-km", type=float, default=0.25)
+    parser.add_argument("--landmarks", type=int, default=12)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--units", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
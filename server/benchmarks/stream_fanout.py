@@ -0,0 +1,83 @@
+"""
+Event stream fan-out load test for Community Shield
+Connects N in-process SSE subscribers to an EventBus, publishes events at a
+fixed rate and measures publish-to-receive latency, plus the memory held per
+idle subscriber.
+
+Usage (from server/):
+    python benchmarks/stream_fanout.py --clients 5000 --events 200 --rate 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+os.environ["DATABASE_BACKEND"] = "memory"
+
+from event_bus import EventBus
+
+
+async def consume(bus: EventBus, subscriber, expected: int, latencies: list):
+    received = 0
+    async for frame in bus.stream(subscriber):
+        now = time.perf_counter()
+        text = frame.decode("utf-8")
+        if not text.startswith("id:"):
+            continue
+        data = json.loads(text.split("data: ", 1)[1])
+        latencies.append(now - data["sent"])
+        received += 1
+        if received >= expected:
+            return
+
+
+async def run(args):
+    bus = EventBus(client_queue=args.queue, keepalive=30)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    subscribers = [bus.subscribe({"incident"}) for _ in range(args.clients)]
+    latencies: list = []
+    consumers = [asyncio.create_task(consume(bus, sub, args.events, latencies)) for sub in subscribers]
+    await asyncio.sleep(0.1)  # Let every consumer reach its idle wait
+    per_client = (tracemalloc.get_traced_memory()[0] - before) / args.clients
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    publish_seconds = 0.0
+    for i in range(args.events):
+        t0 = time.perf_counter()
+        bus.publish("incident", {"sent": t0, "seq": i})
+        publish_seconds += time.perf_counter() - t0
+        await asyncio.sleep(1 / args.rate)
+    await asyncio.wait_for(asyncio.gather(*consumers), timeout=60)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = [value * 1000 for value in latencies]
+    print("=" * 60)
+    print(f"Stream fan-out: {args.clients} clients, {args.events} events at {args.rate}/s")
+    print("=" * 60)
+    print(f"  memory per idle client : {per_client / 1024:8.2f} KiB")
+    print(f"  publish cost           : {publish_seconds / args.events * 1000:8.3f} ms per event")
+    print(f"  deliveries             : {len(ms)} in {elapsed:.2f}s ({len(ms) / elapsed:,.0f}/s)")
+    print(f"  latency p50            : {statistics.median(ms):8.2f} ms")
+    print(f"  latency p99            : {ms[int(len(ms) * 0.99) - 1]:8.2f} ms")
+    print(f"  latency max            : {ms[-1]:8.2f} ms")
+    print(f"  lagging disconnects    : {bus.disconnected_lagging}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=100.0, help="Events per second")
+    parser.add_argument("--queue", type=int, default=256, help="Per-client queue size")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,114 @@
+"""
+Unit movement benchmark for Community Shield
+Times one UnitMovementEngine.step over fleets of increasing size, against
+the same update written as a per-unit Python loop, and checks that both
+leave every unit in the same place.
+
+Usage (from server/):
+    python benchmarks/unit_movement.py --fleets 1000 10000 50000 --ticks 50
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+os.environ["DATABASE_BACKEND"] = "memory"
+
+import numpy as np
+
+from gazetteer import NAIROBI_BOUNDS
+from repository import InMemoryRepository
+from spatial_index import KM_PER_DEG_LAT
+from state_store import StateStore
+from unit_movement import ON_SCENE, RESPONDING, UnitMovementEngine
+
+
+def make_engine(size: int, waypoints: int, seed: int) -> UnitMovementEngine:
+    rng = random.Random(seed)
+    min_lat, min_lng, max_lat, max_lng = NAIROBI_BOUNDS
+
+    def point():
+        return rng.uniform(min_lat, max_lat), rng.uniform(min_lng, max_lng)
+
+    def near(lat, lng, spread=0.02):
+        return lat + rng.uniform(-spread, spread), lng + rng.uniform(-spread, spread)
+
+    engine = UnitMovementEngine(StateStore(InMemoryRepository(seed=False)), on_scene_seconds=120)
+    engine.add_units([{"id": f"U-{i}", "name": f"Unit {i}", "status": "Idle",
+                       "lat": lat, "lng": lng} for i, (lat, lng) in enumerate(point() for _ in range(size))])
+    # Two thirds of the fleet responding within a few km, each along a few intermediate waypoints
+    for i in range(0, size, 3):
+        for j in (i, i + 1):
+            if j < size:
+                route = [near(*engine.position(f"U-{j}")) for _ in range(waypoints)]
+                engine.dispatch(f"U-{j}", f"I-{j}", *near(*route[-1]), route=route)
+    return engine
+
+
+def loop_step(engine: UnitMovementEngine, dt: float):
+    """Reference implementation: the same movement, one unit at a time."""
+    for i in range(engine.count):
+        if engine.status[i] == ON_SCENE:
+            engine.dwell[i] -= dt
+            if engine.dwell[i] <= 0:
+                engine.status[i] = 0
+            continue
+        if engine.status[i] != RESPONDING or engine.next_wp[i] >= engine.route_len[i]:
+            continue
+        budget = engine.speed[i] * dt
+        while engine.next_wp[i] < engine.route_len[i]:
+            lat, lng = engine.waypoints[i, engine.next_wp[i]]
+            dlat, dlng = lat - engine.lat[i], lng - engine.lng[i]
+            dist = KM_PER_DEG_LAT * math.hypot(dlat, dlng * math.cos(math.radians(engine.lat[i])))
+            if dist > budget:
+                engine.lat[i] += dlat * budget / dist
+                engine.lng[i] += dlng * budget / dist
+                break
+            engine.lat[i], engine.lng[i] = lat, lng
+            budget -= dist
+            engine.next_wp[i] += 1
+        if engine.next_wp[i] >= engine.route_len[i]:
+            engine.status[i] = ON_SCENE
+            engine.dwell[i] = engine.on_scene_seconds
+            engine.route_len[i] = 0
+
+
+def bench(size: int, ticks: int, dt: float, waypoints: int, seed: int):
+    vectorized, looped = make_engine(size, waypoints, seed), make_engine(size, waypoints, seed)
+    step_ms, loop_ms = [], []
+    for _ in range(ticks):
+        started = time.perf_counter()
+        vectorized.step(dt)
+        step_ms.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        loop_step(looped, dt)
+        loop_ms.append((time.perf_counter() - started) * 1000)
+
+    n = vectorized.count
+    drift_m = KM_PER_DEG_LAT * 1000 * float(np.max(np.hypot(vectorized.lat[:n] - looped.lat[:n],
+                                                            vectorized.lng[:n] - looped.lng[:n])))
+    same_status = bool(np.array_equal(vectorized.status[:n], looped.status[:n]))
+    return statistics.median(step_ms), statistics.median(loop_ms), drift_m, same_status, vectorized.stats()
+
+
+def main(args):
+    print(f"{'units':>8} {'step ms':>9} {'loop ms':>9} {'speedup':>8} {'max drift':>10} {'arrived':>8}")
+    for size in args.fleets:
+        step_ms, loop_ms, drift_m, same_status, stats = bench(size, args.ticks, args.dt, args.waypoints, args.seed)
+        print(f"{size:>8} {step_ms:>9.3f} {loop_ms:>9.2f} {loop_ms / step_ms:>7.0f}x {drift_m:>9.3f}m "
+              f"{stats['arrivals']:>8}{'' if same_status else '  STATUS MISMATCH'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fleets", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--dt", type=float, default=30.0, help="Simulated seconds per tick")
+    parser.add_argument("--waypoints", type=int, default=4, help="Intermediate waypoints per route")
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
@@ -0,0 +1,11 @@
+"""
+pytest configuration for the server. Tests import the server modules by
+their top-level names, as main.py does.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# A manual credentials check that calls the live Twitter API on import, not a test
+collect_ignore = ["test_twitter_api.py"]
@@ -16,6 +16,7 @@ CREATE TABLE incidents (
     source VARCHAR(100),
     status VARCHAR(50) DEFAULT 'Active' CHECK (status IN ('Active', 'Dispatched', 'Resolved', 'Cancelled')),
     assigned_unit_id UUID,
+    report_count INTEGER DEFAULT 1,  -- Near-duplicate reports merged into this incident
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -31,6 +32,7 @@ CREATE TABLE units (
     lat DECIMAL(10, 8) NOT NULL,
     lng DECIMAL(11, 8) NOT NULL,
     current_incident_id UUID,
+    version BIGINT NOT NULL DEFAULT 0,  -- Bumped by every update; claim_unit compares it
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -76,17 +78,65 @@ CREATE TABLE bias_checks (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- ============================================
+-- 6. LEADER_LEASES TABLE
+-- ============================================
+-- One row per background role (e.g. 'background'): the worker holding an
+-- unexpired lease runs it. See acquire_lease below.
+CREATE TABLE leader_leases (
+    name VARCHAR(100) PRIMARY KEY,
+    holder VARCHAR(255) NOT NULL,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+-- ============================================
+-- 7. WORK_QUEUE TABLE
+-- ============================================
+-- Raw reports from the leader's producers, shared out between workers.
+-- A claimed row is hidden until claimed_until, then goes back to the queue.
+CREATE TABLE work_queue (
+    id BIGSERIAL PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL,
+    claimed_by VARCHAR(255),
+    claimed_until TIMESTAMP WITH TIME ZONE,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- ============================================
+-- 8. WORK_DEAD_LETTER TABLE
+-- ============================================
+-- Work items that failed on their last attempt, kept for inspection or a
+-- manual re-queue. See dead_letter_work below.
+CREATE TABLE work_dead_letter (
+    id BIGINT PRIMARY KEY,  -- The work_queue id it had
+    kind VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_worker VARCHAR(255),
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE,
+    dead_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
 -- ============================================
 -- INDEXES FOR PERFORMANCE
 -- ============================================
-CREATE INDEX idx_incidents_created_at ON incidents(created_at DESC);
-CREATE INDEX idx_incidents_status ON incidents(status);
-CREATE INDEX idx_incidents_severity ON incidents(severity);
+-- Keyset pagination walks (created_at, id) newest first; filtered pages use the
+-- composite index that leads with the filter column
+CREATE INDEX idx_incidents_created_at ON incidents(created_at DESC, id DESC);
+CREATE INDEX idx_incidents_status ON incidents(status, created_at DESC, id DESC);
+CREATE INDEX idx_incidents_severity ON incidents(severity, created_at DESC, id DESC);
+CREATE INDEX idx_incidents_source ON incidents(source, created_at DESC, id DESC);
+CREATE INDEX idx_incidents_lat_lng ON incidents(lat, lng);
 CREATE INDEX idx_units_status ON units(status);
-CREATE INDEX idx_logs_created_at ON logs(created_at DESC);
-CREATE INDEX idx_logs_type ON logs(log_type);
+CREATE INDEX idx_logs_created_at ON logs(created_at DESC, id DESC);
+CREATE INDEX idx_logs_type ON logs(log_type, created_at DESC, id DESC);
+CREATE INDEX idx_logs_incident_id ON logs(incident_id, created_at DESC, id DESC);
 CREATE INDEX idx_hotspots_risk_score ON hotspots(risk_score DESC);
 CREATE INDEX idx_bias_checks_incident_id ON bias_checks(incident_id);
+CREATE INDEX idx_work_queue_claimable ON work_queue(claimed_until NULLS FIRST, id);
 
 -- ============================================
 -- FOREIGN KEY CONSTRAINTS
@@ -126,6 +176,156 @@ CREATE TRIGGER update_units_updated_at BEFORE UPDATE ON units
 CREATE TRIGGER update_hotspots_updated_at BEFORE UPDATE ON hotspots
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Row version for compare-and-set: any write to a unit, whoever makes it, moves it on
+CREATE OR REPLACE FUNCTION bump_version_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.version = OLD.version + 1;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER bump_units_version BEFORE UPDATE ON units
+    FOR EACH ROW EXECUTE FUNCTION bump_version_column();
+
+-- ============================================
+-- DISPATCH CLAIM (RPC: POST /rest/v1/rpc/claim_unit)
+-- ============================================
+-- Atomically assigns an Idle unit to an Active incident, so concurrent
+-- dispatchers (workers, server replicas) can never hand one unit two incidents.
+-- The unit is only claimed if it is still Idle and, when p_expected_version is
+-- given, unchanged since the caller read it. Both rows are updated in the same
+-- transaction. Returns {"claimed": bool, "unit": row, "incident": row} with the
+-- rows as they are now, so a losing caller can refresh its copy and move on to
+-- the next-nearest unit. Rows are locked incident first, then unit.
+CREATE OR REPLACE FUNCTION claim_unit(p_unit_id UUID, p_incident_id UUID, p_expected_version BIGINT DEFAULT NULL)
+RETURNS JSONB AS $$
+DECLARE
+    target incidents;
+    claimed units;
+BEGIN
+    SELECT * INTO target FROM incidents WHERE id = p_incident_id FOR UPDATE;
+    IF NOT FOUND OR target.status <> 'Active' THEN
+        RETURN jsonb_build_object('claimed', false, 'incident', to_jsonb(target),
+                                  'unit', (SELECT to_jsonb(u) FROM units u WHERE u.id = p_unit_id));
+    END IF;
+
+    UPDATE units SET status = 'Responding', current_incident_id = p_incident_id
+    WHERE id = p_unit_id AND status = 'Idle'
+      AND (p_expected_version IS NULL OR version = p_expected_version)
+    RETURNING * INTO claimed;
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('claimed', false, 'incident', to_jsonb(target),
+                                  'unit', (SELECT to_jsonb(u) FROM units u WHERE u.id = p_unit_id));
+    END IF;
+
+    UPDATE incidents SET status = 'Dispatched', assigned_unit_id = p_unit_id
+    WHERE id = p_incident_id
+    RETURNING * INTO target;
+    RETURN jsonb_build_object('claimed', true, 'unit', to_jsonb(claimed), 'incident', to_jsonb(target));
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================
+-- LEADER ELECTION (RPC: acquire_lease / release_lease)
+-- ============================================
+-- Takes the named lease if it is free or expired, or renews it for its holder.
+-- Returns the lease row as it is now: the caller leads if holder is itself.
+-- (A lease rather than pg_advisory_lock: PostgREST gives every request its own
+-- transaction on a pooled connection, so session locks cannot be held.)
+CREATE OR REPLACE FUNCTION acquire_lease(p_name TEXT, p_holder TEXT, p_ttl_seconds DOUBLE PRECISION)
+RETURNS JSONB AS $$
+DECLARE
+    lease leader_leases;
+BEGIN
+    INSERT INTO leader_leases (name, holder, expires_at)
+    VALUES (p_name, p_holder, NOW() + make_interval(secs => p_ttl_seconds))
+    ON CONFLICT (name) DO UPDATE
+        SET holder = EXCLUDED.holder, expires_at = EXCLUDED.expires_at
+        WHERE leader_leases.holder = p_holder OR leader_leases.expires_at < NOW()
+    RETURNING * INTO lease;
+    IF NOT FOUND THEN
+        SELECT * INTO lease FROM leader_leases WHERE name = p_name;
+    END IF;
+    RETURN to_jsonb(lease);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Hands the lease over at once (on clean shutdown) instead of waiting for it to expire
+CREATE OR REPLACE FUNCTION release_lease(p_name TEXT, p_holder TEXT)
+RETURNS VOID AS $$
+    UPDATE leader_leases SET expires_at = NOW() - INTERVAL '1 second'
+    WHERE name = p_name AND holder = p_holder;
+$$ LANGUAGE sql;
+
+-- ============================================
+-- WORK QUEUE (RPC: claim_work / renew_work / complete_work / dead_letter_work)
+-- ============================================
+-- Claims up to p_limit unclaimed (or lease-expired) rows, oldest first. SKIP LOCKED
+-- lets any number of workers claim at once without waiting on each other. Rows
+-- that already failed p_max_attempts times are left for dead_letter_work.
+CREATE OR REPLACE FUNCTION claim_work(p_worker TEXT, p_limit INTEGER, p_lease_seconds DOUBLE PRECISION,
+                                      p_max_attempts INTEGER DEFAULT 5)
+RETURNS SETOF work_queue AS $$
+    UPDATE work_queue
+    SET claimed_by = p_worker, claimed_until = NOW() + make_interval(secs => p_lease_seconds),
+        attempts = attempts + 1
+    WHERE id IN (
+        SELECT id FROM work_queue
+        WHERE (claimed_until IS NULL OR claimed_until < NOW()) AND attempts < p_max_attempts
+        ORDER BY id
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *;
+$$ LANGUAGE sql;
+
+-- Removes rows the worker has handled; rows it no longer holds are left alone
+CREATE OR REPLACE FUNCTION complete_work(p_worker TEXT, p_ids BIGINT[])
+RETURNS INTEGER AS $$
+    WITH done AS (
+        DELETE FROM work_queue WHERE id = ANY(p_ids) AND claimed_by = p_worker RETURNING 1
+    )
+    SELECT COUNT(*)::INTEGER FROM done;
+$$ LANGUAGE sql;
+
+-- Extends the lease on rows the worker is still handling
+CREATE OR REPLACE FUNCTION renew_work(p_worker TEXT, p_ids BIGINT[], p_lease_seconds DOUBLE PRECISION)
+RETURNS INTEGER AS $$
+    WITH renewed AS (
+        UPDATE work_queue SET claimed_until = NOW() + make_interval(secs => p_lease_seconds)
+        WHERE id = ANY(p_ids) AND claimed_by = p_worker RETURNING 1
+    )
+    SELECT COUNT(*)::INTEGER FROM renewed;
+$$ LANGUAGE sql;
+
+-- Moves rows to work_dead_letter: those in p_ids that the worker holds (their last
+-- attempt failed with p_error), and any row whose last attempt ran out its lease
+-- (the worker died). Returns how many were moved.
+CREATE OR REPLACE FUNCTION dead_letter_work(p_worker TEXT, p_ids BIGINT[], p_error TEXT,
+                                            p_max_attempts INTEGER DEFAULT 5)
+RETURNS INTEGER AS $$
+    WITH dead AS (
+        DELETE FROM work_queue
+        WHERE id IN (
+            SELECT id FROM work_queue
+            WHERE (id = ANY(p_ids) AND claimed_by = p_worker)
+               OR (attempts >= p_max_attempts AND claimed_until < NOW())
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING *
+    ), moved AS (
+        INSERT INTO work_dead_letter (id, kind, payload, attempts, last_worker, error, created_at)
+        SELECT id, kind, payload, attempts, claimed_by,
+               CASE WHEN id = ANY(p_ids) AND claimed_by = p_worker THEN p_error
+                    ELSE 'lease expired on the last attempt' END,
+               created_at
+        FROM dead
+        RETURNING 1
+    )
+    SELECT COUNT(*)::INTEGER FROM moved;
+$$ LANGUAGE sql;
+
 -- ============================================
 -- ROW LEVEL SECURITY (RLS) POLICIES
 -- ============================================
@@ -135,6 +335,9 @@ ALTER TABLE units ENABLE ROW LEVEL SECURITY;
 ALTER TABLE logs ENABLE ROW LEVEL SECURITY;
 ALTER TABLE hotspots ENABLE ROW LEVEL SECURITY;
 ALTER TABLE bias_checks ENABLE ROW LEVEL SECURITY;
+ALTER TABLE leader_leases ENABLE ROW LEVEL SECURITY;
+ALTER TABLE work_queue ENABLE ROW LEVEL SECURITY;
+ALTER TABLE work_dead_letter ENABLE ROW LEVEL SECURITY;
 
 -- Allow public read/write for MVP (you can restrict this later with auth)
 CREATE POLICY "Allow public read access" ON incidents FOR SELECT USING (true);
@@ -157,6 +360,19 @@ CREATE POLICY "Allow public update access" ON hotspots FOR UPDATE USING (true);
 CREATE POLICY "Allow public read access" ON bias_checks FOR SELECT USING (true);
 CREATE POLICY "Allow public insert access" ON bias_checks FOR INSERT WITH CHECK (true);
 
+CREATE POLICY "Allow public read access" ON leader_leases FOR SELECT USING (true);
+CREATE POLICY "Allow public insert access" ON leader_leases FOR INSERT WITH CHECK (true);
+CREATE POLICY "Allow public update access" ON leader_leases FOR UPDATE USING (true);
+
+CREATE POLICY "Allow public read access" ON work_queue FOR SELECT USING (true);
+CREATE POLICY "Allow public insert access" ON work_queue FOR INSERT WITH CHECK (true);
+CREATE POLICY "Allow public update access" ON work_queue FOR UPDATE USING (true);
+CREATE POLICY "Allow public delete access" ON work_queue FOR DELETE USING (true);
+
+CREATE POLICY "Allow public read access" ON work_dead_letter FOR SELECT USING (true);
+CREATE POLICY "Allow public insert access" ON work_dead_letter FOR INSERT WITH CHECK (true);
+CREATE POLICY "Allow public delete access" ON work_dead_letter FOR DELETE USING (true);
+
 -- ============================================
 -- SEED DATA (Initial Units)
 -- ============================================
@@ -0,0 +1,189 @@
+"""
+Event Bus for Community Shield
+Fans incident, dispatch, unit and log changes out to Server-Sent Events
+subscribers. Each event is serialized once and shared by every client; each
+client gets a small bounded queue, and a replay buffer lets reconnecting
+clients resume from their last event id. Events come from this process's
+repository writes only: in cluster mode a client sees the writes of the
+worker it is connected to, not those of other workers.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+STREAM_HISTORY = int(os.environ.get("STREAM_HISTORY", "2000"))
+STREAM_CLIENT_QUEUE = int(os.environ.get("STREAM_CLIENT_QUEUE", "256"))
+STREAM_COALESCE_MS = float(os.environ.get("STREAM_COALESCE_MS", "250"))
+STREAM_KEEPALIVE = float(os.environ.get("STREAM_KEEPALIVE", "15"))
+
+EVENT_TYPES = ("incident", "dispatch", "unit", "log")
+
+
+class Subscriber:
+    """One connected client. Kept small: thousands of idle ones should cost little."""
+
+    __slots__ = ("queue", "types", "lagged")
+
+    def __init__(self, types: Optional[Set[str]], queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.types = types
+        self.lagged = False
+
+
+def _frame(event_id: int, event_type: str, data: Dict) -> bytes:
+    payload = json.dumps(data, separators=(",", ":"), default=str)
+    return f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n".encode("utf-8")
+
+
+class EventBus:
+    """
+    publish() never blocks: a client whose queue is full is disconnected
+    and replays what it missed from history when it reconnects.
+    Unit updates are coalesced per unit over a short window, so a unit
+    moving many times a second reaches clients a few times a second.
+    """
+
+    def __init__(self, history: int = STREAM_HISTORY, client_queue: int = STREAM_CLIENT_QUEUE,
+                 coalesce_ms: float = STREAM_COALESCE_MS, keepalive: float = STREAM_KEEPALIVE):
+        self.client_queue = client_queue
+        self.coalesce = coalesce_ms / 1000
+        self.keepalive = keepalive
+        self._history: deque = deque(maxlen=history)  # (event_id, event_type, frame)
+        self._subscribers: Set[Subscriber] = set()
+        self._pending_units: Dict[str, Dict] = {}
+        self._unit_timer: Optional[asyncio.TimerHandle] = None
+        self._last_id = 0
+
+        # Counters
+        self.published = 0
+        self.coalesced = 0
+        self.delivered = 0
+        self.disconnected_lagging = 0
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    # --- publishing -----------------------------------------------------
+    def publish(self, event_type: str, data: Dict) -> int:
+        """Serialize once, record in history and hand the frame to every matching subscriber."""
+        self._last_id += 1
+        frame = _frame(self._last_id, event_type, data)
+        self._history.append((self._last_id, event_type, frame))
+        self.published += 1
+
+        for subscriber in list(self._subscribers):
+            if subscriber.types is not None and event_type not in subscriber.types:
+                continue
+            try:
+                subscriber.queue.put_nowait(frame)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                subscriber.lagged = True
+                self._subscribers.discard(subscriber)
+                self.disconnected_lagging += 1
+        return self._last_id
+
+    def publish_unit(self, unit: Dict):
+        """Queue a unit update; later updates to the same unit within the window replace earlier ones."""
+        unit_id = str(unit.get("id"))
+        if unit_id in self._pending_units:
+            self.coalesced += 1
+            self._pending_units[unit_id].update(unit)
+        else:
+            self._pending_units[unit_id] = dict(unit)
+
+        if self._unit_timer is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.flush_units()
+                return
+            self._unit_timer = loop.call_later(self.coalesce, self.flush_units)
+
+    def flush_units(self):
+        if self._unit_timer is not None:
+            self._unit_timer.cancel()
+            self._unit_timer = None
+        pending, self._pending_units = self._pending_units, {}
+        for unit in pending.values():
+            self.publish("unit", unit)
+
+    def on_change(self, table: str, op: str, rows: List[Dict]):
+        """Repository change listener: map table writes to stream events."""
+        for row in rows:
+            if table == "incidents":
+                event_type = "dispatch" if op == "UPDATE" and row.get("assigned_unit_id") else "incident"
+                self.publish(event_type, {"op": op, "row": row})
+            elif table == "units":
+                self.publish_unit(row)
+            elif table == "logs":
+                self.publish("log", {"op": op, "row": row})
+
+    # --- subscribing ----------------------------------------------------
+    def subscribe(self, types: Optional[Set[str]] = None, cursor: Optional[int] = None) -> Subscriber:
+        """
+        Register a client. With a cursor (the last event id it saw), events
+        still in history are queued first; if the cursor has fallen out of
+        history or belongs to a previous server run, a "reset" event tells
+        the client to refetch its snapshot.
+        """
+        subscriber = Subscriber(types, self.client_queue)
+        if cursor is not None:
+            oldest = self._history[0][0] if self._history else self._last_id + 1
+            if cursor > self._last_id or cursor < oldest - 1:
+                subscriber.queue.put_nowait(_frame(self._last_id, "reset", {"cursor": self._last_id}))
+            else:
+                missed = [frame for event_id, event_type, frame in self._history
+                          if event_id > cursor and (types is None or event_type in types)]
+                if len(missed) >= self.client_queue:
+                    subscriber.queue.put_nowait(_frame(self._last_id, "reset", {"cursor": self._last_id}))
+                else:
+                    for frame in missed:
+                        subscriber.queue.put_nowait(frame)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    async def stream(self, subscriber: Subscriber) -> AsyncIterator[bytes]:
+        """SSE body for one client: queued frames, with a comment line as keep-alive when idle."""
+        try:
+            yield f"retry: 2000\n: connected {time.time():.3f}\n\n".encode("utf-8")
+            while True:
+                if subscriber.lagged and subscriber.queue.empty():
+                    return  # The client reconnects with Last-Event-ID and replays from history
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), timeout=self.keepalive)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                yield frame
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> Dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "last_event_id": self._last_id,
+            "history": len(self._history),
+            "published": self.published,
+            "delivered": self.delivered,
+            "coalesced_unit_updates": self.coalesced,
+            "disconnected_lagging": self.disconnected_lagging,
+        }
+
+
+_event_bus: Optional[EventBus] = None
+
+
+def get_event_bus() -> EventBus:
+    """Process-wide event bus fed by repository change listeners."""
+    global _event_bus
+    if _event_bus is None:
+        _event_bus = EventBus()
+    return _event_bus
@@ -0,0 +1,231 @@
+"""
+Nairobi Gazetteer and Fast-Path Extractor for Community Shield
+One registry of areas, landmarks and crime types shared by the Analyst prompt,
+Sentinel, simulator, Twitter monitor and map zoom. Reports that name a known
+crime type and place (or carry coordinates) are resolved here without an LLM call.
+"""
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from spatial_index import haversine_km
+from text_matcher import KeywordAutomaton
+
+# ============================================
+# Registry
+# ============================================
+AREAS = {
+    "cbd": {"name": "CBD", "lat": -1.2834, "lng": 36.8235,
+            "aliases": ["cbd", "nairobi cbd", "city centre", "city center", "town centre"]},
+    "westlands": {"name": "Westlands", "lat": -1.2635, "lng": 36.8024, "aliases": ["westlands"]},
+    "kibera": {"name": "Kibera", "lat": -1.3120, "lng": 36.7890, "aliases": ["kibera"]},
+    "eastleigh": {"name": "Eastleigh", "lat": -1.2760, "lng": 36.8480, "aliases": ["eastleigh"]},
+    "karen": {"name": "Karen", "lat": -1.3200, "lng": 36.7050, "aliases": ["karen"]},
+    "thika_road": {"name": "Thika Road", "lat": -1.2200, "lng": 36.8900, "aliases": ["thika road", "thika rd", "roysambu"]},
+    "parklands": {"name": "Parklands", "lat": -1.2667, "lng": 36.8333, "aliases": ["parklands"]},
+    "south_c": {"name": "South C", "lat": -1.3167, "lng": 36.8333, "aliases": ["south c"]},
+    "industrial_area": {"name": "Industrial Area", "lat": -1.3167, "lng": 36.8500, "aliases": ["industrial area"]},
+}
+
+LANDMARKS = {
+    "archives": {"name": "CBD near Archives", "area": "cbd", "lat": -1.2834, "lng": 36.8235,
+                 "aliases": ["archives", "kenya national archives"]},
+    "moi_avenue": {"name": "CBD, Moi Avenue", "area": "cbd", "lat": -1.2834, "lng": 36.8235,
+                   "aliases": ["moi avenue", "moi ave"]},
+    "sarit": {"name": "Westlands near Sarit", "area": "westlands", "lat": -1.2635, "lng": 36.8024,
+              "aliases": ["sarit", "sarit centre", "sarit center"]},
+    "westlands_mall": {"name": "Westlands Mall", "area": "westlands", "lat": -1.2674, "lng": 36.8075,
+                       "aliases": ["westlands mall"]},
+    "kibera_dc": {"name": "Kibera near DC", "area": "kibera", "lat": -1.3120, "lng": 36.7890,
+                  "aliases": ["kibera dc", "kibera near dc"]},
+    "eastleigh_1st_ave": {"name": "Eastleigh 1st Ave", "area": "eastleigh", "lat": -1.2760, "lng": 36.8480,
+                          "aliases": ["eastleigh 1st ave", "1st avenue eastleigh", "first avenue eastleigh"]},
+    "karen_shopping_center": {"name": "Karen Shopping Center", "area": "karen", "lat": -1.3200, "lng": 36.7050,
+                              "aliases": ["karen shopping center", "karen shopping centre"]},
+    "thika_road_mall": {"name": "Thika Road Mall", "area": "thika_road", "lat": -1.2200, "lng": 36.8900,
+                        "aliases": ["thika road mall", "trm"]},
+}
+
+CRIME_TYPES = {
+    "Robbery": {"severity": "High", "aliases": ["robbery", "robbed", "armed robbery", "mugging", "mugged", "hold-up"]},
+    "Assault": {"severity": "High", "aliases": ["assault", "assaulted", "attack", "attacked", "stabbing", "fight"]},
+    "Traffic Accident": {"severity": "Medium", "aliases": ["traffic accident", "accident", "crash", "collision", "hit and run"]},
+    "Gunfire": {"severity": "Critical", "aliases": ["gunfire", "gunshots", "gunshot", "shots fired", "shooting"]},
+    "Suspicious Activity": {"severity": "Low", "aliases": ["suspicious activity"]},
+    "Medical Emergency": {"severity": "High", "aliases": ["medical emergency", "collapsed", "unconscious"]},
+    "Theft": {"severity": "Medium", "aliases": ["theft", "stolen", "pickpocket", "pickpocketed", "snatched", "shoplifting"]},
+    "Carjacking": {"severity": "Critical", "aliases": ["carjacking", "carjacked", "hijacking", "hijacked"]},
+    "Burglary": {"severity": "High", "aliases": ["burglary", "break-in", "broke into", "home invasion"]},
+}
+
+# Explicit coordinates, accepted only inside the greater Nairobi bounding box
+COORDINATES_PATTERN = re.compile(r"(-?\d{1,2}\.\d{2,})\s*,\s*(-?\d{1,3}\.\d{2,})")
+NAIROBI_BOUNDS = (-1.50, 36.60, -1.10, 37.10)  # (min_lat, min_lng, max_lat, max_lng)
+
+GAZETTEER_MIN_CONFIDENCE = float(os.environ.get("GAZETTEER_MIN_CONFIDENCE", "0.8"))
+
+
+def coords(key: str) -> Dict[str, float]:
+    """Coordinates of an area or landmark as {"lat", "lng"}."""
+    entry = LANDMARKS.get(key) or AREAS[key]
+    return {"lat": entry["lat"], "lng": entry["lng"]}
+
+
+def landmark_prompt_lines() -> str:
+    """Known places formatted for an LLM system prompt."""
+    lines = [f"- {area['name']}: {area['lat']}, {area['lng']}" for area in AREAS.values()]
+    for landmark in LANDMARKS.values():
+        area = AREAS[landmark["area"]]
+        if (landmark["lat"], landmark["lng"]) != (area["lat"], area["lng"]):
+            lines.append(f"- {landmark['name']}: {landmark['lat']}, {landmark['lng']}")
+    return "\n".join(lines)
+
+
+def _build_place_matcher() -> KeywordAutomaton:
+    matcher = KeywordAutomaton()
+    for key, landmark in LANDMARKS.items():
+        for alias in landmark["aliases"]:
+            matcher.add(alias, ("landmark", key))
+    for key, area in AREAS.items():
+        for alias in area["aliases"]:
+            matcher.add(alias, ("area", key))
+    matcher.build()
+    return matcher
+
+
+def _build_crime_matcher() -> KeywordAutomaton:
+    matcher = KeywordAutomaton()
+    for crime_type, spec in CRIME_TYPES.items():
+        matcher.add(crime_type, crime_type)
+        for alias in spec["aliases"]:
+            matcher.add(alias, crime_type)
+    matcher.build()
+    return matcher
+
+
+PLACE_MATCHER = _build_place_matcher()
+CRIME_MATCHER = _build_crime_matcher()
+
+
+def locate(text: str) -> Optional[Dict]:
+    """
+    Best place named in the text: the most specific match wins
+    (landmark over area), ties go to the first mention.
+    """
+    best = None
+    for match in PLACE_MATCHER.find_longest(text):
+        kind, key = match.payload
+        rank = 0 if kind == "landmark" else 1
+        if best is None or rank < best[0]:
+            best = (rank, kind, key)
+    if best is None:
+        return None
+    _, kind, key = best
+    entry = LANDMARKS[key] if kind == "landmark" else AREAS[key]
+    return {"kind": kind, "key": key, "name": entry["name"], "lat": entry["lat"], "lng": entry["lng"]}
+
+
+def explicit_coordinates(text: str) -> Optional[Tuple[float, float]]:
+    min_lat, min_lng, max_lat, max_lng = NAIROBI_BOUNDS
+    for raw_lat, raw_lng in COORDINATES_PATTERN.findall(text):
+        lat, lng = float(raw_lat), float(raw_lng)
+        if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng:
+            return lat, lng
+    return None
+
+
+def nearest_place(lat: float, lng: float) -> Dict:
+    key, entry = min(LANDMARKS.items(), key=lambda item: haversine_km(lat, lng, item[1]["lat"], item[1]["lng"]))
+    return {"kind": "landmark", "key": key, "name": entry["name"], "lat": entry["lat"], "lng": entry["lng"]}
+
+
+def extract(raw_text: str) -> Dict:
+    """
+    Deterministic extraction of type, severity, location and lat/lng.
+    Returns the analysis plus a "confidence" in [0, 1]; callers fall back
+    to the LLM below GAZETTEER_MIN_CONFIDENCE.
+    """
+    crime_types = list(dict.fromkeys(match.payload for match in CRIME_MATCHER.find_longest(raw_text)))
+    place = locate(raw_text)
+    point = explicit_coordinates(raw_text)
+
+    confidence = 0.0
+    if crime_types:
+        confidence += 0.4 if len(crime_types) == 1 else 0.2  # Conflicting types are left to the LLM
+    if point is not None:
+        confidence += 0.5
+        place = place or nearest_place(*point)
+    elif place is not None:
+        confidence += 0.5 if place["kind"] == "landmark" else 0.4
+    if crime_types and (place or point):
+        confidence += 0.1
+
+    crime_type = crime_types[0] if crime_types else "Unknown"
+    lat, lng = point if point is not None else ((place["lat"], place["lng"]) if place else (None, None))
+    location = place["name"] if place else "Unknown"
+    return {
+        "type": crime_type,
+        "severity": CRIME_TYPES[crime_type]["severity"] if crime_types else "Medium",
+        "location": location,
+        "lat": lat,
+        "lng": lng,
+        "summary": f"{crime_type} reported at {location}",
+        "method": "Gazetteer",
+        "confidence": round(min(confidence, 1.0), 2),
+    }
+
+
+class FastPathStats:
+    """Share of reports resolved without a network call, and latency of each path (gazetteer, LLM cache, LLM)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.fast = 0
+        self.cached = 0
+        self.llm = 0
+        self.fast_seconds = 0.0
+        self.cached_seconds = 0.0
+        self.llm_seconds = 0.0
+
+    def record(self, fast: bool, seconds: float):
+        with self._lock:
+            if fast:
+                self.fast += 1
+                self.fast_seconds += seconds
+            else:
+                self.llm += 1
+                self.llm_seconds += seconds
+
+    def record_cache_hit(self, seconds: float):
+        """A report the gazetteer could not resolve, answered from the LLM cache."""
+        with self._lock:
+            self.cached += 1
+            self.cached_seconds += seconds
+
+    def stats(self) -> Dict:
+        total = self.fast + self.cached + self.llm
+        return {
+            "fast_path": self.fast,
+            "cache_path": self.cached,
+            "llm_path": self.llm,
+            "fast_path_ratio": round(self.fast / total, 4) if total else 0.0,
+            "cache_path_ratio": round(self.cached / total, 4) if total else 0.0,
+            "fast_path_avg_ms": round(self.fast_seconds / self.fast * 1000, 3) if self.fast else 0.0,
+            "cache_path_avg_ms": round(self.cached_seconds / self.cached * 1000, 3) if self.cached else 0.0,
+            "llm_path_avg_ms": round(self.llm_seconds / self.llm * 1000, 3) if self.llm else 0.0,
+        }
+
+
+fast_path_stats = FastPathStats()
+
+
+def try_fast_path(raw_text: str) -> Optional[Dict]:
+    """Resolve a report from the gazetteer if confident enough, recording the timing."""
+    started = time.perf_counter()
+    analysis = extract(raw_text)
+    if analysis["confidence"] >= GAZETTEER_MIN_CONFIDENCE and analysis["lat"] is not None:
+        fast_path_stats.record(True, time.perf_counter() - started)
+        return analysis
+    return None
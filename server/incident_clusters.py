@@ -0,0 +1,237 @@
+"""
+Near-duplicate Incident Clustering for Community Shield
+Matches each new report against recent incidents of the same type nearby
+(a space-time window over a grid index) and compares SimHash fingerprints of
+the report text, so one event reported by Sentinel, Twitter and a citizen
+becomes one incident with a report_count instead of three rows and three
+dispatches.
+"""
+import hashlib
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+import gazetteer
+from llm_cache import normalize_text
+from spatial_index import UnitIndex
+
+CLUSTER_RADIUS_KM = float(os.environ.get("CLUSTER_RADIUS_KM", "0.5"))
+CLUSTER_WINDOW_SECONDS = float(os.environ.get("CLUSTER_WINDOW_MINUTES", "30")) * 60
+CLUSTER_SIMHASH_DISTANCE = int(os.environ.get("CLUSTER_SIMHASH_DISTANCE", "24"))  # Max differing bits of 64
+
+SEVERITY_ORDER = {"Low": 0, "Medium": 1, "High": 2, "Critical": 3}
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word unigrams and bigrams of the normalized text."""
+    words = normalize_text(text).split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if not features:
+        return 0
+    counts = [0] * 64
+    for feature in features:
+        value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        for bit in range(64):
+            counts[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if counts[bit] > 0)
+
+
+def canonical_type(incident_type: Optional[str]) -> str:
+    """Map free-form types ("Armed robbery", "mugging") onto the gazetteer's crime types."""
+    match = gazetteer.CRIME_MATCHER.first(incident_type or "")
+    return match.payload if match else (incident_type or "Unknown").strip().title()
+
+
+class Cluster:
+    __slots__ = ("key", "incident_id", "lat", "lng", "type", "severity", "fingerprint",
+                 "last_seen", "report_count", "pending_reports")
+
+    def __init__(self, key: str, lat: float, lng: float, incident_type: str, severity: str,
+                 fingerprint: int, seen_at: float):
+        self.key = key
+        self.incident_id: Optional[str] = None
+        self.lat = lat
+        self.lng = lng
+        self.type = incident_type
+        self.severity = severity
+        self.fingerprint = fingerprint
+        self.last_seen = seen_at
+        self.report_count = 1
+        self.pending_reports = 0  # Merged before the incident row existed
+
+
+class IncidentClusterer:
+    """
+    match() finds the cluster a report belongs to, if any; open() starts a new
+    one. A cluster stays open for window_seconds after its latest report.
+    Reports matching a cluster whose incident is still being persisted are
+    counted and folded into the row when attach() gives it an id; if the
+    incident is never written, discard() drops the cluster. Clusters are per
+    process: in cluster mode, duplicates handled by different workers are only
+    merged if the first incident was written before warm() ran.
+    """
+
+    def __init__(self, radius_km: float = CLUSTER_RADIUS_KM, window_seconds: float = CLUSTER_WINDOW_SECONDS,
+                 max_distance: int = CLUSTER_SIMHASH_DISTANCE):
+        self.radius_km = radius_km
+        self.window_seconds = window_seconds
+        self.max_distance = max_distance
+        self._index = UnitIndex(cell_km=max(radius_km, 0.1))
+        self._clusters: Dict[str, Cluster] = {}
+        self._expiry: deque = deque()  # (expires_at, key), lazily re-queued when a cluster is extended
+        self._next_key = 0
+
+        # Counters
+        self.reports = 0
+        self.merged = 0
+        self.discarded = 0
+
+    def _expire(self, now: float):
+        while self._expiry and self._expiry[0][0] <= now:
+            _, key = self._expiry.popleft()
+            cluster = self._clusters.get(key)
+            if cluster is None:
+                continue
+            expires_at = cluster.last_seen + self.window_seconds
+            if expires_at > now:
+                self._expiry.append((expires_at, key))
+                continue
+            del self._clusters[key]
+            self._index.remove(key)
+
+    def match(self, lat: float, lng: float, incident_type: str, text: str,
+              now: Optional[float] = None) -> Tuple[Optional[Cluster], int]:
+        """Best open cluster for a report, plus the report's fingerprint for open(). Read-only."""
+        now = time.time() if now is None else now
+        self._expire(now)
+        fingerprint = simhash(text)
+        kind = canonical_type(incident_type)
+
+        best, best_score = None, None
+        for dist_km, key in self._index.within(float(lat), float(lng), self.radius_km):
+            cluster = self._clusters[key]
+            if cluster.type != kind and "Unknown" not in (cluster.type, kind):
+                continue
+            distance = (cluster.fingerprint ^ fingerprint).bit_count()
+            if distance > self.max_distance:
+                continue
+            score = (distance, dist_km)
+            if best_score is None or score < best_score:
+                best, best_score = cluster, score
+        return best, fingerprint
+
+    def open(self, lat: float, lng: float, incident_type: str, severity: str, fingerprint: int,
+             incident_id: Optional[str] = None, now: Optional[float] = None) -> Cluster:
+        now = time.time() if now is None else now
+        self._next_key += 1
+        key = f"c{self._next_key}"
+        cluster = Cluster(key, float(lat), float(lng), canonical_type(incident_type), severity, fingerprint, now)
+        cluster.incident_id = incident_id
+        self._clusters[key] = cluster
+        self._index.upsert(key, cluster.lat, cluster.lng)
+        self._expiry.append((now + self.window_seconds, key))
+        return cluster
+
+    def merge(self, cluster: Cluster, severity: Optional[str], now: Optional[float] = None) -> bool:
+        """Count a duplicate report. Returns True if it raised the cluster's severity."""
+        cluster.last_seen = time.time() if now is None else now
+        cluster.report_count += 1
+        if cluster.incident_id is None:
+            cluster.pending_reports += 1
+        self.merged += 1
+        if SEVERITY_ORDER.get(severity, -1) > SEVERITY_ORDER.get(cluster.severity, -1):
+            cluster.severity = severity
+            return True
+        return False
+
+    def unmerge(self, cluster: Cluster):
+        """Take back a merge whose incident update failed, so the report's retry counts it once."""
+        cluster.report_count -= 1
+        if cluster.incident_id is None:
+            cluster.pending_reports -= 1
+        self.merged -= 1
+
+    def attach(self, cluster: Cluster, incident_id: str) -> int:
+        """Record the persisted incident id; returns reports merged while it was being written."""
+        cluster.incident_id = incident_id
+        pending, cluster.pending_reports = cluster.pending_reports, 0
+        return pending
+
+    def discard(self, cluster: Cluster):
+        """Drop a cluster whose incident could not be written, so it stops absorbing reports."""
+        if self._clusters.pop(cluster.key, None) is not None:
+            self._index.remove(cluster.key)
+            self.merged -= cluster.pending_reports
+            self.discarded += 1
+
+    async def warm(self, repo) -> int:
+        """Open clusters for incidents already written within the window (e.g. by another process)."""
+        since = (datetime.now(timezone.utc) - timedelta(seconds=self.window_seconds)).isoformat()
+        try:
+            rows = await repo.list_incidents(limit=500, since=since)
+        except Exception as e:
+            print(f"Error loading recent incidents for clustering: {e}")
+            return 0
+        opened = 0
+        for row in reversed(rows):
+            if row.get("lat") is None or row.get("lng") is None:
+                continue
+            seen_at = datetime.fromisoformat(row["created_at"].replace("Z", "+00:00")).timestamp() \
+                if row.get("created_at") else time.time()
+            cluster, fingerprint = self.match(row["lat"], row["lng"], row.get("type"),
+                                              row.get("raw_text") or row.get("summary") or "", now=seen_at)
+            if cluster is None:
+                cluster = self.open(row["lat"], row["lng"], row.get("type"), row.get("severity"),
+                                    fingerprint, row["id"], now=seen_at)
+                cluster.report_count = int(row.get("report_count") or 1)
+                opened += 1
+        return opened
+
+    async def merge_or_insert(self, repo, incident: Dict, text: str) -> Tuple[Optional[Dict], bool]:
+        """
+        For writers that persist directly (the Twitter monitor): merge into an
+        open cluster's incident, or insert a new row. Returns (row, merged);
+        row is None when merged into an incident that is still being written.
+        """
+        self.reports += 1
+        cluster, fingerprint = self.match(incident["lat"], incident["lng"], incident.get("type"), text)
+        if cluster is not None:
+            escalated = self.merge(cluster, incident.get("severity"))
+            if cluster.incident_id is None:
+                return None, True  # Folded into the row when the pipeline attaches it
+            changes = {"report_count": cluster.report_count}
+            if escalated:
+                changes["severity"] = cluster.severity
+            try:
+                row = await repo.update_incident(cluster.incident_id, changes)
+            except Exception:
+                self.unmerge(cluster)
+                raise
+            return row or {"id": cluster.incident_id, **changes}, True
+
+        row = await repo.insert_incident(incident)
+        self.open(incident["lat"], incident["lng"], incident.get("type"), incident.get("severity"),
+                  fingerprint, row["id"])
+        return row, False
+
+    def stats(self) -> Dict:
+        return {
+            "open_clusters": len(self._clusters),
+            "reports": self.reports,
+            "merged": self.merged,
+            "discarded": self.discarded,
+            "merge_ratio": round(self.merged / self.reports, 4) if self.reports else 0.0,
+        }
+
+
+_clusterer: Optional[IncidentClusterer] = None
+
+
+def get_incident_clusterer() -> IncidentClusterer:
+    """Process-wide clusterer shared by the pipeline and the Twitter monitor."""
+    global _clusterer
+    if _clusterer is None:
+        _clusterer = IncidentClusterer()
+    return _clusterer
@@ -0,0 +1,477 @@
+"""
+Durable Ingest Log for Community Shield
+Raw reports and fetched tweets are appended to an on-disk write-ahead log
+before anything else happens to them, and a consumer feeds them on from
+there. A record is committed only once its handler is done with it (for a
+report: stored, merged into a known incident or discarded as unlocatable);
+a failed analysis or write is retried with exponential backoff. After a
+crash or restart the consumer redelivers the records that were unfinished
+and resumes after the last one it had read, so nothing is lost: delivery is
+at-least-once. A retry within a run resumes where the report failed; one
+that was in flight at a crash arrives again and folds into its own incident
+through the duplicate clusters. Appending only touches the local disk, so a
+burst far beyond LLM throughput waits in the log and drains at the
+pipeline's pace.
+
+Layout: <dir>/<base offset>.log segments of length-prefixed, CRC-checked
+JSON records; <dir>/consumer.offset holding the read position and the
+offsets still unfinished below it; and
+<dir>/dead_letter.jsonl for records that failed every attempt.
+"""
+import asyncio
+import heapq
+import json
+import os
+import random
+import struct
+import time
+import zlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+INGEST_LOG_DIR = os.environ.get(
+    "INGEST_LOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "ingest_log")
+)
+INGEST_LOG_SEGMENT_BYTES = int(os.environ.get("INGEST_LOG_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+INGEST_LOG_FSYNC_INTERVAL = float(os.environ.get("INGEST_LOG_FSYNC_INTERVAL", "1"))  # 0: fsync every append
+INGEST_LOG_COMMIT_INTERVAL = float(os.environ.get("INGEST_LOG_COMMIT_INTERVAL", "1"))
+INGEST_LOG_MAX_IN_FLIGHT = int(os.environ.get("INGEST_LOG_MAX_IN_FLIGHT", "100"))  # Includes records awaiting a retry
+INGEST_LOG_MAX_ATTEMPTS = int(os.environ.get("INGEST_LOG_MAX_ATTEMPTS", "8"))
+INGEST_LOG_RETRY_BASE = float(os.environ.get("INGEST_LOG_RETRY_BASE", "2"))  # Seconds before the first retry
+INGEST_LOG_RETRY_MAX = float(os.environ.get("INGEST_LOG_RETRY_MAX", "300"))
+
+HEADER = struct.Struct("<II")  # payload length, crc32(payload)
+SEGMENT_SUFFIX = ".log"
+OFFSET_FILE = "consumer.offset"
+DEAD_LETTER_FILE = "dead_letter.jsonl"
+LOCK_FILE = ".lock"
+
+Handler = Callable[[Dict], Awaitable[Any]]
+
+
+def _scan(path: str) -> Tuple[int, int]:
+    """(records, bytes) of the intact prefix of a segment; anything after is a torn write."""
+    count = valid = 0
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                break
+            length, crc = HEADER.unpack(header)
+            data = f.read(length)
+            if len(data) < length or zlib.crc32(data) != crc:
+                break
+            count += 1
+            valid += HEADER.size + length
+    return count, valid
+
+
+class IngestLog:
+    """
+    Producer and consumer side of the log, shaped like the work queue:
+    handlers are registered per record kind, put() appends, and one consumer
+    task delivers records in offset order. At most max_in_flight records
+    (delivered or waiting for a retry) are held in memory; the rest stay on
+    disk until there is room. A slow or retrying record never holds back the
+    records after it; it only keeps its segment (the committed offset is the
+    lowest unfinished record) from being deleted.
+
+    Only one process may open a directory (an flock on <dir>/.lock).
+    """
+
+    def __init__(self, path: str = INGEST_LOG_DIR, segment_bytes: int = INGEST_LOG_SEGMENT_BYTES,
+                 fsync_interval: float = INGEST_LOG_FSYNC_INTERVAL,
+                 commit_interval: float = INGEST_LOG_COMMIT_INTERVAL,
+                 max_in_flight: int = INGEST_LOG_MAX_IN_FLIGHT, max_attempts: int = INGEST_LOG_MAX_ATTEMPTS,
+                 retry_base: float = INGEST_LOG_RETRY_BASE, retry_max: float = INGEST_LOG_RETRY_MAX):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.commit_interval = commit_interval
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.handlers: Dict[str, Handler] = {}
+
+        self._lock_fd: Optional[int] = None
+        self._bases: List[int] = []  # Segment base offsets, oldest first; the last one is written to
+        self._writer = None
+        self._active_size = 0
+        self._unsynced = False
+        self._synced_at = 0.0
+        self.next_offset = 0
+
+        self._reader = None
+        self._reader_base: Optional[int] = None
+        self._read_offset = 0
+        self._pending: Dict[int, int] = {}  # offset -> attempts, for records delivered or awaiting a retry
+        self._retries: List[Tuple[float, int, Dict]] = []  # (due, offset, record) heap
+        self._replay: List[int] = []  # Offsets left unfinished by the previous run, redelivered first
+        self._saved_position: Optional[Tuple] = None
+        self._maintained_at = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._deliveries: Set[asyncio.Task] = set()
+
+        # Counters
+        self.appended = 0
+        self.delivered = 0
+        self.acked = 0
+        self.failed = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.recovered = 0
+        self.truncated_bytes = 0
+
+    def handle(self, kind: str, handler: Handler):
+        self.handlers[kind] = handler
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    # --- segments ---------------------------------------------------------
+    def _segment_path(self, base: int) -> str:
+        return os.path.join(self.path, f"{base:020d}{SEGMENT_SUFFIX}")
+
+    def open(self):
+        """Lock the directory, truncate any torn tail and position the reader at the committed offset."""
+        if self.is_open:
+            return
+        import fcntl  # POSIX only
+
+        os.makedirs(self.path, exist_ok=True)
+        fd = os.open(os.path.join(self.path, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            raise RuntimeError(f"Ingest log {self.path} is open in another process")
+        self._lock_fd = fd
+
+        position = None
+        try:
+            with open(os.path.join(self.path, OFFSET_FILE)) as f:
+                saved = json.load(f)
+            position = (int(saved.get("read", saved["committed"])), [int(o) for o in saved.get("pending", [])])
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"⚠️ Could not read ingest log offset: {e}. Replaying from the oldest segment.")
+
+        self._bases = sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.path)
+                             if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit())
+        end = 0
+        for base in self._bases:
+            path = self._segment_path(base)
+            count, valid = _scan(path)
+            size = os.path.getsize(path)
+            if valid < size:
+                print(f"⚠️ Ingest log segment {base} has a torn tail; dropping {size - valid} bytes")
+                with open(path, "r+b") as f:
+                    f.truncate(valid)
+                self.truncated_bytes += size - valid
+            end = base + count
+            self._active_size = valid
+        oldest = self._bases[0] if self._bases else 0
+        read, pending = position or (oldest, [])
+        read = max(read, oldest)
+        self.next_offset = max(end, read)
+
+        if not self._bases or self._active_size >= self.segment_bytes:
+            self._bases.append(self.next_offset)
+            self._active_size = 0
+        self._writer = open(self._segment_path(self._bases[-1]), "ab")
+        self._read_offset = read
+        self._replay = sorted(offset for offset in set(pending) if oldest <= offset < read)
+        self._pending = {offset: 0 for offset in self._replay}
+        self._saved_position = None
+        self.recovered = len(self._replay) + self.next_offset - read
+        if self.recovered:
+            print(f"📥 Ingest log: {self.recovered} unfinished records to deliver")
+
+    def close(self):
+        self._commit(force=True)
+        self._close_reader()
+        if self._writer is not None:
+            self._sync(force=True)
+            self._writer.close()
+            self._writer = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # Closing the descriptor drops the flock
+            self._lock_fd = None
+
+    def _roll(self):
+        self._sync(force=True)
+        self._writer.close()
+        self._bases.append(self.next_offset)
+        self._writer = open(self._segment_path(self.next_offset), "ab")
+        self._active_size = 0
+
+    def _sync(self, force: bool = False):
+        if self._unsynced and (force or time.monotonic() - self._synced_at >= self.fsync_interval):
+            os.fsync(self._writer.fileno())
+            self._unsynced = False
+            self._synced_at = time.monotonic()
+
+    # --- producer ---------------------------------------------------------
+    def append(self, kind: str, payload: Dict) -> int:
+        """Write one record and return its offset. Flushed to the OS at once, fsync'd per fsync_interval."""
+        if not self.is_open:
+            raise RuntimeError("Ingest log is not open")
+        data = json.dumps({"kind": kind, "payload": payload, "appended_at": time.time()},
+                          separators=(",", ":")).encode("utf-8")
+        if self._active_size >= self.segment_bytes:
+            self._roll()
+        self._writer.write(HEADER.pack(len(data), zlib.crc32(data)) + data)
+        self._writer.flush()
+        self._active_size += HEADER.size + len(data)
+        self._unsynced = True
+        if self.fsync_interval <= 0:
+            self._sync(force=True)
+
+        offset = self.next_offset
+        self.next_offset += 1
+        self.appended += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return offset
+
+    async def put(self, kind: str, payload: Dict):
+        """Async form of append, interchangeable with WorkQueue.put as a producer's ingest."""
+        self.append(kind, payload)
+
+    # --- consumer ---------------------------------------------------------
+    def _close_reader(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+            self._reader_base = None
+
+    def _open_at(self, offset: int):
+        """(file, base) of the segment holding offset, positioned at that record."""
+        base = max(b for b in self._bases if b <= offset)
+        f = open(self._segment_path(base), "rb")
+        for _ in range(offset - base):
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                break
+            f.seek(HEADER.unpack(header)[0], os.SEEK_CUR)
+        return f, base
+
+    @staticmethod
+    def _read_record(f) -> Optional[Dict]:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return None
+        length, crc = HEADER.unpack(header)
+        data = f.read(length)
+        if len(data) < length or zlib.crc32(data) != crc:
+            return None
+        return json.loads(data)
+
+    def _open_reader(self) -> bool:
+        if not self._bases:
+            return False
+        if self._read_offset < self._bases[0]:
+            self._read_offset = self._bases[0]
+        self._reader, self._reader_base = self._open_at(self._read_offset)
+        return True
+
+    def _read_at(self, offset: int) -> Optional[Dict]:
+        """One record by offset (for redelivery after a restart)."""
+        if not self._bases or offset < self._bases[0]:
+            return None
+        f, _ = self._open_at(offset)
+        with f:
+            return self._read_record(f)
+
+    def _read_next(self) -> Optional[Tuple[int, Dict]]:
+        """The next unread record, or None when the reader has caught up with the writer."""
+        while self._read_offset < self.next_offset:
+            if self._reader is None and not self._open_reader():
+                return None
+            position = self._reader.tell()
+            record = self._read_record(self._reader)
+            if record is not None:
+                offset = self._read_offset
+                self._read_offset += 1
+                return offset, record
+            # End of this segment: move on to the next one, if the writer has
+            later = [b for b in self._bases if b > self._reader_base]
+            if not later:
+                self._reader.seek(position)
+                return None
+            self._close_reader()
+            self._read_offset = max(self._read_offset, later[0])
+        return None
+
+    def _next_record(self) -> Optional[Tuple[int, Dict]]:
+        """A retry that has come due, a record left over from the last run, else a new one if there is room."""
+        if self._retries and self._retries[0][0] <= time.monotonic():
+            _, offset, record = heapq.heappop(self._retries)
+            return offset, record
+        while self._replay:
+            offset = self._replay.pop(0)
+            record = self._read_at(offset)
+            if record is not None:
+                return offset, record
+            self._finish(offset)  # Lost with a torn tail
+        if len(self._pending) < self.max_in_flight:
+            entry = self._read_next()
+            if entry is not None:
+                self._pending[entry[0]] = 0
+            return entry
+        return None
+
+    async def _deliver(self, offset: int, record: Dict):
+        attempts = self._pending[offset] = self._pending[offset] + 1
+        self.delivered += 1
+        try:
+            handler = self.handlers.get(record.get("kind"))
+            if handler is None:
+                raise ValueError(f"no handler for {record.get('kind')!r}")
+            # A copy, so whatever the handler attaches is not written to the dead-letter file
+            await handler(dict(record["payload"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            # Errors that flag themselves as permanent (e.g. a rejected insert) would fail every retry too
+            if attempts >= self.max_attempts or not getattr(e, "retryable", True):
+                self._dead_letter(offset, record, e, attempts)
+                self._finish(offset)
+            else:
+                delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+                print(f"⚠️ Ingest record {offset} failed (attempt {attempts}): {e}. Retrying in {delay:.1f}s")
+                heapq.heappush(self._retries, (time.monotonic() + delay, offset, record))
+                self.retried += 1
+        else:
+            self.acked += 1
+            self._finish(offset)
+        finally:
+            self._wakeup.set()
+
+    def _finish(self, offset: int):
+        self._pending.pop(offset, None)
+
+    def _dead_letter(self, offset: int, record: Dict, error: Exception, attempts: int):
+        self.dead_lettered += 1
+        print(f"❌ Ingest record {offset} failed (attempt {attempts}, not retried); "
+              f"moved to {DEAD_LETTER_FILE}: {error}")
+        try:
+            with open(os.path.join(self.path, DEAD_LETTER_FILE), "a", encoding="utf-8") as f:
+                f.write(json.dumps({"offset": offset, "error": str(error), **record}) + "\n")
+        except OSError as e:
+            print(f"Error writing dead letter: {e}")
+
+    def committed_offset(self) -> int:
+        """Every record below this offset is finished."""
+        return min(self._pending) if self._pending else self._read_offset
+
+    def _commit(self, force: bool = False):
+        """Persist the consumer position (temp file + rename) and drop segments wholly below the commit."""
+        if not self.is_open:
+            return
+        committed = self.committed_offset()
+        position = (self._read_offset, tuple(sorted(self._pending)))
+        if position != self._saved_position:
+            tmp = os.path.join(self.path, f"{OFFSET_FILE}.tmp")
+            with open(tmp, "w") as f:
+                json.dump({"committed": committed, "read": position[0], "pending": list(position[1])}, f)
+                if force:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp, os.path.join(self.path, OFFSET_FILE))
+            self._saved_position = position
+
+        while len(self._bases) > 1 and self._bases[1] <= committed:
+            base = self._bases.pop(0)
+            if self._reader_base == base:
+                self._close_reader()
+            try:
+                os.remove(self._segment_path(base))
+            except OSError as e:
+                print(f"Error removing ingest log segment {base}: {e}")
+
+    def _maintain(self):
+        now = time.monotonic()
+        if now - self._maintained_at >= self.commit_interval:
+            self._maintained_at = now
+            self._commit()
+        self._sync()
+
+    async def _run(self):
+        while True:
+            try:
+                self._maintain()
+                entry = self._next_record()
+            except Exception as e:
+                print(f"Error reading ingest log: {e}")
+                entry = None
+            if entry is not None:
+                task = asyncio.create_task(self._deliver(*entry), name=f"ingest-{entry[0]}")
+                self._deliveries.add(task)
+                task.add_done_callback(self._deliveries.discard)
+                continue
+
+            timeout = min(self.commit_interval, self.fsync_interval or self.commit_interval)
+            if self._retries:
+                timeout = min(timeout, max(0.0, self._retries[0][0] - time.monotonic()))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self):
+        """Open the log (if needed) and start delivering to the handlers."""
+        self.open()
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="ingest-log")
+
+    async def stop(self):
+        """Stop delivering and close. Unfinished records are delivered again on the next start."""
+        tasks = ([self._task] if self._task else []) + list(self._deliveries)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._wakeup = None
+        # Records mid-delivery or awaiting a retry are saved as unfinished and redelivered on open
+        self.close()
+        self._pending.clear()
+        self._retries = []
+        self._replay = []
+
+    def stats(self) -> Dict:
+        committed = self.committed_offset()
+        return {
+            "open": self.is_open,
+            "segments": len(self._bases),
+            "next_offset": self.next_offset,
+            "committed_offset": committed,
+            "lag": self.next_offset - committed,
+            "in_flight": len(self._pending) - len(self._retries),
+            "retry_pending": len(self._retries),
+            "appended": self.appended,
+            "delivered": self.delivered,
+            "acked": self.acked,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+            "recovered": self.recovered,
+            "truncated_bytes": self.truncated_bytes,
+        }
+
+
+_ingest_log: Optional[IngestLog] = None
+
+
+def get_ingest_log() -> IngestLog:
+    """Process-wide ingest log fed by the Sentinel and the Twitter monitor."""
+    global _ingest_log
+    if _ingest_log is None:
+        _ingest_log = IngestLog()
+    return _ingest_log
@@ -0,0 +1,176 @@
+"""
+Leader Election for Community Shield
+In a multi-worker deployment (uvicorn --workers N, or several hosts) the API
+scales freely, but the background producers (Sentinel, the Twitter monitor,
+hotspot publishing) must run exactly once. Workers compete for one named
+lock; the holder runs the producers and keeps renewing, and when it dies
+another worker takes over.
+
+Two locks: a lease row in the database (any number of hosts; handover within
+one lease TTL) or an flock'd file (one host; the kernel drops the lock the
+moment its process dies, so handover is immediate).
+"""
+import asyncio
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+# "single": every background loop runs in this process (one worker).
+# "cluster": producers run on the elected leader; reports are shared out through the work queue.
+DEPLOYMENT_MODE = os.environ.get("DEPLOYMENT_MODE", "single")
+LEADER_ELECTION = os.environ.get("LEADER_ELECTION", "database")  # "database" lease, or "file" lock (one host)
+LEADER_LEASE_NAME = os.environ.get("LEADER_LEASE_NAME", "background")
+LEADER_LEASE_SECONDS = float(os.environ.get("LEADER_LEASE_SECONDS", "15"))
+LEADER_RENEW_INTERVAL = float(os.environ.get("LEADER_RENEW_INTERVAL", "5"))
+LEADER_LOCK_PATH = os.environ.get(
+    "LEADER_LOCK_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "leader.lock")
+)
+
+# Unique per process, readable in the lease table and work queue
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class DatabaseLease:
+    """A row in leader_leases, taken and renewed through the acquire_lease RPC."""
+
+    def __init__(self, repo, name: str = LEADER_LEASE_NAME, holder: str = WORKER_ID,
+                 ttl_seconds: float = LEADER_LEASE_SECONDS):
+        self.repo = repo
+        self.name = name
+        self.holder = holder
+        self.ttl_seconds = ttl_seconds
+        self.current_holder: Optional[str] = None
+
+    async def acquire(self) -> bool:
+        """Take or renew the lease; True while we hold it."""
+        lease = await self.repo.acquire_lease(self.name, self.holder, self.ttl_seconds)
+        self.current_holder = lease.get("holder") if lease else None
+        return self.current_holder == self.holder
+
+    async def release(self):
+        await self.repo.release_lease(self.name, self.holder)
+
+
+class FileLock:
+    """An exclusive flock on a local file: one leader per host."""
+
+    def __init__(self, path: str = LEADER_LOCK_PATH):
+        self.path = path
+        self._fd: Optional[int] = None
+        self.ttl_seconds = float("inf")  # Held for as long as the process lives
+
+    async def acquire(self) -> bool:
+        import fcntl  # POSIX only; use the database lease elsewhere
+
+        if self._fd is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, WORKER_ID.encode())
+        self._fd = fd
+        return True
+
+    async def release(self):
+        if self._fd is not None:
+            os.close(self._fd)  # Closing the descriptor drops the flock
+            self._fd = None
+
+
+def create_lock(repo):
+    """The configured lock: LEADER_ELECTION=file for one host, otherwise the database lease."""
+    if LEADER_ELECTION == "file":
+        return FileLock()
+    return DatabaseLease(repo)
+
+
+class LeaderElection:
+    """
+    Polls the lock every renew_interval. On winning it, on_elected starts the
+    producers; on losing it (or failing to renew it before it could expire),
+    on_deposed stops them. A leader that cannot reach the database steps down
+    early rather than run alongside the worker that takes over.
+    """
+
+    def __init__(self, lock, on_elected: Callable[[], Awaitable], on_deposed: Callable[[], Awaitable],
+                 renew_interval: float = LEADER_RENEW_INTERVAL):
+        self.lock = lock
+        self.on_elected = on_elected
+        self.on_deposed = on_deposed
+        self.renew_interval = renew_interval
+        self.is_leader = False
+        self._renewed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.elections = 0
+        self.depositions = 0
+        self.failed_renewals = 0
+
+    async def _set_leader(self, leader: bool):
+        if leader == self.is_leader:
+            return
+        self.is_leader = leader
+        if leader:
+            self.elections += 1
+            print(f"👑 {WORKER_ID} is now the leader")
+            await self.on_elected()
+        else:
+            self.depositions += 1
+            print(f"👑 {WORKER_ID} stepped down as leader")
+            await self.on_deposed()
+
+    async def check(self):
+        """One round: try to take or renew the lock and start/stop the producers to match."""
+        try:
+            held = await self.lock.acquire()
+        except Exception as e:
+            self.failed_renewals += 1
+            print(f"⚠️ Leader lock check failed: {e}")
+            # Keep leading only while the last renewal is certainly still valid
+            held = self.is_leader and time.monotonic() - self._renewed_at < self.lock.ttl_seconds - self.renew_interval
+        else:
+            if held:
+                self._renewed_at = time.monotonic()
+        await self._set_leader(held)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                print(f"Error in leader election: {e}")
+            await asyncio.sleep(self.renew_interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="leader-election")
+
+    async def stop(self):
+        """Stop competing; a leader stops its producers and hands the lock over at once."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.is_leader:
+            await self._set_leader(False)
+            try:
+                await self.lock.release()
+            except Exception as e:
+                print(f"Error releasing leader lock: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "worker": WORKER_ID,
+            "is_leader": self.is_leader,
+            "holder": getattr(self.lock, "current_holder", WORKER_ID if self.is_leader else None),
+            "elections": self.elections,
+            "depositions": self.depositions,
+            "failed_renewals": self.failed_renewals,
+        }
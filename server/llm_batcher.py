@@ -0,0 +1,167 @@
+"""
+LLM Micro-Batcher for Community Shield
+Collects concurrent requests for up to N items or T milliseconds, sends them
+as one structured completion and hands each caller its own result.
+"""
+import asyncio
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+LLM_BATCH_MAX_ITEMS = int(os.environ.get("LLM_BATCH_MAX_ITEMS", "8"))
+LLM_BATCH_MAX_WAIT_MS = float(os.environ.get("LLM_BATCH_MAX_WAIT_MS", "100"))
+
+BATCH_INSTRUCTIONS = """
+You will receive a JSON array of items, each with an "index" and an "input".
+Apply the instructions above to every item independently.
+Return ONLY a valid JSON object of the form {"results": [...]} with exactly one
+result object per item, each including the item's "index".
+"""
+
+
+def parse_batch_response(content: str, count: int, required_keys: Sequence[str] = ()) -> List[Optional[Dict]]:
+    """
+    Split a batched completion back into per-item results.
+    Items that are missing, duplicated or lack required keys come back as None.
+    """
+    results: List[Optional[Dict]] = [None] * count
+    try:
+        # Extract JSON from markdown code blocks if present
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0].strip()
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0].strip()
+        data = json.loads(content)
+    except (ValueError, IndexError):
+        return results
+
+    items = data.get("results") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return results
+
+    seen = set()
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        index = item.pop("index", position)
+        if not isinstance(index, int) or not 0 <= index < count or index in seen:
+            continue
+        seen.add(index)
+        if all(key in item for key in required_keys):
+            results[index] = item
+    return results
+
+
+def build_batch_messages(system_prompt: str, inputs: Sequence[Any]) -> List[Dict]:
+    return [
+        {"role": "system", "content": system_prompt + BATCH_INSTRUCTIONS},
+        {"role": "user", "content": json.dumps([{"index": i, "input": value} for i, value in enumerate(inputs)])},
+    ]
+
+
+class MicroBatcher:
+    """
+    submit() returns the result for one item. Items are flushed as one
+    batch_fn call when max_items are waiting or max_wait_ms has passed since
+    the first one arrived. batch_fn(items) must return a list aligned with
+    items; a None entry (malformed or missing in the response) falls back to
+    single_fn for that item. An exception from batch_fn (the provider failing,
+    not the response) is raised to every caller in the batch rather than
+    retried item by item against the same provider.
+    Both functions are blocking and run in worker threads. With a limiter
+    (rate_limits.ProviderLimiter) each call's budget is taken on the event
+    loop first, so no thread is handed out to wait for it.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Optional[Any]]],
+                 single_fn: Callable[[Any], Any], max_items: int = LLM_BATCH_MAX_ITEMS,
+                 max_wait_ms: float = LLM_BATCH_MAX_WAIT_MS, name: str = "llm", limiter: Any = None):
+        self.batch_fn = batch_fn
+        self.single_fn = single_fn
+        self.max_items = max(1, max_items)
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self.limiter = limiter
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._runs: set = set()
+
+        # Counters
+        self.batches = 0
+        self.batched_items = 0
+        self.fallbacks = 0
+        self.batch_errors = 0
+
+    async def submit(self, item: Any) -> Any:
+        if self.max_items == 1:
+            return await self._call(self.single_fn, item)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    async def _call(self, fn: Callable, arg: Any) -> Any:
+        if self.limiter is None:
+            return await asyncio.to_thread(fn, arg)
+        async with self.limiter.admit():
+            return await asyncio.to_thread(fn, arg)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending[:self.max_items], self._pending[self.max_items:]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        if batch:
+            task = asyncio.create_task(self._run(batch), name=f"{self.name}-batch")
+            self._runs.add(task)
+            task.add_done_callback(self._runs.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        items = [item for item, _ in batch]
+        results: List[Optional[Any]] = [None] * len(items)
+        batched = len(items) > 1  # A lone item goes straight to single_fn
+        if batched:
+            try:
+                results = await self._call(self.batch_fn, items)
+            except Exception as e:
+                self.batch_errors += 1
+                print(f"{self.name} batch error: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            if len(results) != len(items):
+                results = [None] * len(items)
+            self.batches += 1
+            self.batched_items += len(items)
+
+        async def resolve(item, future, result):
+            try:
+                if result is None:
+                    if batched:
+                        self.fallbacks += 1
+                    result = await self._call(self.single_fn, item)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+
+        await asyncio.gather(*(resolve(item, future, result) for (item, future), result in zip(batch, results)))
+
+    def stats(self) -> Dict:
+        return {
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "batched_items": self.batched_items,
+            "avg_batch_size": round(self.batched_items / self.batches, 2) if self.batches else 0.0,
+            "fallbacks": self.fallbacks,
+            "batch_errors": self.batch_errors,
+        }
@@ -0,0 +1,174 @@
+"""
+LLM Response Cache for Community Shield
+Content-addressed cache for deterministic (temperature=0) completions:
+an in-memory LRU with TTL in front of a SQLite store that survives restarts.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+LLM_CACHE_PATH = os.environ.get(
+    "LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "llm_cache.sqlite3")
+)
+LLM_CACHE_CAPACITY = int(os.environ.get("LLM_CACHE_CAPACITY", "5000"))
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # One week
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize, casefold and collapse whitespace so trivially different inputs share a key."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+class LLMCache:
+    """
+    Keys are sha256(model, sha256(system prompt), normalized input). Values are
+    stored as JSON text and decoded on every hit, so callers get a fresh dict
+    they can enrich without corrupting the cache. Safe to use from the worker
+    threads the pipeline runs LLM calls in. On the event loop use get_async /
+    set_async, which answer from memory inline and only send SQLite to a thread.
+    """
+
+    def __init__(self, path: Optional[str] = LLM_CACHE_PATH, capacity: int = LLM_CACHE_CAPACITY,
+                 ttl: float = LLM_CACHE_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, json)
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        # Counters
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def make_key(text: str, model: str, system_prompt: str) -> str:
+        prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+        payload = "\x1f".join((model, prompt_hash, normalize_text(text)))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = self._get_memory(key)
+        return value if value is not None else self._get_disk(key)
+
+    async def get_async(self, key: str) -> Optional[Dict]:
+        value = self._get_memory(key)
+        if value is not None:
+            return value
+        if self._db is None:
+            return self._get_disk(key)
+        return await asyncio.to_thread(self._get_disk, key)
+
+    def _get_memory(self, key: str) -> Optional[Dict]:
+        """A hit from the in-memory tier, or None (not counted as a miss)."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if entry[0] > time.time():
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return json.loads(entry[1])
+            del self._memory[key]
+            self.expirations += 1
+            return None
+
+    def _get_disk(self, key: str) -> Optional[Dict]:
+        """The SQLite tier, after a memory miss."""
+        with self._lock:
+            if self._db is not None:
+                row = self._db.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if row[1] > time.time():
+                        self._remember(key, row[1], row[0])
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return json.loads(row[0])
+                    self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self.expirations += 1
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Dict):
+        expires_at, encoded = self._set_memory(key, value)
+        self._set_disk(key, expires_at, encoded)
+
+    async def set_async(self, key: str, value: Dict):
+        expires_at, encoded = self._set_memory(key, value)
+        if self._db is not None:
+            await asyncio.to_thread(self._set_disk, key, expires_at, encoded)
+
+    def _set_memory(self, key: str, value: Dict) -> tuple:
+        expires_at = time.time() + self.ttl
+        encoded = json.dumps(value)
+        with self._lock:
+            self._remember(key, expires_at, encoded)
+        return expires_at, encoded
+
+    def _set_disk(self, key: str, expires_at: float, encoded: str):
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, encoded, expires_at),
+            )
+
+    def _remember(self, key: str, expires_at: float, encoded: str):
+        self._memory[key] = (expires_at, encoded)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def purge_expired(self) -> int:
+        """Drop expired rows from the on-disk store."""
+        if self._db is None:
+            return 0
+        with self._lock:
+            return self._db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._memory),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_llm_cache: Optional[LLMCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """Process-wide LLM cache shared by the Analyst and BiasGuard."""
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMCache()
+    return _llm_cache
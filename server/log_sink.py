@@ -0,0 +1,155 @@
+"""
+Buffered Log Sink for Community Shield
+Collects log entries in a bounded ring buffer and writes them to the logs
+table as one bulk insert, triggered by batch size or flush interval.
+"""
+import asyncio
+import os
+from collections import deque
+from typing import Dict, Optional
+
+from repository import get_repository
+
+LOG_BUFFER_CAPACITY = int(os.environ.get("LOG_BUFFER_CAPACITY", "2000"))
+LOG_BATCH_SIZE = int(os.environ.get("LOG_BATCH_SIZE", "50"))
+LOG_FLUSH_INTERVAL = float(os.environ.get("LOG_FLUSH_INTERVAL", "1.0"))
+LOG_OVERFLOW_POLICY = os.environ.get("LOG_OVERFLOW_POLICY", "drop_oldest")  # or "drop_newest"
+
+
+class BufferedLogSink:
+    """
+    emit() is synchronous and never touches the network, so callers on the
+    dispatch path pay a deque append instead of a database round trip.
+    """
+
+    def __init__(self, repo=None, capacity: int = LOG_BUFFER_CAPACITY, batch_size: int = LOG_BATCH_SIZE,
+                 flush_interval: float = LOG_FLUSH_INTERVAL, overflow_policy: str = LOG_OVERFLOW_POLICY):
+        if overflow_policy not in ("drop_oldest", "drop_newest"):
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.repo = repo or get_repository()
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+
+        self._buffer: deque = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+        # Counters
+        self.emitted = 0
+        self.written = 0
+        self.dropped_oldest = 0
+        self.dropped_newest = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    def emit(self, message: str, log_type: str = "info", incident_id: str = None, unit_id: str = None):
+        """Buffer one log entry. Applies the overflow policy when the buffer is full."""
+        self.emitted += 1
+        entry = {
+            "message": message,
+            "log_type": log_type,
+            "incident_id": incident_id,
+            "unit_id": unit_id
+        }
+        if not self._enqueue(entry):
+            return
+
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _enqueue(self, entry: Dict) -> bool:
+        if len(self._buffer) >= self.capacity:
+            if self.overflow_policy == "drop_newest":
+                self.dropped_newest += 1
+                return False
+            self._buffer.popleft()
+            self.dropped_oldest += 1
+        self._buffer.append(entry)
+        return True
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run(), name="log-sink")
+
+    async def stop(self):
+        """Stop the flusher and drain everything still buffered."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        while self._buffer:
+            if not await self.flush():
+                break
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._buffer:
+                if not await self.flush() or len(self._buffer) < self.batch_size:
+                    break
+
+    async def flush(self) -> bool:
+        """Write up to one batch as a single bulk insert. Returns False if the insert failed."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._buffer:
+                return True
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            try:
+                await self.repo.insert_logs(batch)
+            except Exception as e:
+                self.failed_flushes += 1
+                print(f"Error logging to Supabase: {e}")
+                # Put the batch back in front; the overflow policy still bounds the buffer
+                excess = len(batch) + len(self._buffer) - self.capacity
+                if excess > 0 and self.overflow_policy == "drop_newest":
+                    # Entries emitted during the failed insert are the newest
+                    for _ in range(min(excess, len(self._buffer))):
+                        self._buffer.pop()
+                        self.dropped_newest += 1
+                    excess = len(batch) - self.capacity
+                    if excess > 0:
+                        self.dropped_newest += excess
+                        batch = batch[:self.capacity]
+                elif excess > 0:
+                    self.dropped_oldest += min(excess, len(batch))
+                    batch = batch[excess:]
+                self._buffer.extendleft(reversed(batch))
+                return False
+            self.flushes += 1
+            self.written += len(batch)
+            return True
+
+    def stats(self) -> Dict:
+        return {
+            "buffered": len(self._buffer),
+            "capacity": self.capacity,
+            "emitted": self.emitted,
+            "written": self.written,
+            "dropped_oldest": self.dropped_oldest,
+            "dropped_newest": self.dropped_newest,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            # Database round trips per log row written (1.0 == one insert per message)
+            "write_amplification": round((self.flushes + self.failed_flushes) / self.written, 4) if self.written else 0.0,
+        }
+
+
+_log_sink: Optional[BufferedLogSink] = None
+
+
+def get_log_sink() -> BufferedLogSink:
+    """Process-wide log sink shared by the API, pipeline and monitors."""
+    global _log_sink
+    if _log_sink is None:
+        _log_sink = BufferedLogSink()
+    return _log_sink
@@ -1,19 +1,35 @@
 import asyncio
+import functools
 import uvicorn
 import os
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, BackgroundTasks, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict
+from typing import List, Dict, Optional
 from datetime import datetime
 from dotenv import load_dotenv
-from supabase import create_client, Client
 
 from models import Incident, PatrolUnit
-from agents.sentinel import generate_raw_report
-from agents.analyst import analyze_report
 from agents.commander import Commander
-from agents.hotspot_manager import HotspotManager
-from twitter_monitor import monitor_twitter
+from agents.hotspot_manager import get_hotspot_manager
+from twitter_monitor import monitor_twitter, next_poll_delay, process_tweet
+from pipeline import IncidentPipeline
+from repository import MAX_PAGE_SIZE, decode_cursor, encode_cursor, get_repository
+from log_sink import get_log_sink
+from llm_cache import get_llm_cache
+from event_bus import EVENT_TYPES, get_event_bus
+from response_cache import get_response_cache
+from tweet_dedup import get_tweet_dedup
+from incident_clusters import get_incident_clusterer
+from road_graph import get_road_graph
+from metrics import CONTENT_TYPE, MetricsMiddleware, get_metrics
+from state_store import StateStore
+from unit_movement import STATUS_NAMES, UNIT_MOVEMENT_ENABLED, UnitMovementEngine
+from leader import DEPLOYMENT_MODE, LeaderElection, create_lock
+from work_queue import WorkQueue
+from ingest_log import get_ingest_log
+from rate_limits import rate_limit_stats
+import gazetteer
 
 load_dotenv()
 
@@ -26,248 +42,484 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
+app.add_middleware(MetricsMiddleware)
 
-# Supabase Client
-supabase_url = os.environ.get("SUPABASE_URL")
-supabase_key = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(supabase_url, supabase_key)
+# Database (async PostgREST repository, shared with the monitors)
+repo = get_repository()
+log_sink = get_log_sink()
 
-# State
-commander = Commander()
-hotspot_manager = HotspotManager()
+# Push stream: every repository write becomes an event for /api/stream subscribers
+event_bus = get_event_bus()
+repo.add_listener(event_bus.on_change)
+
+# Dashboard GET responses, invalidated by the same write notifications
+response_cache = get_response_cache()
+repo.add_listener(response_cache.on_change)
+
+# State: units and open incidents live in memory, written behind to the database
+state_store = StateStore(repo)
+repo.add_listener(state_store.on_change)
+road_graph = get_road_graph()
+commander = Commander(roads=road_graph)
+hotspot_manager = get_hotspot_manager()
 
 def log(message: str, log_type: str = "info", incident_id: str = None, unit_id: str = None):
-    """Log a message to Supabase logs table"""
-    try:
-        supabase.table("logs").insert({
-            "message": message,
-            "log_type": log_type,
-            "incident_id": incident_id,
-            "unit_id": unit_id
-        }).execute()
-    except Exception as e:
-        print(f"Error logging to Supabase: {e}")
+    """Log a message to Supabase logs table (buffered, written in bulk by the log sink)"""
+    log_sink.emit(message, log_type, incident_id, unit_id)
 
-# Twitter monitoring task
+# Background tasks
 twitter_task = None
+incident_clusters = get_incident_clusterer()
+
+# Dispatched units drive to their incidents, go On Scene and clear back to Idle
+unit_movement = UnitMovementEngine(state_store, log) if UNIT_MOVEMENT_ENABLED else None
+if unit_movement is not None:
+    state_store.add_watcher(unit_movement.on_unit_change)
+
+# Cluster mode (uvicorn --workers N, several hosts): producers run on the elected leader only,
+# and the reports they produce are shared out to every worker's pipeline through the work queue
+work_queue = WorkQueue(repo) if DEPLOYMENT_MODE == "cluster" else None
+
+# Producers append to the durable ingest log; its consumer feeds the pipeline (or, in
+# cluster mode, the work queue) and retries what fails, so reports survive restarts and LLM outages
+ingest_log = get_ingest_log()
+
+pipeline = IncidentPipeline(repo, commander, log, hotspots=hotspot_manager, clusters=incident_clusters,
+                            movement=unit_movement, state=state_store,
+                            ingest=functools.partial(ingest_log.put, "report"))
+if work_queue is None:
+    ingest_log.handle("report", pipeline.process)
+    ingest_log.handle("tweet", process_tweet)
+else:
+    ingest_log.handle("report", functools.partial(work_queue.put, "report"))
+    ingest_log.handle("tweet", functools.partial(work_queue.put, "tweet"))
+    work_queue.room = pipeline.capacity
+    work_queue.handle("report", pipeline.process)
+    work_queue.handle("tweet", process_tweet)
 
 async def start_twitter_monitoring_loop():
-    """Run Twitter monitoring every 15 minutes (smart rate limiting)"""
+    """Run Twitter monitoring as often as the search quota allows (smart rate limiting)"""
     while True:
         try:
-            await monitor_twitter()
+            await monitor_twitter(ingest=functools.partial(ingest_log.put, "tweet"))
         except Exception as e:
             print(f"Error in Twitter monitoring: {e}")
         
-        # Wait 15 minutes (optimal for Twitter API v2 rate limits)
-        await asyncio.sleep(900)
+        # Paced by the x-rate-limit headers (15 minutes until Twitter has sent them)
+        await asyncio.sleep(next_poll_delay())
 
-async def simulation_loop():
-    """Background task that simulates the agent loop."""
-    while True:
-        # 1. Sentinel: Ingest Data
-        raw_data = generate_raw_report()
-        log(f"🕵️ Sentinel: Picked up signal from {raw_data['source']}", log_type="info")
-        
-        # 2. Analyst: Process Data
-        import random
-        if random.random() > 0.7: # 30% chance to process a new incident
-            log(f"🧠 Analyst: Analyzing report...", log_type="analysis")
-            analysis = analyze_report(raw_data["raw_text"])
-            
-            if analysis.get("lat") is not None:
-                # Create incident in Supabase
-                incident_data = {
-                    "type": analysis.get("type", "Unknown"),
-                    "severity": analysis.get("severity", "Medium"),
-                    "location": analysis.get("location", "Unknown"),
-                    "lat": analysis["lat"],
-                    "lng": analysis["lng"],
-                    "summary": analysis.get("summary", raw_data["raw_text"]),
-                    "raw_text": raw_data["raw_text"],
-                    "source": raw_data["source"],
-                    "status": "Active"
-                }
-                
-                result = supabase.table("incidents").insert(incident_data).execute()
-                incident_id = result.data[0]["id"]
-                
-                # Log Bias Check
-                if "bias_check" in analysis:
-                    bias_check = analysis["bias_check"]
-                    supabase.table("bias_checks").insert({
-                        "incident_id": incident_id,
-                        "method": bias_check.get("method", "Unknown"),
-                        "bias_score": bias_check.get("score", 0.0),
-                        "status": bias_check.get("status", "Clear"),
-                        "warnings": bias_check.get("warnings", []),
-                        "reasoning": bias_check.get("reasoning", "")
-                    }).execute()
-                    
-                    if bias_check.get("warnings"):
-                        for warning in bias_check["warnings"]:
-                            log(f"⚖️ BIAS ALERT: {warning}", log_type="bias", incident_id=incident_id)
-
-                log(f"⚠️ New Incident: {incident_data['type']} at {incident_data['location']}", 
-                    log_type="incident", incident_id=incident_id)
-                
-                # 3. Commander: Assign Resources
-                # Get available units from Supabase
-                units_response = supabase.table("units").select("*").eq("status", "Idle").execute()
-                
-                if units_response.data:
-                    # Find nearest unit
-                    nearest_unit = min(units_response.data, key=lambda u: 
-                        ((u["lat"] - analysis["lat"])**2 + (u["lng"] - analysis["lng"])**2)**0.5
-                    )
-                    
-                    # Update unit status
-                    supabase.table("units").update({
-                        "status": "Responding",
-                        "current_incident_id": incident_id
-                    }).eq("id", nearest_unit["id"]).execute()
-                    
-                    # Update incident with assigned unit
-                    supabase.table("incidents").update({
-                        "assigned_unit_id": nearest_unit["id"],
-                        "status": "Dispatched"
-                    }).eq("id", incident_id).execute()
-                    
-                    log(f"👮 Commander: Dispatched {nearest_unit['name']} to {incident_data['location']}", 
-                        log_type="dispatch", incident_id=incident_id, unit_id=nearest_unit["id"])
-                else:
-                    log(f"👮 Commander: No units available for {incident_data['location']}!", 
-                        log_type="dispatch", incident_id=incident_id)
-            else:
-                log("🧠 Analyst: Could not determine location. Discarding.", log_type="analysis")
-        
-        await asyncio.sleep(30) # Wait 30 seconds before next cycle (conserves Groq tokens)
-
-@app.on_event("startup")
-async def startup_event():
-    """Start background tasks on app startup"""
+async def start_producers():
+    """Background loops that must run once per deployment: unit movement, hotspot publishing, Twitter, Sentinel"""
     global twitter_task
+    # Replays whatever a previous run left unfinished before anything new is appended
+    ingest_log.start()
+    
+    # One process drives every unit; in cluster mode it also adopts units other workers dispatched
+    if unit_movement is not None:
+        await unit_movement.warm()
+        unit_movement.start(repo if leader is not None else None)
+    
+    # The leader only sees its own incidents, so in cluster mode the grid is reloaded before each publish
+    hotspot_manager.start(repo, rebuild=leader is not None)
     
     # Start Twitter monitoring in background
     print("🚀 Starting Twitter monitoring service...")
     twitter_task = asyncio.create_task(start_twitter_monitoring_loop())
-    
-    # Start simulation loop
-    print("🚀 Starting incident simulation loop...")
-    asyncio.create_task(simulation_loop())
+    pipeline.start_sentinel()
     
     log("🐦 Twitter monitoring service started", "info")
     log("🎯 Incident simulation loop started", "info")
 
+async def stop_producers():
+    global twitter_task
+    if twitter_task:
+        twitter_task.cancel()
+        await asyncio.gather(twitter_task, return_exceptions=True)
+        twitter_task = None
+    await pipeline.stop_sentinel()
+    await hotspot_manager.stop()
+    if unit_movement is not None:
+        await unit_movement.stop()
+    await ingest_log.stop()
+
+leader = LeaderElection(create_lock(repo), start_producers, stop_producers) if DEPLOYMENT_MODE == "cluster" else None
+
+@app.on_event("startup")
+async def startup_event():
+    """Start background tasks on app startup"""
+    log_sink.start()
+    
+    # Rebuild the hotspot density grid from history (published on a schedule by the producers)
+    await hotspot_manager.warm(repo)
+    
+    # Recent incidents (possibly written by other processes) seed the duplicate clusters
+    await incident_clusters.warm(repo)
+    
+    # Units and open incidents are loaded before anything dispatches
+    await state_store.warm()
+    state_store.start()
+    
+    # Start incident pipeline (Sentinel -> Analyst -> BiasGuard -> Persistence -> Commander)
+    print("🚀 Starting incident pipeline...")
+    pipeline.start(run_sentinel=False)
+    
+    if leader is None:
+        await start_producers()
+    else:
+        # Every worker consumes shared reports; whichever holds the lock also produces them
+        work_queue.start()
+        leader.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks on app shutdown"""
+    if leader is None:
+        await stop_producers()
+    else:
+        await leader.stop()
+        await work_queue.stop()
+    await pipeline.stop()
+    await state_store.stop()
+    await log_sink.stop()
+    await repo.close()
+
 @app.get("/")
 def read_root():
     return {"status": "Community Shield System Online", "database": "Supabase"}
 
+# Public field name -> database column, for ?fields= projection
+INCIDENT_FIELDS = {
+    "id": "id", "type": "type", "description": "summary", "location": "location", "lat": "lat", "lng": "lng",
+    "severity": "severity", "timestamp": "created_at", "source": "source", "status": "status",
+    "assigned_unit_id": "assigned_unit_id", "report_count": "report_count",
+}
+DASHBOARD_INCIDENT_FIELDS = ["id", "type", "description", "location", "lat", "lng", "severity", "timestamp",
+                             "source", "status"]
+LOG_FIELDS = {
+    "id": "id", "message": "message", "log_type": "log_type", "incident_id": "incident_id",
+    "unit_id": "unit_id", "timestamp": "created_at",
+}
+
+def _split(value: Optional[str]) -> Optional[List[str]]:
+    """Comma-separated query value as a list (None when absent)."""
+    if value is None:
+        return None
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+def _columns(fields: Optional[str], mapping: Dict[str, str]) -> List[str]:
+    """Public names requested via ?fields=; raises ValueError on unknown names."""
+    names = _split(fields) or list(mapping)
+    unknown = [name for name in names if name not in mapping]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+def _project(row: Dict, names: List[str], mapping: Dict[str, str]) -> Dict:
+    item = {}
+    for name in names:
+        value = row.get(mapping[name])
+        if name in ("lat", "lng"):
+            value = float(value) if value else None
+        item[name] = value
+    return item
+
+def _paged_response(rows: List[Dict], names: List[str], mapping: Dict[str, str], limit: int) -> JSONResponse:
+    headers = {"X-Next-Cursor": encode_cursor(rows[-1])} if rows and len(rows) >= limit else {}
+    return JSONResponse([_project(row, names, mapping) for row in rows], headers=headers)
+
+async def build_incidents():
+    rows = await repo.list_incidents(limit=50)
+    # Convert Supabase response to frontend format
+    return [_project(inc, DASHBOARD_INCIDENT_FIELDS, INCIDENT_FIELDS) for inc in rows]
+
 @app.get("/api/incidents")
-def get_incidents():
-    """Get all incidents from Supabase"""
+async def get_incidents(request: Request, cursor: Optional[str] = None, limit: int = 50,
+                        severity: Optional[str] = None, status: Optional[str] = None,
+                        source: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+                        min_lat: Optional[float] = None, min_lng: Optional[float] = None,
+                        max_lat: Optional[float] = None, max_lng: Optional[float] = None,
+                        fields: Optional[str] = None):
+    """
+    Get all incidents from Supabase. Without query parameters this is the
+    cached dashboard view; with any of them it is a keyset-paged query on
+    (created_at, id): pass the X-Next-Cursor response header back as ?cursor=
+    to fetch the next (older) page.
+    """
     try:
-        result = supabase.table("incidents").select("*").order("created_at", desc=True).limit(50).execute()
-        # Convert Supabase response to frontend format
-        incidents = []
-        for inc in result.data:
-            incidents.append({
-                "id": inc["id"],
-                "type": inc["type"],
-                "description": inc["summary"],
-                "location": inc["location"],
-                "lat": float(inc["lat"]) if inc["lat"] else None,
-                "lng": float(inc["lng"]) if inc["lng"] else None,
-                "severity": inc["severity"],
-                "timestamp": inc["created_at"],
-                "source": inc["source"],
-                "status": inc["status"]
-            })
-        return incidents
+        if not request.query_params:
+            return await response_cache.respond(request, ("incidents",), ["incidents"], build_incidents)
+
+        try:
+            names = _columns(fields, INCIDENT_FIELDS)
+            before = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        bbox = None
+        if any(value is not None for value in (min_lat, min_lng, max_lat, max_lng)):
+            bbox = (-90.0 if min_lat is None else min_lat, -180.0 if min_lng is None else min_lng,
+                    90.0 if max_lat is None else max_lat, 180.0 if max_lng is None else max_lng)
+        columns = {INCIDENT_FIELDS[name] for name in names} | {"id", "created_at"}
+        rows = await repo.list_incidents(limit=limit, before=before, severity=_split(severity),
+                                         status=_split(status), source=_split(source), bbox=bbox,
+                                         since=since, until=until, columns=",".join(sorted(columns)))
+        return _paged_response(rows, names, INCIDENT_FIELDS, min(limit, MAX_PAGE_SIZE))
     except Exception as e:
         print(f"Error fetching incidents: {e}")
         return []
 
+async def build_units():
+    # Served from the state store, which is ahead of the database by at most one flush;
+    # read from the database until its startup reconcile has run, rather than waiting on it
+    rows = state_store.unit_rows() if state_store.is_ready else await repo.list_units()
+    # Convert to frontend format
+    units = []
+    for unit in rows:
+        units.append({
+            "id": unit["id"],
+            "name": unit["name"],
+            "type": unit["type"],
+            "status": unit["status"],
+            "lat": float(unit["lat"]),
+            "lng": float(unit["lng"])
+        })
+    return units
+
 @app.get("/api/units")
-def get_units():
+async def get_units(request: Request):
     """Get all units from Supabase"""
     try:
-        result = supabase.table("units").select("*").execute()
-        # Convert to frontend format
-        units = []
-        for unit in result.data:
-            units.append({
-                "id": unit["id"],
-                "name": unit["name"],
-                "type": unit["type"],
-                "status": unit["status"],
-                "lat": float(unit["lat"]),
-                "lng": float(unit["lng"])
-            })
-        return units
+        return await response_cache.respond(request, ("units",), ["units"], build_units)
     except Exception as e:
         print(f"Error fetching units: {e}")
         return []
 
+@app.get("/api/units/{unit_id}/route")
+def get_unit_route(unit_id: str):
+    """Road polyline a responding unit is still to drive, from its current position ([] when not moving)"""
+    return {"unit_id": unit_id, "route": unit_movement.route(unit_id) if unit_movement is not None else []}
+
+async def build_logs():
+    rows = await repo.list_logs(limit=50, columns="id,message,created_at")
+    
+    # Format logs to match frontend expectation ("[HH:MM:SS] message", oldest first)
+    formatted_logs = []
+    for log in reversed(rows):
+        timestamp = log.get('created_at') or ""
+        time_part = timestamp.split('T')[1][:8] if 'T' in timestamp else (timestamp[-8:] or "--:--:--")
+        formatted_logs.append(f"[{time_part}] {log['message']}")
+    return formatted_logs
+
 @app.get("/api/logs")
-def get_logs():
-    """Get recent logs from Supabase"""
+async def get_logs(request: Request, cursor: Optional[str] = None, limit: int = 50,
+                   log_type: Optional[str] = None, incident_id: Optional[str] = None,
+                   since: Optional[str] = None, until: Optional[str] = None, fields: Optional[str] = None):
+    """
+    Get recent logs from Supabase. Without query parameters this is the
+    cached dashboard view (formatted strings); with any of them it returns
+    structured rows, newest first, keyset-paged like /api/incidents.
+    """
     try:
-        result = supabase.table("logs").select("*").order("created_at", desc=True).limit(50).execute()
-        
-        if not result.data:
-            return []
-        
-        # Format logs to match frontend expectation
-        formatted_logs = []
-        for log in result.data:
-            try:
-                # Extract time from ISO timestamp
-                timestamp = log['created_at']
-                if 'T' in timestamp:
-                    time_part = timestamp.split('T')[1][:8]  # Get HH:MM:SS
-                else:
-                    time_part = timestamp[-8:]
-                
-                formatted_logs.append(f"[{time_part}] {log['message']}")
-            except Exception as e:
-                print(f"Error formatting log: {e}")
-                formatted_logs.append(f"[--:--:--] {log['message']}")
-        
-        return list(reversed(formatted_logs))
+        if not request.query_params:
+            return await response_cache.respond(request, ("logs",), ["logs"], build_logs)
+
+        try:
+            names = _columns(fields, LOG_FIELDS)
+            before = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        columns = {LOG_FIELDS[name] for name in names} | {"id", "created_at"}
+        rows = await repo.list_logs(limit=limit, before=before, log_type=_split(log_type),
+                                    incident_id=incident_id, since=since, until=until,
+                                    columns=",".join(sorted(columns)))
+        return _paged_response(rows, names, LOG_FIELDS, min(limit, MAX_PAGE_SIZE))
     except Exception as e:
         print(f"Error fetching logs: {e}")
         return []
 
 @app.get("/api/hotspots")
-def get_hotspots():
-    """Get predictive hotspots from Supabase"""
-    result = supabase.table("hotspots").select("*").order("risk_score", desc=True).execute()
-    return result.data
+async def get_hotspots(request: Request, min_lat: Optional[float] = None, min_lng: Optional[float] = None,
+                       max_lat: Optional[float] = None, max_lng: Optional[float] = None,
+                       hours: Optional[float] = None, k: int = 10):
+    """
+    Get predictive hotspots from Supabase. With a bounding box or a time
+    window (last N hours), answer from the live density grid instead.
+    """
+    bbox_params = (min_lat, min_lng, max_lat, max_lng)
+    if hours is None and all(value is None for value in bbox_params):
+        return await response_cache.respond(request, ("hotspots",), ["hotspots"], repo.list_hotspots)
+
+    bounds = hotspot_manager.bounds
+    bbox = tuple(bounds[i] if value is None else value for i, value in enumerate(bbox_params))
+    start = datetime.now().timestamp() - hours * 3600 if hours is not None else None
+    spots = hotspot_manager.query(bbox=bbox, start=start, k=max(1, min(k, 100)))
+    for spot in spots:
+        spot.pop("cell")
+    return spots
+
+async def build_bias_checks():
+    # Get bias checks with incident details
+    return await repo.list_bias_checks(limit=50)
 
 @app.get("/api/bias-checks")
-def get_bias_checks():
+async def get_bias_checks(request: Request):
     """Get bias check alerts from Supabase"""
     try:
-        # Get bias checks with incident details
-        result = supabase.table("bias_checks").select(
-            "*, incidents(type, location, severity, created_at)"
-        ).order("created_at", desc=True).limit(50).execute()
-        return result.data
+        # Embeds incident details, so incident writes invalidate it too
+        return await response_cache.respond(request, ("bias_checks",), ["bias_checks", "incidents"],
+                                            build_bias_checks)
     except Exception as e:
         print(f"Error fetching bias checks: {e}")
         return []
 
+@app.get("/api/pipeline")
+def get_pipeline_stats():
+    """Get queue depth and throughput counters for each pipeline stage"""
+    return {**pipeline.stats(), "log_sink": log_sink.stats(), "llm_cache": get_llm_cache().stats(),
+            "fast_path": gazetteer.fast_path_stats.stats(), "hotspots": hotspot_manager.stats(),
+            "stream": event_bus.stats(), "response_cache": response_cache.stats(),
+            "tweet_dedup": get_tweet_dedup().stats(), "clusters": incident_clusters.stats(),
+            "state": state_store.stats(),
+            "movement": unit_movement.stats() if unit_movement is not None else None,
+            "roads": road_graph.stats() if road_graph is not None else None,
+            "leader": leader.stats() if leader is not None else None,
+            "work_queue": work_queue.stats() if work_queue is not None else None,
+            "ingest_log": ingest_log.stats(), "rate_limits": rate_limit_stats()}
+
+def collect_component_metrics():
+    """Scrape-time view of the counters components already keep (see /api/pipeline)."""
+    for name, stage in pipeline.stats().items():
+        labels = {"stage": name}
+        yield "pipeline_queue_depth", "gauge", "Items waiting in a stage's input queue", labels, stage["queue_depth"]
+        yield "pipeline_queue_capacity", "gauge", "Bound of a stage's input queue", labels, stage["queue_size"]
+        yield "pipeline_items_total", "counter", "Items handled per stage", {**labels, "outcome": "processed"}, stage["processed"]
+        yield "pipeline_items_total", "counter", "Items handled per stage", {**labels, "outcome": "failed"}, stage["failed"]
+
+    cache = get_llm_cache().stats()
+    for tier, value in (("memory", cache["hits"] - cache["disk_hits"]), ("disk", cache["disk_hits"])):
+        yield "llm_cache_hits_total", "counter", "LLM cache hits", {"tier": tier}, value
+    yield "llm_cache_misses_total", "counter", "LLM cache misses", {}, cache["misses"]
+    yield "llm_cache_hit_ratio", "gauge", "LLM cache hits / lookups since start", {}, cache["hit_rate"]
+    yield "llm_cache_entries", "gauge", "LLM cache entries in memory", {}, cache["size"]
+
+    fast_path = gazetteer.fast_path_stats.stats()
+    yield "analyst_reports_total", "counter", "Reports analyzed, by path", {"path": "gazetteer"}, fast_path["fast_path"]
+    yield "analyst_reports_total", "counter", "Reports analyzed, by path", {"path": "cache"}, fast_path["cache_path"]
+    yield "analyst_reports_total", "counter", "Reports analyzed, by path", {"path": "llm"}, fast_path["llm_path"]
+
+    responses = response_cache.stats()
+    yield "response_cache_hits_total", "counter", "Dashboard responses served from cache", {}, responses["hits"]
+    yield "response_cache_misses_total", "counter", "Dashboard responses built", {}, responses["misses"]
+    yield "response_cache_not_modified_total", "counter", "304 responses", {}, responses["not_modified"]
+    yield "response_cache_hit_ratio", "gauge", "Response cache hits / lookups since start", {}, responses["hit_rate"]
+
+    logs = log_sink.stats()
+    yield "log_sink_buffered", "gauge", "Log entries waiting to be written", {}, logs["buffered"]
+    yield "log_sink_written_total", "counter", "Log entries written", {}, logs["written"]
+    yield "log_sink_dropped_total", "counter", "Log entries dropped on overflow", {}, \
+        logs["dropped_oldest"] + logs["dropped_newest"]
+
+    stream = event_bus.stats()
+    yield "stream_subscribers", "gauge", "Connected SSE clients", {}, stream["subscribers"]
+    yield "stream_events_total", "counter", "Events published to the stream", {}, stream["published"]
+    yield "stream_lagging_disconnects_total", "counter", "Clients dropped for falling behind", {}, \
+        stream["disconnected_lagging"]
+
+    clusters = incident_clusters.stats()
+    yield "incident_clusters_open", "gauge", "Open duplicate clusters", {}, clusters["open_clusters"]
+    yield "incident_reports_merged_total", "counter", "Reports merged into an existing incident", {}, clusters["merged"]
+
+    if leader is not None:
+        election = leader.stats()
+        yield "leader", "gauge", "1 while this worker runs the background producers", {}, int(election["is_leader"])
+        yield "leader_elections_total", "counter", "Times this worker became the leader", {}, election["elections"]
+        work = work_queue.stats()
+        yield "work_queue_claimed_total", "counter", "Shared work items claimed by this worker", {}, work["claimed"]
+        yield "work_queue_completed_total", "counter", "Shared work items handled by this worker", {}, work["completed"]
+        yield "work_queue_failed_total", "counter", "Shared work items whose handler failed", {}, work["failed"]
+        yield "work_queue_dead_lettered_total", "counter", "Shared work items moved to work_dead_letter", {}, \
+            work["dead_lettered"]
+
+    ingest = ingest_log.stats()
+    yield "ingest_log_lag", "gauge", "Records appended but not yet finished", {}, ingest["lag"]
+    yield "ingest_log_segments", "gauge", "Segment files on disk", {}, ingest["segments"]
+    yield "ingest_log_appended_total", "counter", "Records appended to the ingest log", {}, ingest["appended"]
+    yield "ingest_log_acked_total", "counter", "Records finished by their handler", {}, ingest["acked"]
+    yield "ingest_log_retried_total", "counter", "Failed deliveries scheduled for a retry", {}, ingest["retried"]
+    yield "ingest_log_dead_lettered_total", "counter", "Records given up on after every attempt", {}, \
+        ingest["dead_lettered"]
+
+    for provider, limits in rate_limit_stats().items():
+        labels = {"provider": provider}
+        if limits["rate_rps"] is not None:
+            yield "rate_limit_requests_per_second", "gauge", "Request rate the provider's budget allows", labels, \
+                limits["rate_rps"]
+        yield "rate_limit_concurrency", "gauge", "Requests allowed in flight to the provider", labels, \
+            limits["concurrency"]
+        yield "circuit_open", "gauge", "1 while the provider's circuit breaker refuses calls", labels, \
+            int(limits["state"] != "closed")
+        yield "circuit_trips_total", "counter", "Times the provider's circuit breaker opened", labels, limits["trips"]
+        for outcome in ("throttled", "rejected", "short_circuited"):
+            yield "rate_limited_calls_total", "counter", "Calls held back by provider limits, by outcome", \
+                {**labels, "outcome": outcome}, limits[outcome]
+
+    state = state_store.stats()
+    yield "state_unit_changes_pending", "gauge", "Unit rows changed in memory, not yet written", {}, state["pending"]
+    yield "state_changes_total", "counter", "Unit changes applied in memory", {}, state["changes"]
+    yield "state_changes_coalesced_total", "counter", "Unit changes folded into an earlier pending write", {}, \
+        state["coalesced"]
+    yield "state_rows_written_total", "counter", "Rows written behind to the database", {}, state["written"]
+    yield "state_flush_failures_total", "counter", "Write-behind flushes that failed and were retried", {}, \
+        state["failed_flushes"]
+
+    if unit_movement is not None:
+        movement = unit_movement.stats()
+        for status in STATUS_NAMES:
+            yield "units", "gauge", "Units tracked by the movement engine, by status", {"status": status}, movement[status]
+        yield "unit_arrivals_total", "counter", "Units that reached their incident", {}, movement["arrivals"]
+        yield "unit_positions_unpublished", "gauge", "Units whose latest position is not yet in the state store", {}, \
+            movement["unpublished"]
+        yield "unit_positions_published_total", "counter", "Unit rows published to the state store", {}, \
+            movement["published"]
+
+    tweets = get_tweet_dedup().stats()
+    yield "tweets_checked_total", "counter", "Tweet ids checked for duplicates", {}, tweets["checked"]
+    yield "tweets_duplicate_total", "counter", "Tweets skipped as already seen", {}, tweets["duplicates"]
+
+metrics = get_metrics()
+metrics.add_collector(collect_component_metrics)
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics_text():
+    """Prometheus text exposition of every metric in the process"""
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+@app.get("/api/stream")
+async def stream_events(request: Request, types: Optional[str] = None, cursor: Optional[int] = None):
+    """
+    Server-Sent Events stream of incident, dispatch, unit and log changes.
+    types filters by comma-separated event type; reconnecting clients resume
+    from the Last-Event-ID header (or ?cursor=) instead of re-polling.
+    """
+    wanted = {t.strip() for t in types.split(",") if t.strip() in EVENT_TYPES} if types else None
+    last_event_id = request.headers.get("last-event-id")
+    if cursor is None and last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id)
+
+    subscriber = event_bus.subscribe(wanted or None, cursor)
+    return StreamingResponse(event_bus.stream(subscriber), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/api/dispatch")
-def dispatch_all():
+async def dispatch_all():
     """Emergency: Dispatch all available units"""
-    result = supabase.table("units").update({"status": "Responding"}).eq("status", "Idle").execute()
+    dispatched = await repo.update_units_by_status("Idle", {"status": "Responding"})
     log("🚨 EMERGENCY: All units dispatched!", log_type="dispatch")
-    return {"message": "All units dispatched", "count": len(result.data)}
+    return {"message": "All units dispatched", "count": len(dispatched)}
 
 @app.post("/api/emergency")
-def activate_emergency():
+async def activate_emergency():
     """Activate emergency protocol"""
     log("🚨 EMERGENCY PROTOCOL ACTIVATED", "error")
     return {"status": "emergency_activated"}
@@ -275,22 +527,16 @@ def activate_emergency():
 @app.post("/api/map/zoom/{location}")
 def zoom_to_location(location: str):
     """Zoom map to predefined location"""
-    locations = {
-        "cbd": {"lat": -1.2834, "lng": 36.8235, "zoom": 14},
-        "westlands": {"lat": -1.2635, "lng": 36.8024, "zoom": 14},
-        "kibera": {"lat": -1.3120, "lng": 36.7890, "zoom": 14},
-        "eastleigh": {"lat": -1.2760, "lng": 36.8480, "zoom": 14},
-        "karen": {"lat": -1.3200, "lng": 36.7050, "zoom": 14}
-    }
-    if location.lower() in locations:
-        return locations[location.lower()]
+    key = location.lower().replace(" ", "_")
+    if key in gazetteer.AREAS:
+        return {**gazetteer.coords(key), "zoom": 14}
     return {"error": "Location not found"}
 
 @app.post("/api/test-twitter")
 async def test_twitter():
     """Test Twitter integration manually"""
     try:
-        await monitor_twitter()
+        await monitor_twitter(ingest=functools.partial(ingest_log.put, "tweet"))
         return {"status": "success", "message": "Twitter monitoring executed successfully"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
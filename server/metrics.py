@@ -0,0 +1,297 @@
+"""
+Metrics for Community Shield
+Counters, gauges and fixed-bucket histograms held in process memory and
+rendered in the Prometheus text format on /metrics. Recording is a dict
+lookup, a bisect and a locked add, cheap enough to leave on around every
+pipeline stage, LLM call, database request and endpoint. Counters that
+components already keep in stats() are read by collectors at scrape time
+instead of being mirrored on the hot path.
+"""
+import bisect
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds: from in-memory handlers (sub-millisecond) to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (name, type, help, labels, value) as yielded by collectors
+CollectedSample = Tuple[str, str, str, Dict[str, str], float]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return f"{value:.17g}"
+
+
+def _format_labels(labels: Dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for v in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name: str, labels: Dict):
+        yield name, labels, self.value
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self, name: str, labels: Dict):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = 0
+        for bound, bucket in zip(self.bounds + (math.inf,), counts):
+            cumulative += bucket
+            yield f"{name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+        yield f"{name}_sum", labels, total
+        yield f"{name}_count", labels, count
+
+
+class Metric:
+    """
+    A metric family. labels(*values) returns the child for one label
+    combination (cache it for hot paths); unlabelled metrics record directly.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def samples(self) -> Iterable[Tuple[str, Dict, float]]:
+        for key, child in list(self._children.items()):
+            yield from child.samples(self.name, dict(zip(self.labelnames, key)))
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+
+class MetricsRegistry:
+    """Metric families by name. Asking for an existing name returns the same family."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[CollectedSample]]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help_text: str, labelnames: Sequence[str], **kwargs) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered as {metric.kind} {metric.labelnames}")
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def add_collector(self, collector: Callable[[], Iterable[CollectedSample]]):
+        """collector() is called on every scrape and yields (name, type, help, labels, value)."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        families: Dict[str, Tuple[str, str, List]] = {}
+        for collector in self._collectors:
+            try:
+                for name, kind, help_text, labels, value in collector():
+                    families.setdefault(name, (kind, help_text, []))[2].append((labels, value))
+            except Exception as e:
+                print(f"Metrics collector error: {e}")
+        for name, (kind, help_text, samples) in families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+_metrics: Optional[MetricsRegistry] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Process-wide registry served on /metrics."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRegistry()
+    return _metrics
+
+
+# --- shared instruments ---------------------------------------------------
+def observed_completion(agent: str, mode: str, create: Callable, **kwargs):
+    """
+    Call an OpenAI-compatible create(**kwargs), recording its latency,
+    outcome and token usage under the calling agent.
+    """
+    metrics = get_metrics()
+    duration = metrics.histogram("llm_request_duration_seconds", "LLM completion latency",
+                                 ("agent", "mode", "outcome"))
+    started = time.perf_counter()
+    try:
+        completion = create(**kwargs)
+    except Exception:
+        duration.labels(agent, mode, "error").observe(time.perf_counter() - started)
+        raise
+    duration.labels(agent, mode, "ok").observe(time.perf_counter() - started)
+
+    usage = getattr(completion, "usage", None)
+    if usage is not None:
+        tokens = metrics.counter("llm_tokens_total", "Tokens billed by the LLM provider", ("agent", "kind"))
+        tokens.labels(agent, "prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+        tokens.labels(agent, "completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+    return completion
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request to its response headers (so a
+    long-lived SSE stream counts once, when it opens), labelled by route
+    template rather than raw path to keep label cardinality bounded.
+    """
+
+    def __init__(self, app, registry: Optional[MetricsRegistry] = None):
+        self.app = app
+        registry = registry or get_metrics()
+        self.duration = registry.histogram("http_request_duration_seconds",
+                                           "Time to response headers per endpoint", ("method", "route", "status"))
+        self.in_flight = registry.gauge("http_requests_in_flight", "Requests (and open streams) being served")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        responded = False
+
+        def observe(status: int):
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            self.duration.labels(scope["method"], route, status).observe(time.perf_counter() - started)
+
+        async def send_and_observe(message):
+            nonlocal responded
+            if message["type"] == "http.response.start":
+                responded = True
+                observe(message["status"])
+            await send(message)
+
+        self.in_flight.inc()
+        try:
+            await self.app(scope, receive, send_and_observe)
+        except Exception:
+            if not responded:
+                observe(500)
+            raise
+        finally:
+            self.in_flight.dec()
@@ -21,3 +21,4 @@ class PatrolUnit(BaseModel):
     lng: float
     status: str = "Idle" # "Idle", "EnRoute", "Busy"
     current_incident_id: Optional[str] = None
+    current_route: Optional[List[List[float]]] = None
@@ -0,0 +1,636 @@
+"""
+Incident Pipeline for Community Shield
+Runs Sentinel -> Analyst -> BiasGuard -> Persistence -> Commander as a staged
+asyncio pipeline connected by bounded queues.
+"""
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from agents.sentinel import generate_raw_report
+from agents.analyst import analyze_report_async
+from agents.bias_guard import BiasGuard
+from metrics import get_metrics
+from rate_limits import get_rate_limiter
+from state_store import StateStore
+
+# Pipeline sizing (override via .env)
+QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", "100"))
+# Seconds between Sentinel signals: fixed if SENTINEL_INTERVAL is set, otherwise paced by the LLM quota
+# the provider reports, between the min and max (the max also applies until it has reported one)
+SENTINEL_INTERVAL = float(os.environ["SENTINEL_INTERVAL"]) if os.environ.get("SENTINEL_INTERVAL") else None
+SENTINEL_MIN_INTERVAL = float(os.environ.get("SENTINEL_MIN_INTERVAL", "5"))
+SENTINEL_MAX_INTERVAL = float(os.environ.get("SENTINEL_MAX_INTERVAL", "30"))
+SENTINEL_CALLS_PER_SIGNAL = 2  # A report can cost an Analyst and a BiasGuard completion
+STAGE_WORKERS = {
+    "analyst": int(os.environ.get("PIPELINE_ANALYST_WORKERS", "4")),
+    "cluster": 1,  # match-then-open must not interleave between workers
+    "bias_guard": int(os.environ.get("PIPELINE_BIAS_WORKERS", "2")),
+    "persistence": int(os.environ.get("PIPELINE_PERSISTENCE_WORKERS", "2")),
+    "dispatch": int(os.environ.get("PIPELINE_DISPATCH_WORKERS", "1")),
+}
+
+# Commander dispatch: "greedy" assigns each incident on arrival, "batch" solves a
+# severity-weighted assignment over a window of pending incidents
+DISPATCH_MODE = os.environ.get("DISPATCH_MODE", "greedy")
+DISPATCH_BATCH_SIZE = int(os.environ.get("DISPATCH_BATCH_SIZE", "20"))
+DISPATCH_WINDOW = float(os.environ.get("DISPATCH_WINDOW_MS", "500")) / 1000
+DISPATCH_TIME_BUDGET_MS = float(os.environ.get("DISPATCH_TIME_BUDGET_MS", "50"))
+
+# Unit claims: "database" runs the claim_unit compare-and-set (safe with several workers
+# or server replicas); "local" claims in this process's state store only
+DISPATCH_CLAIMS = os.environ.get("DISPATCH_CLAIMS", "database")
+DISPATCH_CLAIM_ATTEMPTS = int(os.environ.get("DISPATCH_CLAIM_ATTEMPTS", "3"))  # Next-nearest retries per incident
+DISPATCH_CLAIM_REFRESH = int(os.environ.get("DISPATCH_CLAIM_REFRESH", "8"))  # Candidates re-read after a lost claim
+# A dispatch that failed (e.g. the claim's database call) is retried after this many seconds, doubling up to the max
+DISPATCH_RETRY_BACKOFF = float(os.environ.get("DISPATCH_RETRY_BACKOFF", "1"))
+DISPATCH_RETRY_MAX_BACKOFF = float(os.environ.get("DISPATCH_RETRY_MAX_BACKOFF", "30"))
+
+# Claim outcomes
+CLAIMED, UNIT_TAKEN, INCIDENT_CLOSED = "claimed", "unit_taken", "incident_closed"
+
+_WRITTEN_MAX = 1000  # Reports remembered between their incident insert and the end of persistence
+
+metrics = get_metrics()
+STAGE_SECONDS = metrics.histogram("pipeline_stage_duration_seconds",
+                                  "Handler time per call (one item, or one batch)", ("stage",))
+QUEUE_WAIT_SECONDS = metrics.histogram("pipeline_queue_wait_seconds",
+                                       "Time an item waited in a stage's input queue", ("stage",))
+TIME_TO_ASSIGN = metrics.histogram("dispatch_time_to_assign_seconds",
+                                   "From incident row written to unit assigned")
+REPORT_TO_ASSIGN = metrics.histogram("dispatch_report_to_assign_seconds",
+                                     "From raw report submitted to unit assigned")
+DISPATCHES = metrics.counter("dispatch_total", "Dispatch attempts by outcome", ("outcome",))
+CLAIMS = metrics.counter("dispatch_claims_total", "Unit claims by outcome", ("outcome",))
+CLAIM_SECONDS = metrics.histogram("dispatch_claim_duration_seconds", "One unit claim, including the round trip")
+
+
+class Stage:
+    """
+    One pipeline stage: a bounded input queue drained by N workers.
+    A handler returns the item for the next stage, or None to drop it.
+    Putting into a full downstream queue blocks the worker, which is how
+    backpressure propagates back to the Sentinel. Queue entries carry their
+    enqueue time so the wait and the handler time are measured separately.
+
+    With batch_size > 1 the handler receives a list of up to batch_size items
+    collected within batch_window seconds, and returns a list of results.
+    on_error, if given, is called with the items a failed handler call dropped.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[Any]],
+                 workers: int = 1, queue_size: int = QUEUE_SIZE,
+                 batch_size: int = 1, batch_window: float = 0.0,
+                 on_error: Optional[Callable[[List, Exception], None]] = None):
+        self.name = name
+        self.handler = handler
+        self.on_error = on_error
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.next_stage: Optional["Stage"] = None
+        self.processed = 0
+        self.failed = 0
+        self._tasks: List[asyncio.Task] = []
+        self._seconds = STAGE_SECONDS.labels(name)
+        self._wait = QUEUE_WAIT_SECONDS.labels(name)
+
+    def start(self):
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"{self.name}-{i}"))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def put(self, item: Any):
+        await self.queue.put((time.perf_counter(), item))
+
+    def _unwrap(self, entry: Tuple[float, Any]) -> Any:
+        enqueued, item = entry
+        self._wait.observe(time.perf_counter() - enqueued)
+        return item
+
+    async def _collect(self) -> List:
+        """Wait for one item, then gather more until the batch is full or the window closes."""
+        items = [self._unwrap(await self.queue.get())]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_window
+        while len(items) < self.batch_size:
+            if not self.queue.empty():
+                items.append(self._unwrap(self.queue.get_nowait()))
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._unwrap(await asyncio.wait_for(self.queue.get(), remaining)))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _worker(self):
+        while True:
+            items = await self._collect()
+            started = time.perf_counter()
+            try:
+                if self.batch_size > 1:
+                    results = await self.handler(items)
+                else:
+                    results = [await self.handler(items[0])]
+                self._seconds.observe(time.perf_counter() - started)
+                self.processed += len(items)
+                for result in results or []:
+                    if result is not None and self.next_stage is not None:
+                        await self.next_stage.put(result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._seconds.observe(time.perf_counter() - started)
+                self.failed += len(items)
+                print(f"Pipeline stage '{self.name}' error: {e}")
+                if self.on_error is not None:
+                    self.on_error(items, e)
+            finally:
+                for _ in items:
+                    self.queue.task_done()
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+
+class IncidentPipeline:
+    """
+    Staged agent pipeline. Database calls go through the async repository and
+    OpenAI calls are micro-batched in worker threads, so the FastAPI handlers
+    sharing the event loop stay responsive. Dispatch picks units from the state
+    store (one is created unless passed in) and claims them with one atomic
+    compare-and-set in the database, so any number of dispatch workers and
+    server replicas can run without a shared lock: a dispatcher that loses a
+    unit to another moves on to the next-nearest one.
+    """
+
+    def __init__(self, repo, commander, log: Callable, workers: Dict[str, int] = None,
+                 queue_size: int = QUEUE_SIZE, dispatch_mode: str = DISPATCH_MODE, hotspots=None,
+                 clusters=None, movement=None, state: Optional[StateStore] = None,
+                 claims: str = DISPATCH_CLAIMS, ingest: Optional[Callable[[Dict], Awaitable]] = None):
+        self.repo = repo
+        self.commander = commander
+        self._owns_state = state is None
+        self.state = state or StateStore(repo)
+        if self._owns_state:
+            repo.add_listener(self.state.on_change)
+        self.state.add_watcher(commander.on_unit_change)
+        self._commander_synced = False
+        self.log = log
+        self.hotspots = hotspots
+        self.clusters = clusters
+        self.movement = movement
+        self.claims = claims
+        # Reports merged into a cluster whose incident is not stored yet, by cluster key:
+        # settled with the incident, or handed back for a retry if it is never written
+        self._merged_pending: Dict[str, List[Dict]] = {}
+        # Report id -> (incident row, cluster) once the row is inserted, until persistence finishes:
+        # a retry after a later step failed resumes from there instead of counting the report again
+        self._written: "OrderedDict[str, Tuple[Dict, Any]]" = OrderedDict()
+        # Where Sentinel reports go: this pipeline, or e.g. the shared work queue in cluster mode
+        self.ingest = ingest or self.submit
+        workers = {**STAGE_WORKERS, **(workers or {})}
+
+        self.stages: List[Stage] = [Stage("analyst", self._analyze, workers["analyst"], queue_size,
+                                          on_error=self._fail)]
+        if clusters is not None:
+            # Duplicates stop here: no bias check, no new row, no dispatch
+            self.stages.append(Stage("cluster", self._cluster, 1, queue_size, on_error=self._fail))
+        self.stages += [
+            Stage("bias_guard", self._check_bias, workers["bias_guard"], queue_size, on_error=self._fail),
+            Stage("persistence", self._persist, workers["persistence"], queue_size, on_error=self._fail),
+        ]
+        if dispatch_mode == "batch":
+            self.stages.append(Stage("dispatch", self._dispatch_batch, workers["dispatch"], queue_size,
+                                     batch_size=DISPATCH_BATCH_SIZE, batch_window=DISPATCH_WINDOW,
+                                     on_error=self._retry_dispatch))
+        else:
+            self.stages.append(Stage("dispatch", self._dispatch, workers["dispatch"], queue_size,
+                                     on_error=self._retry_dispatch))
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.next_stage = next_stage
+
+        self._sentinel_task: Optional[asyncio.Task] = None
+        self._dispatch_retries: set = set()
+
+    def start(self, run_sentinel: bool = True, interval: Optional[float] = SENTINEL_INTERVAL):
+        if self._owns_state:
+            self.state.start()
+        for stage in self.stages:
+            stage.start()
+        if run_sentinel:
+            self.start_sentinel(interval)
+
+    def start_sentinel(self, interval: Optional[float] = SENTINEL_INTERVAL):
+        """Start producing simulated signals (on one worker only, in a multi-worker deployment)."""
+        if self._sentinel_task is None:
+            self._sentinel_task = asyncio.create_task(self._run_sentinel(interval), name="sentinel")
+
+    async def stop_sentinel(self):
+        if self._sentinel_task:
+            self._sentinel_task.cancel()
+            await asyncio.gather(self._sentinel_task, return_exceptions=True)
+            self._sentinel_task = None
+
+    async def stop(self):
+        await self.stop_sentinel()
+        for task in self._dispatch_retries:
+            task.cancel()
+        await asyncio.gather(*self._dispatch_retries, return_exceptions=True)
+        for stage in self.stages:
+            await stage.stop()
+        if self._owns_state:
+            await self.state.stop()
+
+    async def submit(self, raw_data: Dict):
+        """Queue a raw report for analysis. Waits while the Analyst queue is full."""
+        raw_data.setdefault("received_at", time.perf_counter())
+        await self.stages[0].put(raw_data)
+
+    async def process(self, raw_data: Dict):
+        """
+        Submit a raw report and wait until the pipeline is done with it: stored,
+        merged into a known incident or discarded as unlocatable. Raises if a
+        stage failed on it or its analysis could not be completed, so the
+        caller (the ingest log) can retry it. Dispatch is not waited for.
+        """
+        completion = asyncio.get_running_loop().create_future()
+        raw_data["completion"] = completion
+        await self.submit(raw_data)
+        await completion
+
+    @staticmethod
+    def _complete(raw_data: Dict, error: Optional[Exception] = None):
+        """Settle the process() call waiting on a report, if any (once)."""
+        completion = raw_data.pop("completion", None)
+        if completion is None or completion.done():
+            return
+        if error is not None:
+            completion.set_exception(error)
+        else:
+            completion.set_result(None)
+
+    def _fail(self, items: List, error: Exception):
+        """A stage dropped these items: their reports go back to whoever can retry them."""
+        for item in items:
+            self._complete(item.get("raw", item), error)
+            cluster = item.get("cluster")
+            if cluster is not None and cluster.incident_id is None:
+                # Its incident was never written: stop matching against it, and retry what merged into it
+                self.clusters.discard(cluster)
+                for raw_data in self._merged_pending.pop(cluster.key, []):
+                    self._complete(raw_data, error)
+
+    def capacity(self) -> int:
+        """Reports the Analyst queue can take right now without waiting."""
+        queue = self.stages[0].queue
+        return queue.maxsize - queue.qsize()
+
+    async def join(self):
+        """Wait until every queued report has left the pipeline."""
+        for stage in self.stages:
+            await stage.queue.join()
+
+    def stats(self) -> Dict:
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    @staticmethod
+    def sentinel_delay() -> float:
+        """Seconds until the next signal, so the LLM calls it causes stay within the reported quota."""
+        spacing = get_rate_limiter("together").spacing()
+        if spacing is None:
+            return SENTINEL_MAX_INTERVAL
+        return min(max(spacing * SENTINEL_CALLS_PER_SIGNAL, SENTINEL_MIN_INTERVAL), SENTINEL_MAX_INTERVAL)
+
+    async def _run_sentinel(self, interval: Optional[float]):
+        """Sentinel: ingest signals and feed the Analyst queue."""
+        while True:
+            raw_data = generate_raw_report()
+            self.log(f"🕵️ Sentinel: Picked up signal from {raw_data['source']}", "info")
+
+            if random.random() > 0.7:  # 30% chance to process a new incident
+                try:
+                    await self.ingest(raw_data)
+                except Exception as e:
+                    print(f"Error queueing Sentinel report: {e}")
+
+            await asyncio.sleep(interval if interval is not None else self.sentinel_delay())
+
+    async def _analyze(self, raw_data: Dict) -> Optional[Dict]:
+        """Analyst: extract structured incident data from the raw text."""
+        self.log("🧠 Analyst: Analyzing report...", "analysis")
+        analysis = await analyze_report_async(raw_data["raw_text"], check_bias=False)
+
+        if analysis.get("error") and "completion" in raw_data:
+            # The LLM call failed, not the report: hand it back for a retry instead of discarding it
+            raise RuntimeError(f"analysis failed: {analysis['error']}")
+
+        if analysis.get("lat") is None:
+            self.log("🧠 Analyst: Could not determine location. Discarding.", "analysis")
+            self._complete(raw_data)
+            return None
+
+        return {"raw": raw_data, "analysis": analysis}
+
+    async def _cluster(self, item: Dict) -> Optional[Dict]:
+        """Clustering: fold a report of an already-known event into its incident."""
+        raw_data, analysis = item["raw"], item["analysis"]
+        written = self._written.get(raw_data.get("id"))
+        if written is not None:
+            # A retry of a report whose incident is already stored: finish persisting it
+            item["cluster"] = written[1]
+            return item
+        self.clusters.reports += 1
+        cluster, fingerprint = self.clusters.match(analysis["lat"], analysis["lng"], analysis.get("type"),
+                                                   raw_data["raw_text"])
+        if cluster is None:
+            item["cluster"] = self.clusters.open(analysis["lat"], analysis["lng"], analysis.get("type"),
+                                                 analysis.get("severity", "Medium"), fingerprint)
+            return item
+
+        escalated = self.clusters.merge(cluster, analysis.get("severity"))
+        if cluster.incident_id is not None:
+            changes = {"report_count": cluster.report_count}
+            if escalated:
+                changes["severity"] = cluster.severity
+            try:
+                await self.repo.update_incident(cluster.incident_id, changes)
+            except Exception:
+                self.clusters.unmerge(cluster)
+                raise
+            self._complete(raw_data)
+        else:
+            self._merged_pending.setdefault(cluster.key, []).append(raw_data)
+
+        self.log(f"🔗 Merged {raw_data['source']} report into {cluster.type} incident "
+                 f"({cluster.report_count} reports)", "analysis", cluster.incident_id)
+        return None
+
+    async def _check_bias(self, item: Dict) -> Dict:
+        """BiasGuard: attach bias metadata to the analysis."""
+        item["analysis"] = await BiasGuard.check_async(item["analysis"])
+        return item
+
+    async def _persist(self, item: Dict) -> Dict:
+        """Persistence: store the incident and its bias check."""
+        raw_data, analysis = item["raw"], item["analysis"]
+        incident_data = {
+            "type": analysis.get("type", "Unknown"),
+            "severity": analysis.get("severity", "Medium"),
+            "location": analysis.get("location", "Unknown"),
+            "lat": analysis["lat"],
+            "lng": analysis["lng"],
+            "summary": analysis.get("summary", raw_data["raw_text"]),
+            "raw_text": raw_data["raw_text"],
+            "source": raw_data["source"],
+            "status": "Active"
+        }
+
+        cluster = item.get("cluster")
+        if cluster is not None:
+            # Reports merged while this one was in BiasGuard are already counted
+            incident_data["report_count"] = cluster.report_count
+            incident_data["severity"] = cluster.severity
+
+        report_id = raw_data.get("id")
+        written = self._written.get(report_id)
+        if written is None:
+            incident = await self.repo.insert_incident(incident_data)
+            if report_id is not None:
+                self._written[report_id] = (incident, cluster)
+                if len(self._written) > _WRITTEN_MAX:
+                    self._written.popitem(last=False)
+            if cluster is not None:
+                self.clusters.attach(cluster, incident["id"])
+                for merged in self._merged_pending.pop(cluster.key, []):
+                    self._complete(merged)
+        else:
+            incident = written[0]
+        incident_id = incident["id"]
+        if cluster is not None:
+            # On a retry it is unknown how far the failed attempt got, so the counts are always rewritten
+            if written is not None or \
+                    (cluster.report_count, cluster.severity) != (incident_data["report_count"], incident_data["severity"]):
+                await self.repo.update_incident(incident_id, {"report_count": cluster.report_count,
+                                                              "severity": cluster.severity})
+                incident_data["severity"] = cluster.severity
+
+        # Log Bias Check
+        if "bias_check" in analysis:
+            bias_check = analysis["bias_check"]
+            await self.repo.insert_bias_check({
+                "incident_id": incident_id,
+                "method": bias_check.get("method", "Unknown"),
+                "bias_score": bias_check.get("score", 0.0),
+                "status": bias_check.get("status", "Clear"),
+                "warnings": bias_check.get("warnings", []),
+                "reasoning": bias_check.get("reasoning", "")
+            })
+
+            for warning in bias_check.get("warnings") or []:
+                self.log(f"⚖️ BIAS ALERT: {warning}", "bias", incident_id)
+
+        # Last, so a retry after a failed write above does not count the incident twice
+        if self.hotspots is not None:
+            self.hotspots.add_incident(incident_data["lat"], incident_data["lng"], incident_data["severity"],
+                                       incident.get("created_at"))
+        self._written.pop(report_id, None)
+        self.log(f"⚠️ New Incident: {incident_data['type']} at {incident_data['location']}",
+                 "incident", incident_id)
+
+        item["incident_id"] = incident_id
+        item["incident"] = incident_data
+        item["persisted_at"] = time.perf_counter()
+        self._complete(raw_data)
+        return item
+
+    async def _dispatch(self, item: Dict) -> None:
+        """Commander: assign the fastest idle unit."""
+        incident_id, incident_data = item["incident_id"], item["incident"]
+
+        await self._sync_commander()
+        claimed = await self._claim_fastest(incident_id, incident_data)
+        if claimed is None:
+            return None
+
+        eta_seconds, unit = claimed
+        self._record_assignment(item)
+        self.log(f"👮 Commander: Dispatched {unit.name} to {incident_data['location']} "
+                 f"(ETA {eta_seconds / 60:.0f} min)", "dispatch", incident_id, unit.id)
+        return None
+
+    async def _dispatch_batch(self, items: List[Dict]) -> List:
+        """Commander: jointly assign idle units to a window of incidents."""
+        incidents = {item["incident_id"]: item["incident"] for item in items}
+        items_by_id = {item["incident_id"]: item for item in items}
+
+        await self._sync_commander()
+        result = await self.commander.assign_batch_async(
+            [{"id": incident_id, **incident} for incident_id, incident in incidents.items()],
+            time_budget_ms=DISPATCH_TIME_BUDGET_MS,
+        )
+        outcomes = await asyncio.gather(*(self._claim(self.commander.get_unit(unit_id), incident_id,
+                                                      incidents[incident_id])
+                                          for incident_id, unit_id, _ in result["assignments"]),
+                                        return_exceptions=True)
+        # Units another worker took while the solver ran count as lost claims
+        preempted = [(incident_id, None, 0.0) for incident_id in result["preempted"]]
+        outcomes += [UNIT_TAKEN] * len(preempted)
+
+        failed, error = [], None
+        for (incident_id, unit_id, distance_km), outcome in zip(result["assignments"] + preempted, outcomes):
+            incident = incidents[incident_id]
+            if isinstance(outcome, Exception):
+                failed.append(items_by_id[incident_id])
+                error = outcome
+            elif outcome == CLAIMED:
+                self._record_assignment(items_by_id[incident_id])
+                self.log(f"👮 Commander: Dispatched {self.commander.get_unit(unit_id).name} to "
+                         f"{incident['location']} ({distance_km:.1f} km)", "dispatch", incident_id, unit_id)
+            elif outcome == UNIT_TAKEN:
+                # Another dispatcher got there first: fall back to the fastest unit still free
+                try:
+                    claimed = await self._claim_fastest(incident_id, incident)
+                except Exception as e:
+                    failed.append(items_by_id[incident_id])
+                    error = e
+                    continue
+                if claimed is not None:
+                    eta_seconds, unit = claimed
+                    self._record_assignment(items_by_id[incident_id])
+                    self.log(f"👮 Commander: Dispatched {unit.name} to {incident['location']} "
+                             f"(ETA {eta_seconds / 60:.0f} min)", "dispatch", incident_id, unit.id)
+
+        for incident_id in result["unassigned"]:
+            DISPATCHES.labels("no_unit").inc()
+            self.log(f"👮 Commander: No units available for {incidents[incident_id]['location']}!",
+                     "dispatch", incident_id)
+
+        if len(items) > 1:
+            self.log(f"👮 Commander: Batch of {len(items)} assigned in {result['elapsed_ms']:.1f} ms, "
+                     f"{result['total_distance_km']:.1f} km total vs {result['greedy_distance_km']:.1f} km greedy",
+                     "dispatch")
+        if failed:
+            print(f"Pipeline stage 'dispatch' error: {error}")
+            self._retry_dispatch(failed, error)
+        return []
+
+    def _retry_dispatch(self, items: List[Dict], error: Exception):
+        """Dispatch failed for these incidents (not for want of a unit): try them again after a backoff."""
+        for item in items:
+            attempts = item["dispatch_attempts"] = item.get("dispatch_attempts", 0) + 1
+            delay = min(DISPATCH_RETRY_BACKOFF * 2 ** (attempts - 1), DISPATCH_RETRY_MAX_BACKOFF)
+            DISPATCHES.labels("retry").inc()
+            self.log(f"👮 Commander: Dispatch to {item['incident']['location']} failed ({error}); "
+                     f"retrying in {delay:.0f}s", "dispatch", item["incident_id"])
+            task = asyncio.create_task(self._requeue_dispatch(item, delay), name="dispatch-retry")
+            self._dispatch_retries.add(task)
+            task.add_done_callback(self._dispatch_retries.discard)
+
+    async def _requeue_dispatch(self, item: Dict, delay: float):
+        await asyncio.sleep(delay)
+        record = self.state.incident(item["incident_id"])
+        if record is not None and (record.status != "Active" or record.assigned_unit_id is not None):
+            return  # Dispatched or closed in the meantime (by another worker, or the failed claim did land)
+        await self.stages[-1].put(item)
+
+    async def _claim_fastest(self, incident_id: str, incident: Dict) -> Optional[Tuple[float, Any]]:
+        """
+        Claim the fastest idle unit for an incident, moving on to the next
+        fastest each time another dispatcher wins the unit first. A lost
+        claim means this process's view is stale around the incident, so the
+        next candidates are re-read from the database before the retry.
+        Returns (eta_seconds, unit), or None (logged) when nothing was claimed.
+        """
+        for _ in range(DISPATCH_CLAIM_ATTEMPTS):
+            fastest = await self.commander.fastest_idle_async(incident["lat"], incident["lng"],
+                                                              k=DISPATCH_CLAIM_REFRESH)
+            if not fastest:
+                break
+            eta_seconds, unit = fastest[0]
+            outcome = await self._claim(unit, incident_id, incident)
+            if outcome == CLAIMED:
+                return eta_seconds, unit
+            if outcome == INCIDENT_CLOSED:
+                self.log(f"👮 Commander: {incident['location']} was already dispatched elsewhere",
+                         "dispatch", incident_id)
+                return None
+            if len(fastest) > 1:
+                self.state.refresh("units", await self.repo.list_units(ids=[other.id for _, other in fastest[1:]]))
+        DISPATCHES.labels("no_unit").inc()
+        self.log(f"👮 Commander: No units available for {incident['location']}!", "dispatch", incident_id)
+        return None
+
+    async def _claim(self, unit, incident_id: str, incident: Dict) -> str:
+        """
+        Claim one unit for an incident; on success, route it there.
+        The unit leaves the Commander's idle index for the duration, so
+        concurrent dispatch workers in this process do not race for it.
+        """
+        started = time.perf_counter()
+        self.commander.update_unit(unit.id, status="EnRoute")
+        try:
+            if self.claims == "local":
+                self.state.update_unit(unit.id, {"status": "Responding", "current_incident_id": incident_id})
+                self.state.update_incident(incident_id, {"assigned_unit_id": unit.id, "status": "Dispatched"})
+                outcome = CLAIMED
+            else:
+                record = self.state.unit(unit.id)
+                result = await self.repo.claim_unit(unit.id, incident_id,
+                                                    record.version if record is not None else None)
+                # The result carries both rows as they are now, won or lost
+                if result["unit"] is not None:
+                    self.state.apply_written("units", result["unit"])
+                if result["incident"] is not None:
+                    self.state.apply_written("incidents", result["incident"])
+                if result["claimed"]:
+                    outcome = CLAIMED
+                elif result["incident"] is None or result["incident"].get("status") != "Active":
+                    outcome = INCIDENT_CLOSED
+                else:
+                    outcome = UNIT_TAKEN
+        finally:
+            # Back in the index as whatever the store now says it is
+            record = self.state.unit(unit.id)
+            if record is not None:
+                self.commander.on_unit_change(record)
+        CLAIMS.labels(outcome).inc()
+        CLAIM_SECONDS.observe(time.perf_counter() - started)
+
+        if outcome == CLAIMED and self.movement is not None:
+            route = await self.commander.plan_route_async(unit, incident["lat"], incident["lng"])
+            self.movement.dispatch(unit.id, incident_id, incident["lat"], incident["lng"], route=route)
+        return outcome
+
+    async def _sync_commander(self):
+        """Before the first dispatch: wait for the store's startup reconcile and mirror its units."""
+        if not self._commander_synced:
+            await self.state.ready()
+            self.commander.sync_units(self.state.unit_rows())
+            self._commander_synced = True
+
+    @staticmethod
+    def _record_assignment(item: Dict):
+        now = time.perf_counter()
+        DISPATCHES.labels("assigned").inc()
+        TIME_TO_ASSIGN.observe(now - item["persisted_at"])
+        if "received_at" in item["raw"]:
+            REPORT_TO_ASSIGN.observe(now - item["raw"]["received_at"])
@@ -0,0 +1,572 @@
+"""
+Adaptive Rate Limits for Community Shield
+One limiter per upstream provider (Together, Groq, Twitter), shared by every
+client that calls it. Each is a token bucket whose refill rate follows the
+provider's own rate-limit headers: the remaining request budget spread over
+the time until it resets, or the remaining token budget over the average
+completion size if that is tighter. Concurrency is sized from that rate and
+the observed latency (Little's law), so a generous quota keeps more requests
+in flight and a nearly spent one fewer. A 429 empties the bucket until the
+provider's retry-after or reset time. Until a provider has sent headers the
+limiter only reacts to 429s.
+
+Each limiter also carries a circuit breaker. When the share of failed calls
+in the recent window crosses a threshold it opens, and callers fail over at
+once (BiasGuard to its keyword rules, the Analyst to the gazetteer, tweets to
+the ingest log's retries) instead of queueing on a dead service. After a
+cooldown one probe call is let through: success closes the breaker, failure
+reopens it for twice as long.
+
+Async callers take the budget on the event loop (admit()) before handing the
+call to a worker thread, so threads are never parked waiting for budget and
+max_wait counts from when the caller asked, not from when a thread was free.
+"""
+import asyncio
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from metrics import observed_completion
+
+RATE_LIMIT_MAX_WAIT = float(os.environ.get("RATE_LIMIT_MAX_WAIT", "10"))  # Longest a call queues for budget
+RATE_LIMIT_MIN_RPS = 0.001
+BREAKER_WINDOW = float(os.environ.get("BREAKER_WINDOW", "30"))  # Seconds of outcomes the error ratio is taken over
+BREAKER_MIN_CALLS = int(os.environ.get("BREAKER_MIN_CALLS", "5"))
+BREAKER_ERROR_RATIO = float(os.environ.get("BREAKER_ERROR_RATIO", "0.5"))
+BREAKER_COOLDOWN = float(os.environ.get("BREAKER_COOLDOWN", "15"))
+BREAKER_MAX_COOLDOWN = float(os.environ.get("BREAKER_MAX_COOLDOWN", "300"))
+
+# Per provider: most requests in flight, and burst size (override with RATE_LIMIT_<PROVIDER>_CONCURRENCY / _BURST).
+# RATE_LIMIT_<PROVIDER>_RPS sets a starting rate for providers that send no headers.
+PROVIDERS = {
+    "together": {"concurrency": 8, "burst": 10},
+    "groq": {"concurrency": 4, "burst": 5},
+    "twitter": {"concurrency": 1, "burst": 1},
+}
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+class RateLimitedError(Exception):
+    """No request budget became available within the caller's wait limit."""
+
+
+class CircuitOpenError(Exception):
+    """The provider's circuit breaker is open: fail over instead of calling it."""
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Seconds from a reset header: "7.66s", "2m59.56s", "500ms", plain seconds, or a Unix time."""
+    value = value.strip()
+    try:
+        number = float(value)
+    except ValueError:
+        parts = _DURATION_PART.findall(value)
+        if not parts:
+            return None
+        return sum(float(amount) * _UNIT_SECONDS[unit] for amount, unit in parts)
+    # Twitter sends the reset as a Unix timestamp
+    return max(0.0, number - time.time()) if number > 1e9 else number
+
+
+def parse_rate_limit_headers(headers: Mapping[str, str]) -> Dict[str, Optional[float]]:
+    """
+    Requests remaining, tokens remaining and seconds until each resets, from
+    Groq/OpenAI-style (x-ratelimit-*-requests, x-ratelimit-*-tokens), Together
+    (x-ratelimit-limit/-remaining/-reset and -tokens) or Twitter v2
+    (x-rate-limit-*) headers. Missing values are None.
+    """
+    def first(*names):
+        for name in names:
+            value = headers.get(name)
+            if value is not None:
+                return value
+        return None
+
+    def number(*names):
+        value = first(*names)
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+    def duration(*names):
+        value = first(*names)
+        return parse_duration(value) if value is not None else None
+
+    return {
+        "limit": number("x-ratelimit-limit-requests", "x-ratelimit-limit", "x-rate-limit-limit"),
+        "remaining": number("x-ratelimit-remaining-requests", "x-ratelimit-remaining", "x-rate-limit-remaining"),
+        "reset": duration("x-ratelimit-reset-requests", "x-ratelimit-reset", "x-rate-limit-reset"),
+        "tokens_remaining": number("x-ratelimit-remaining-tokens"),
+        "tokens_reset": duration("x-ratelimit-reset-tokens"),
+        "retry_after": duration("retry-after"),
+    }
+
+
+def _response_of(error: Exception) -> Any:
+    return getattr(error, "response", None)
+
+
+def _status_of(error: Exception) -> Optional[int]:
+    """HTTP status of an OpenAI/Groq APIStatusError or a tweepy HTTPException (None for network errors)."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(_response_of(error), "status_code", None)
+    return status
+
+
+def _is_failure(status: Optional[int]) -> bool:
+    """Errors that say the service is unusable, as opposed to a bad request."""
+    return status is None or status >= 500 or status in (401, 403, 408)
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _Admission:
+    """A token and slot taken on the event loop, handed to the request() in the worker thread."""
+
+    __slots__ = ("limiter", "probe", "claimed")
+
+    def __init__(self, limiter: "ProviderLimiter", probe: bool):
+        self.limiter = limiter
+        self.probe = probe
+        self.claimed = False
+
+
+# Copied into worker threads by asyncio.to_thread along with the rest of the context
+_ADMISSION: ContextVar[Optional[_Admission]] = ContextVar("rate_limit_admission", default=None)
+
+
+class ProviderLimiter:
+    """
+    Thread-safe: the LLM SDKs and tweepy are called from worker threads.
+    admit() waits for budget on the event loop; acquire() (used by request()
+    when no admission was taken) blocks the calling thread instead. Either
+    gives up after max_wait seconds with RateLimitedError, or at once when
+    the callers already waiting need more budget than max_wait will bring.
+    """
+
+    def __init__(self, name: str, concurrency: int = 4, burst: int = 5, rps: Optional[float] = None,
+                 max_wait: float = RATE_LIMIT_MAX_WAIT, window: float = BREAKER_WINDOW,
+                 min_calls: int = BREAKER_MIN_CALLS, error_ratio: float = BREAKER_ERROR_RATIO,
+                 cooldown: float = BREAKER_COOLDOWN, max_cooldown: float = BREAKER_MAX_COOLDOWN):
+        self.name = name
+        self.max_concurrency = max(1, int(concurrency))
+        self.burst = max(1, int(burst))
+        self.max_wait = max_wait
+        self.rate = rps  # Requests/second the budget allows; None until known
+        self.capacity = float(self.burst)
+        self.concurrency = self.max_concurrency
+        self.from_headers = False
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._in_flight = 0
+        self._waiting = 0
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._latency: Optional[float] = None  # EWMA seconds per call
+        self._tokens_per_call: Optional[float] = None  # EWMA of LLM tokens billed per call
+        self._cond = threading.Condition()
+
+        # Circuit breaker
+        self.window = window
+        self.min_calls = min_calls
+        self.error_ratio = error_ratio
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = CLOSED
+        self._cooldown = cooldown
+        self._opened_until = 0.0
+        self._probing = False
+        self._outcomes: deque = deque()  # (time, failed)
+
+        # Counters
+        self.calls = 0
+        self.failures = 0
+        self.throttled = 0  # 429 responses
+        self.rejected = 0  # Gave up waiting for budget
+        self.short_circuited = 0  # Refused while the breaker was open
+        self.trips = 0
+        self.waited_seconds = 0.0
+        self.header_updates = 0
+        self._resize()
+
+    # --- token bucket -----------------------------------------------------
+    def _refill(self, now: float):
+        if self.rate is not None:
+            self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.rate)
+        else:
+            self._tokens = self.capacity
+        self._refilled_at = now
+
+    def _resize(self):
+        """In flight = rate x latency (Little's law), plus one to cover the gaps."""
+        if self.rate is None:
+            self.concurrency = self.max_concurrency
+        else:
+            needed = math.ceil(self.rate * (self._latency or 1.0)) + 1
+            self.concurrency = max(1, min(self.max_concurrency, needed))
+
+    def _set_rate(self, rate: float):
+        self.rate = max(RATE_LIMIT_MIN_RPS, rate)
+        self._resize()
+
+    # --- circuit breaker --------------------------------------------------
+    def available(self) -> bool:
+        """False while the breaker refuses calls; callers use it to fail over without trying."""
+        with self._cond:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() < self._opened_until:
+                return False
+            return not self._probing
+
+    def _admit(self, now: float) -> bool:
+        """Let a call past the breaker; True if it is the half-open probe."""
+        if self.state == CLOSED:
+            return False
+        if self.state == OPEN and now >= self._opened_until:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.short_circuited += 1
+        raise CircuitOpenError(f"{self.name} circuit open")
+
+    def _trip(self, now: float, escalate: bool):
+        if escalate:
+            self._cooldown = min(self.max_cooldown, self._cooldown * 2)
+        self.state = OPEN
+        self._opened_until = now + self._cooldown
+        self._outcomes.clear()
+        self.trips += 1
+        print(f"🔌 {self.name} circuit opened; failing over for {self._cooldown:.0f}s")
+
+    def _record(self, now: float, failed: bool, probe: bool):
+        if probe:
+            self._probing = False
+            if failed:
+                self._trip(now, escalate=True)
+            else:
+                self.state = CLOSED
+                self._cooldown = self.base_cooldown
+                print(f"🔌 {self.name} circuit closed")
+            return
+        self._outcomes.append((now, failed))
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+        if self.state == CLOSED and len(self._outcomes) >= self.min_calls:
+            failures = sum(1 for _, f in self._outcomes if f)
+            if failures / len(self._outcomes) >= self.error_ratio:
+                self._trip(now, escalate=False)
+
+    # --- calls ------------------------------------------------------------
+    def _take(self, started: float, deadline: float, probe: bool) -> Optional[float]:
+        """
+        Take a token and a slot if both are free (returns None); otherwise the
+        seconds to wait before trying again. Raises RateLimitedError when the
+        budget cannot arrive before the deadline. Called with the lock held.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if now >= self._blocked_until and self._tokens >= 1 and self._in_flight < self.concurrency:
+            self._tokens -= 1
+            self._in_flight += 1
+            self.calls += 1
+            self.waited_seconds += now - started
+            return None
+        remaining = deadline - now
+        if now < self._blocked_until:
+            wait, known = self._blocked_until - now, True
+        elif self._tokens < 1 and self.rate is not None:
+            # Everyone already waiting is ahead of us: shed load now rather than at the deadline
+            wait, known = (self._waiting - self._tokens) / self.rate, True
+        else:
+            wait, known = remaining, False  # Until a slot is released (notified)
+        if remaining <= 0 or (known and wait > remaining):
+            if probe:
+                self._probing = False
+            self.rejected += 1
+            raise RateLimitedError(f"{self.name}: no request budget within {deadline - started:.0f}s")
+        return max(0.001, min(wait, remaining))
+
+    def _notify(self):
+        """Wake waiting threads and event-loop waiters. Called with the lock held."""
+        self._cond.notify_all()
+        for loop, future in self._async_waiters:
+            loop.call_soon_threadsafe(_wake, future)
+        self._async_waiters = []
+
+    def acquire(self, max_wait: Optional[float] = None) -> bool:
+        """
+        Wait (blocking this thread) for a token and a free slot. Raises
+        CircuitOpenError at once while the breaker is open, RateLimitedError
+        if the wait would exceed max_wait. Returns whether this call is the
+        breaker's half-open probe.
+        """
+        started = time.monotonic()
+        deadline = started + (self.max_wait if max_wait is None else max_wait)
+        with self._cond:
+            probe = self._admit(started)
+            self._waiting += 1
+            try:
+                while True:
+                    wait = self._take(started, deadline, probe)
+                    if wait is None:
+                        return probe
+                    self._cond.wait(wait)
+            finally:
+                self._waiting -= 1
+
+    async def acquire_async(self, max_wait: Optional[float] = None) -> bool:
+        """acquire() for the event loop: waits without holding a thread."""
+        started = time.monotonic()
+        deadline = started + (self.max_wait if max_wait is None else max_wait)
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            probe = self._admit(started)
+            self._waiting += 1
+        try:
+            while True:
+                with self._cond:
+                    wait = self._take(started, deadline, probe)
+                    if wait is None:
+                        return probe
+                    wakeup = loop.create_future()
+                    self._async_waiters.append((loop, wakeup))
+                try:
+                    await asyncio.wait_for(wakeup, wait)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            if probe:
+                with self._cond:
+                    self._probing = False
+            raise
+        finally:
+            with self._cond:
+                self._waiting -= 1
+
+    def _cancel(self, probe: bool):
+        """Give back a slot that was admitted but never used for a call."""
+        with self._cond:
+            self._in_flight -= 1
+            self._tokens = min(self.capacity, self._tokens + 1)
+            self.calls -= 1
+            if probe:
+                self._probing = False
+            self._notify()
+
+    @asynccontextmanager
+    async def admit(self, max_wait: Optional[float] = None):
+        """
+        async with limiter.admit(): await asyncio.to_thread(call_the_provider)
+        The budget and breaker decision are taken here, on the event loop; the
+        request() inside the thread uses this admission instead of waiting.
+        """
+        probe = await self.acquire_async(max_wait)
+        admission = _Admission(self, probe)
+        token = _ADMISSION.set(admission)
+        try:
+            yield
+        finally:
+            _ADMISSION.reset(token)
+            with self._cond:
+                unused, admission.claimed = not admission.claimed, True
+            if unused:
+                self._cancel(probe)
+
+    def _claim_admission(self) -> Optional[bool]:
+        """The probe flag of an admit() taken for this call, if there is an unclaimed one."""
+        admission = _ADMISSION.get()
+        if admission is None or admission.limiter is not self:
+            return None
+        with self._cond:
+            if admission.claimed:
+                return None
+            admission.claimed = True
+            return admission.probe
+
+    def _release(self, started: float, probe: bool, error: Optional[Exception] = None):
+        with self._cond:
+            now = time.monotonic()
+            self._in_flight -= 1
+            status = _status_of(error) if error is not None else None
+            response = _response_of(error) if error is not None else None
+            if response is not None and getattr(response, "headers", None) is not None:
+                self._observe(response.headers)
+            if status == 429:
+                self._throttle(now, response)
+                if probe:
+                    self._probing = False
+            else:
+                failed = error is not None and _is_failure(status)
+                if failed:
+                    self.failures += 1
+                elif error is None:
+                    latency = now - started
+                    self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+                    if not self.from_headers and self.rate is not None:
+                        self._set_rate(self.rate * 1.05)  # Probe upwards until the next 429
+                    else:
+                        self._resize()
+                self._record(now, failed, probe)
+            self._notify()
+
+    def _throttle(self, now: float, response: Any):
+        """A 429: no calls until the provider says, and (without headers to go by) half the rate."""
+        self.throttled += 1
+        headers = getattr(response, "headers", None) or {}
+        info = parse_rate_limit_headers(headers)
+        pause = info["retry_after"] if info["retry_after"] is not None else (info["reset"] or 1.0)
+        self._blocked_until = max(self._blocked_until, now + pause)
+        self._tokens = 0.0
+        if not self.from_headers:
+            recent = len(self._outcomes) / self.window if self._outcomes else 1.0
+            self._set_rate(min(self.rate or recent, recent) / 2)
+
+    @contextmanager
+    def request(self, max_wait: Optional[float] = None):
+        """with limiter.request(): call_the_provider()  (budget, concurrency and breaker in one)"""
+        probe = self._claim_admission()
+        if probe is None:
+            probe = self.acquire(max_wait)
+        started = time.monotonic()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._release(started, probe, error)
+
+    # --- headers ----------------------------------------------------------
+    def observe(self, headers: Mapping[str, str], tokens: Optional[float] = None):
+        """Resize the budget from a response's rate-limit headers (and the tokens it billed)."""
+        with self._cond:
+            if tokens:
+                self._tokens_per_call = tokens if self._tokens_per_call is None else \
+                    0.8 * self._tokens_per_call + 0.2 * tokens
+            self._observe(headers)
+            self._notify()
+
+    def _observe(self, headers: Mapping[str, str]):
+        info = parse_rate_limit_headers(headers)
+        now = time.monotonic()
+        rates = []
+        remaining, reset = info["remaining"], info["reset"]
+        if remaining is not None and reset is not None:
+            rates.append(remaining / max(reset, 1.0))
+            if remaining < 1:
+                self._blocked_until = max(self._blocked_until, now + reset)
+        tokens_remaining = info["tokens_remaining"]
+        tokens_reset = info["tokens_reset"] if info["tokens_reset"] is not None else reset
+        if tokens_remaining is not None and tokens_reset is not None and self._tokens_per_call:
+            rates.append(tokens_remaining / self._tokens_per_call / max(tokens_reset, 1.0))
+            if tokens_remaining < self._tokens_per_call:
+                self._blocked_until = max(self._blocked_until, now + tokens_reset)
+        if not rates:
+            return
+        self._refill(now)
+        self.from_headers = True
+        self._set_rate(min(rates))
+        self.capacity = float(max(1, min(self.burst, int(remaining) if remaining is not None else self.burst)))
+        self._tokens = min(self._tokens, self.capacity)
+        self.header_updates += 1
+
+    def response_hook(self, response, *args, **kwargs):
+        """requests session hook (tweepy): read the headers of every response."""
+        self.observe(response.headers)
+        return response
+
+    def spacing(self) -> Optional[float]:
+        """Seconds between calls the budget currently affords; None until a rate is known."""
+        with self._cond:
+            if self.rate is None:
+                return None
+            now = time.monotonic()
+            wait = 1 / self.rate
+            if self.state == OPEN:
+                wait = max(wait, self._opened_until - now)
+            return max(wait, self._blocked_until - now)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "state": self.state,
+                "rate_rps": round(self.rate, 4) if self.rate is not None else None,
+                "from_headers": self.from_headers,
+                "concurrency": self.concurrency,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "latency_ms": round(self._latency * 1000, 1) if self._latency is not None else None,
+                "tokens_per_call": round(self._tokens_per_call) if self._tokens_per_call else None,
+                "calls": self.calls,
+                "failures": self.failures,
+                "throttled": self.throttled,
+                "rejected": self.rejected,
+                "short_circuited": self.short_circuited,
+                "trips": self.trips,
+                "waited_seconds": round(self.waited_seconds, 3),
+                "header_updates": self.header_updates,
+            }
+
+
+def limited_completion(provider: str, agent: str, mode: str, completions, **kwargs):
+    """
+    observed_completion through the provider's limiter: completions is the
+    SDK's chat.completions resource (OpenAI or Groq); the raw response's
+    rate-limit headers and billed tokens resize the limiter.
+    """
+    limiter = get_rate_limiter(provider)
+
+    def create(**params):
+        with limiter.request():
+            raw = completions.with_raw_response.create(**params)
+            completion = raw.parse()
+            limiter.observe(raw.headers, getattr(getattr(completion, "usage", None), "total_tokens", None))
+            return completion
+
+    return observed_completion(agent, mode, create, **kwargs)
+
+
+_limiters: Dict[str, ProviderLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> ProviderLimiter:
+    """Process-wide limiter for one provider, shared by all of its clients."""
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            defaults = PROVIDERS.get(provider, {"concurrency": 4, "burst": 5})
+            prefix = f"RATE_LIMIT_{provider.upper()}_"
+            rps = os.environ.get(prefix + "RPS")
+            limiter = ProviderLimiter(
+                provider,
+                concurrency=int(os.environ.get(prefix + "CONCURRENCY", defaults["concurrency"])),
+                burst=int(os.environ.get(prefix + "BURST", defaults["burst"])),
+                rps=float(rps) if rps else None,
+            )
+            _limiters[provider] = limiter
+        return limiter
+
+
+def rate_limit_stats() -> Dict[str, Dict]:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
@@ -0,0 +1,719 @@
+"""
+Async data-access layer for Community Shield
+One repository per process, talking to Supabase's PostgREST API over a pooled
+keep-alive HTTP connection. An in-memory stand-in with the same interface is
+used for local runs and benchmarks.
+"""
+import asyncio
+import base64
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypedDict
+
+import httpx
+
+from metrics import get_metrics
+
+# Filter = (column, operator, value); operators follow PostgREST: eq, neq, lt, lte, gt, gte, in.
+# "row_lt" compares a tuple of columns to a tuple of values like SQL's (a, b) < (x, y), for keyset paging.
+Filter = Tuple[Any, str, Any]
+
+# (min_lat, min_lng, max_lat, max_lng)
+BBox = Tuple[float, float, float, float]
+
+# Keyset pages are ordered newest first on (created_at, id); a cursor is the last row's key
+PAGE_ORDER = "created_at,id"
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", "500"))
+
+# Change listener: callback(table, op, rows) with op "INSERT" or "UPDATE"
+ChangeListener = Callable[[str, str, List[Dict]], None]
+
+DEFAULT_TIMEOUT = float(os.environ.get("DB_TIMEOUT", "5"))
+MAX_CONNECTIONS = int(os.environ.get("DB_MAX_CONNECTIONS", "20"))
+
+DB_REQUEST_SECONDS = get_metrics().histogram("db_request_duration_seconds", "PostgREST round trip",
+                                             ("method", "table", "outcome"))
+
+
+# ============================================
+# Row types (mirror database/schema.sql)
+# ============================================
+class IncidentRow(TypedDict, total=False):
+    id: str
+    type: str
+    severity: str
+    location: str
+    lat: float
+    lng: float
+    summary: str
+    raw_text: str
+    source: str
+    status: str
+    assigned_unit_id: Optional[str]
+    report_count: int
+    created_at: str
+    updated_at: str
+
+
+class UnitRow(TypedDict, total=False):
+    id: str
+    name: str
+    type: str
+    status: str
+    lat: float
+    lng: float
+    current_incident_id: Optional[str]
+    version: int
+    created_at: str
+    updated_at: str
+
+
+class LogRow(TypedDict, total=False):
+    id: str
+    message: str
+    log_type: str
+    incident_id: Optional[str]
+    unit_id: Optional[str]
+    created_at: str
+
+
+class HotspotRow(TypedDict, total=False):
+    id: str
+    location: str
+    lat: float
+    lng: float
+    risk_score: float
+    incident_count: int
+    last_incident_at: Optional[str]
+    created_at: str
+    updated_at: str
+
+
+class ClaimResult(TypedDict):
+    claimed: bool
+    unit: Optional[UnitRow]          # The unit as it is now (None if it does not exist)
+    incident: Optional[IncidentRow]
+
+
+class BiasCheckRow(TypedDict, total=False):
+    id: str
+    incident_id: str
+    method: str
+    bias_score: float
+    status: str
+    warnings: List[str]
+    reasoning: str
+    created_at: str
+
+
+class LeaseRow(TypedDict):
+    name: str
+    holder: str
+    expires_at: str
+
+
+class WorkItemRow(TypedDict, total=False):
+    id: Any
+    kind: str
+    payload: Dict
+    claimed_by: Optional[str]
+    claimed_until: Optional[str]
+    attempts: int
+    created_at: str
+
+
+class RepositoryError(Exception):
+    """
+    Raised when a database call fails or times out. status is the HTTP status
+    PostgREST answered with, if any; retryable is False for request errors
+    (unknown column, constraint violation) that would fail the same way again.
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        return self.status is None or self.status >= 500 or self.status in (408, 429)
+
+
+def encode_cursor(row: Dict) -> str:
+    """Opaque page cursor from a row's (created_at, id)."""
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Inverse of encode_cursor; raises ValueError on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(created_at, str) or not isinstance(row_id, str):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return created_at, row_id
+
+
+def _one_or_many(value) -> Optional[Filter]:
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple, set)):
+        return ("in", list(value))
+    return ("eq", value)
+
+
+class Repository:
+    """
+    Typed table access shared by every backend.
+    Subclasses only implement the _select / _insert / _update / _upsert / _rpc primitives.
+    Writes made through the typed methods are reported to change listeners.
+    """
+
+    def __init__(self):
+        self._listeners: List[ChangeListener] = []
+
+    # --- primitives ---------------------------------------------------
+    async def _select(self, table: str, filters: Sequence[Filter] = (), order: Optional[str] = None,
+                      desc: bool = False, limit: Optional[int] = None, columns: str = "*") -> List[Dict]:
+        raise NotImplementedError
+
+    async def _insert(self, table: str, rows: List[Dict]) -> List[Dict]:
+        raise NotImplementedError
+
+    async def _update(self, table: str, filters: Sequence[Filter], changes: Dict) -> List[Dict]:
+        raise NotImplementedError
+
+    async def _upsert(self, table: str, rows: List[Dict]) -> List[Dict]:
+        """Update rows matched on id, inserting any that do not exist, in one request."""
+        raise NotImplementedError
+
+    async def _rpc(self, function: str, params: Dict) -> Any:
+        """Call a database function (see database/schema.sql) in its own transaction."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    # --- change listeners ---------------------------------------------
+    def add_listener(self, callback: ChangeListener):
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: ChangeListener):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, table: str, op: str, rows: List[Dict]):
+        if not rows:
+            return
+        for callback in self._listeners:
+            try:
+                callback(table, op, rows)
+            except Exception as e:
+                print(f"Repository listener error on {table}: {e}")
+
+    async def _insert_rows(self, table: str, rows: List[Dict]) -> List[Dict]:
+        inserted = await self._insert(table, rows)
+        self._notify(table, "INSERT", inserted)
+        return inserted
+
+    async def _update_rows(self, table: str, filters: Sequence[Filter], changes: Dict) -> List[Dict]:
+        updated = await self._update(table, filters, changes)
+        self._notify(table, "UPDATE", updated)
+        return updated
+
+    async def _upsert_rows(self, table: str, rows: List[Dict]) -> List[Dict]:
+        upserted = await self._upsert(table, rows)
+        self._notify(table, "UPDATE", upserted)
+        return upserted
+
+    async def _page(self, table: str, filters: List[Filter], before: Optional[Tuple[str, str]],
+                    since: Optional[str], until: Optional[str], limit: int, columns: str) -> List[Dict]:
+        """Newest-first keyset page: rows strictly older than `before` within [since, until)."""
+        if before is not None:
+            filters.append((("created_at", "id"), "row_lt", tuple(before)))
+        if since is not None:
+            filters.append(("created_at", "gte", since))
+        if until is not None:
+            filters.append(("created_at", "lt", until))
+        return await self._select(table, filters, order=PAGE_ORDER, desc=True,
+                                  limit=max(1, min(limit, MAX_PAGE_SIZE)), columns=columns)
+
+    # --- incidents ----------------------------------------------------
+    async def list_incidents(self, limit: int = 50, before: Optional[Tuple[str, str]] = None,
+                             severity=None, status=None, source=None, bbox: Optional[BBox] = None,
+                             since: Optional[str] = None, until: Optional[str] = None,
+                             columns: str = "*", ids: Optional[List[str]] = None) -> List[IncidentRow]:
+        """
+        Newest incidents first. severity, status and source take one value or a list;
+        before is a (created_at, id) cursor from the previous page.
+        """
+        filters: List[Filter] = [("id", "in", list(ids))] if ids is not None else []
+        for column, value in (("severity", severity), ("status", status), ("source", source)):
+            condition = _one_or_many(value)
+            if condition:
+                filters.append((column, *condition))
+        if bbox is not None:
+            min_lat, min_lng, max_lat, max_lng = bbox
+            filters += [("lat", "gte", min_lat), ("lat", "lte", max_lat),
+                        ("lng", "gte", min_lng), ("lng", "lte", max_lng)]
+        return await self._page("incidents", filters, before, since, until, limit, columns)
+
+    async def insert_incident(self, incident: IncidentRow) -> IncidentRow:
+        rows = await self._insert_rows("incidents", [incident])
+        return rows[0]
+
+    async def update_incident(self, incident_id: str, changes: IncidentRow) -> Optional[IncidentRow]:
+        rows = await self._update_rows("incidents", [("id", "eq", incident_id)], changes)
+        return rows[0] if rows else None
+
+    # --- units --------------------------------------------------------
+    async def list_units(self, status: Optional[str] = None, ids: Optional[List[str]] = None) -> List[UnitRow]:
+        filters: List[Filter] = [("status", "eq", status)] if status else []
+        if ids is not None:
+            filters.append(("id", "in", list(ids)))
+        return await self._select("units", filters)
+
+    async def insert_units(self, units: List[UnitRow]) -> List[UnitRow]:
+        return await self._insert_rows("units", units)
+
+    async def update_unit(self, unit_id: str, changes: UnitRow) -> Optional[UnitRow]:
+        rows = await self._update_rows("units", [("id", "eq", unit_id)], changes)
+        return rows[0] if rows else None
+
+    async def upsert_units(self, units: List[UnitRow]) -> List[UnitRow]:
+        """Bulk write of many units' changes; each row carries its id and name."""
+        return await self._upsert_rows("units", units)
+
+    async def update_units_by_status(self, status: str, changes: UnitRow) -> List[UnitRow]:
+        return await self._update_rows("units", [("status", "eq", status)], changes)
+
+    async def claim_unit(self, unit_id: str, incident_id: str,
+                         expected_version: Optional[int] = None) -> ClaimResult:
+        """
+        Compare-and-set dispatch: make an Idle unit Responding to an Active
+        incident and mark the incident Dispatched, atomically. Fails without
+        writing if the unit is no longer Idle, its version moved on since
+        expected_version, or the incident is no longer Active.
+        """
+        result = await self._rpc("claim_unit", {"p_unit_id": unit_id, "p_incident_id": incident_id,
+                                                "p_expected_version": expected_version})
+        if result["claimed"]:
+            self._notify("units", "UPDATE", [result["unit"]])
+            self._notify("incidents", "UPDATE", [result["incident"]])
+        return result
+
+    # --- logs ---------------------------------------------------------
+    async def list_logs(self, limit: int = 50, before: Optional[Tuple[str, str]] = None, log_type=None,
+                        incident_id: Optional[str] = None, since: Optional[str] = None,
+                        until: Optional[str] = None, columns: str = "*") -> List[LogRow]:
+        """Newest logs first, with the same keyset paging as list_incidents."""
+        filters: List[Filter] = []
+        condition = _one_or_many(log_type)
+        if condition:
+            filters.append(("log_type", *condition))
+        if incident_id is not None:
+            filters.append(("incident_id", "eq", incident_id))
+        return await self._page("logs", filters, before, since, until, limit, columns)
+
+    async def insert_log(self, entry: LogRow) -> LogRow:
+        rows = await self._insert_rows("logs", [entry])
+        return rows[0]
+
+    async def insert_logs(self, entries: List[LogRow]) -> List[LogRow]:
+        return await self._insert_rows("logs", entries)
+
+    # --- hotspots -----------------------------------------------------
+    async def list_hotspots(self) -> List[HotspotRow]:
+        return await self._select("hotspots", order="risk_score", desc=True)
+
+    async def insert_hotspots(self, hotspots: List[HotspotRow]) -> List[HotspotRow]:
+        return await self._insert_rows("hotspots", hotspots)
+
+    async def update_hotspot(self, hotspot_id: str, changes: HotspotRow) -> Optional[HotspotRow]:
+        rows = await self._update_rows("hotspots", [("id", "eq", hotspot_id)], changes)
+        return rows[0] if rows else None
+
+    async def upsert_hotspots(self, hotspots: List[HotspotRow]) -> List[HotspotRow]:
+        """Bulk write of many hotspot rows; each row carries its id and every column."""
+        return await self._upsert_rows("hotspots", hotspots)
+
+    # --- bias checks --------------------------------------------------
+    async def list_bias_checks(self, limit: int = 50) -> List[BiasCheckRow]:
+        return await self._select("bias_checks", order="created_at", desc=True, limit=limit,
+                                  columns="*, incidents(type, location, severity, created_at)")
+
+    async def insert_bias_check(self, check: BiasCheckRow) -> BiasCheckRow:
+        rows = await self._insert_rows("bias_checks", [check])
+        return rows[0]
+
+    # --- leader leases ------------------------------------------------
+    async def acquire_lease(self, name: str, holder: str, ttl_seconds: float) -> LeaseRow:
+        """Take the named lease if free or expired, or renew it for holder; returns who holds it now."""
+        return await self._rpc("acquire_lease", {"p_name": name, "p_holder": holder, "p_ttl_seconds": ttl_seconds})
+
+    async def release_lease(self, name: str, holder: str):
+        await self._rpc("release_lease", {"p_name": name, "p_holder": holder})
+
+    # --- work queue ---------------------------------------------------
+    async def enqueue_work(self, items: List[WorkItemRow]) -> List[WorkItemRow]:
+        return await self._insert_rows("work_queue", items)
+
+    async def claim_work(self, worker: str, limit: int, lease_seconds: float,
+                         max_attempts: int = 5) -> List[WorkItemRow]:
+        """Claim up to limit queued items, oldest first, hidden from other workers for lease_seconds."""
+        return await self._rpc("claim_work", {"p_worker": worker, "p_limit": limit, "p_lease_seconds": lease_seconds,
+                                              "p_max_attempts": max_attempts})
+
+    async def complete_work(self, worker: str, ids: List[Any]) -> int:
+        """Delete handled items that worker still holds; returns how many."""
+        return await self._rpc("complete_work", {"p_worker": worker, "p_ids": list(ids)})
+
+    async def renew_work(self, worker: str, ids: List[Any], lease_seconds: float) -> int:
+        """Extend the lease on items worker still holds; returns how many."""
+        return await self._rpc("renew_work", {"p_worker": worker, "p_ids": list(ids),
+                                              "p_lease_seconds": lease_seconds})
+
+    async def dead_letter_work(self, worker: str, ids: List[Any], error: str, max_attempts: int = 5) -> int:
+        """
+        Move items whose last attempt failed (ids, held by worker) and items
+        whose last attempt ran out its lease to work_dead_letter; returns how many.
+        """
+        return await self._rpc("dead_letter_work", {"p_worker": worker, "p_ids": list(ids), "p_error": error,
+                                                    "p_max_attempts": max_attempts})
+
+
+class SupabaseRepository(Repository):
+    """PostgREST backend with a shared connection pool and per-call deadlines."""
+
+    def __init__(self, url: str, key: str, timeout: float = DEFAULT_TIMEOUT,
+                 max_connections: int = MAX_CONNECTIONS):
+        super().__init__()
+        self.timeout = timeout
+        self._client = httpx.AsyncClient(
+            base_url=f"{url.rstrip('/')}/rest/v1",
+            headers={
+                "apikey": key,
+                "Authorization": f"Bearer {key}",
+                "Content-Type": "application/json",
+            },
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections,
+                                keepalive_expiry=60),
+        )
+
+    async def close(self):
+        await self._client.aclose()
+
+    @staticmethod
+    def _encode_filters(filters: Sequence[Filter]) -> List[Tuple[str, str]]:
+        params = []
+        for column, op, value in filters:
+            if op == "row_lt":
+                # (a, b) < (x, y)  ==  a < x OR (a = x AND b < y); values quoted for PostgREST's or= grammar
+                (first, second), (first_value, second_value) = column, value
+                params.append(("or", f'({first}.lt."{first_value}",'
+                                     f'and({first}.eq."{first_value}",{second}.lt."{second_value}"))'))
+                continue
+            if op == "in":
+                value = "(" + ",".join(str(v) for v in value) + ")"
+            params.append((column, f"{op}.{value}"))
+        return params
+
+    async def _request(self, method: str, table: str, params: List[Tuple[str, str]] = None,
+                       json: Any = None, prefer: Optional[str] = None) -> List[Dict]:
+        headers = {"Prefer": prefer} if prefer else None
+        started = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(
+                self._client.request(method, f"/{table}", params=params, json=json, headers=headers),
+                timeout=self.timeout,
+            )
+        except (asyncio.TimeoutError, httpx.TimeoutException) as e:
+            DB_REQUEST_SECONDS.labels(method, table, "timeout").observe(time.perf_counter() - started)
+            raise RepositoryError(f"{method} {table} timed out after {self.timeout}s") from e
+        except httpx.HTTPError as e:
+            DB_REQUEST_SECONDS.labels(method, table, "error").observe(time.perf_counter() - started)
+            raise RepositoryError(f"{method} {table} failed: {e}") from e
+
+        outcome = "ok" if response.status_code < 400 else f"http_{response.status_code}"
+        DB_REQUEST_SECONDS.labels(method, table, outcome).observe(time.perf_counter() - started)
+        if response.status_code >= 400:
+            raise RepositoryError(f"{method} {table} returned {response.status_code}: {response.text}",
+                                  response.status_code)
+        return response.json() if response.content else []
+
+    async def _select(self, table, filters=(), order=None, desc=False, limit=None, columns="*"):
+        params = [("select", columns.replace(" ", ""))] + self._encode_filters(filters)
+        if order:
+            direction = "desc" if desc else "asc"
+            params.append(("order", ",".join(f"{column}.{direction}" for column in order.split(","))))
+        if limit is not None:
+            params.append(("limit", str(limit)))
+        return await self._request("GET", table, params=params)
+
+    async def _insert(self, table, rows):
+        return await self._request("POST", table, json=rows, prefer="return=representation")
+
+    async def _update(self, table, filters, changes):
+        return await self._request("PATCH", table, params=self._encode_filters(filters),
+                                   json=changes, prefer="return=representation")
+
+    async def _upsert(self, table, rows):
+        return await self._request("POST", table, params=[("on_conflict", "id")], json=rows,
+                                   prefer="resolution=merge-duplicates,return=representation")
+
+    async def _rpc(self, function, params):
+        return await self._request("POST", f"rpc/{function}", json=params)
+
+
+class InMemoryRepository(Repository):
+    """
+    Process-local stand-in for PostgREST. Optional latency emulates the
+    network round trip so benchmarks stay meaningful.
+    """
+
+    # Seed data matches database/schema.sql
+    SEED_UNITS = [
+        {"name": "Alpha", "type": "Patrol", "status": "Idle", "lat": -1.2921, "lng": 36.8219},
+        {"name": "Bravo", "type": "Patrol", "status": "Idle", "lat": -1.2500, "lng": 36.8000},
+        {"name": "Charlie", "type": "Rapid Response", "status": "Idle", "lat": -1.3000, "lng": 36.7800},
+    ]
+
+    # Column DEFAULTs from database/schema.sql that code relies on
+    COLUMN_DEFAULTS = {
+        "incidents": {"status": "Active", "report_count": 1},
+        "units": {"type": "Patrol", "status": "Idle", "version": 0},
+        "work_queue": {"claimed_by": None, "claimed_until": None, "attempts": 0},
+    }
+
+    _OPS = {
+        "eq": lambda a, b: a == b,
+        "neq": lambda a, b: a != b,
+        "lt": lambda a, b: a is not None and a < b,
+        "lte": lambda a, b: a is not None and a <= b,
+        "gt": lambda a, b: a is not None and a > b,
+        "gte": lambda a, b: a is not None and a >= b,
+        "in": lambda a, b: a in b,
+        "row_lt": lambda a, b: None not in a and a < tuple(b),
+    }
+
+    def __init__(self, latency: float = 0.0, seed: bool = True):
+        super().__init__()
+        self.latency = latency
+        self.tables: Dict[str, List[Dict]] = {
+            "incidents": [], "units": [], "logs": [], "hotspots": [], "bias_checks": [],
+            "leader_leases": [], "work_queue": [], "work_dead_letter": [],
+        }
+        if seed:
+            for unit in self.SEED_UNITS:
+                self._store("units", dict(unit, current_incident_id=None))
+
+    def _store(self, table: str, row: Dict) -> Dict:
+        now = datetime.now(timezone.utc).isoformat()
+        stored = {"id": str(uuid.uuid4()), "created_at": now, **row}
+        if table in ("incidents", "units", "hotspots"):
+            stored.setdefault("updated_at", now)
+        for column, default in self.COLUMN_DEFAULTS.get(table, {}).items():
+            stored.setdefault(column, default)
+        self.tables[table].append(stored)
+        return stored
+
+    @staticmethod
+    def _apply(row: Dict, changes: Dict, now: str):
+        """row.update(changes) plus what the schema's update triggers do."""
+        version = row.get("version")
+        row.update(changes)
+        if "updated_at" in row:
+            row["updated_at"] = now
+        if version is not None:
+            row["version"] = version + 1
+
+    @staticmethod
+    def _value(row: Dict, column):
+        if isinstance(column, tuple):
+            return tuple(row.get(c) for c in column)
+        value = row.get(column)
+        # Supabase hands DECIMAL columns back as strings; compare them as numbers
+        if column in ("lat", "lng") and isinstance(value, str):
+            return float(value)
+        return value
+
+    def _matches(self, row: Dict, filters: Sequence[Filter]) -> bool:
+        return all(self._OPS[op](self._value(row, column), value) for column, op, value in filters)
+
+    async def _round_trip(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def _select(self, table, filters=(), order=None, desc=False, limit=None, columns="*"):
+        await self._round_trip()
+        rows = [row for row in self.tables[table] if self._matches(row, filters)]
+        if order:
+            order_columns = order.split(",")
+            rows.sort(key=lambda row: [(row.get(c) is None, row.get(c)) for c in order_columns], reverse=desc)
+        if limit is not None:
+            rows = rows[:limit]
+        if columns != "*" and "(" not in columns:
+            wanted = [c.strip() for c in columns.split(",")]
+            return [{c: row.get(c) for c in wanted} for row in rows]
+        return [dict(row) for row in rows]
+
+    async def _insert(self, table, rows):
+        await self._round_trip()
+        return [dict(self._store(table, dict(row))) for row in rows]
+
+    async def _update(self, table, filters, changes):
+        await self._round_trip()
+        updated = []
+        now = datetime.now(timezone.utc).isoformat()
+        for row in self.tables[table]:
+            if self._matches(row, filters):
+                self._apply(row, changes, now)
+                updated.append(dict(row))
+        return updated
+
+    async def _upsert(self, table, rows):
+        await self._round_trip()
+        existing = {row["id"]: row for row in self.tables[table]}
+        now = datetime.now(timezone.utc).isoformat()
+        upserted = []
+        for changes in rows:
+            row = existing.get(changes.get("id"))
+            if row is None:
+                upserted.append(dict(self._store(table, dict(changes))))
+                continue
+            self._apply(row, changes, now)
+            upserted.append(dict(row))
+        return upserted
+
+    async def _rpc(self, function, params):
+        await self._round_trip()
+        # Runs without awaiting, so it is as atomic here as the function's transaction is in Postgres
+        return getattr(self, f"_rpc_{function}")(**params)
+
+    def _rpc_claim_unit(self, p_unit_id: str, p_incident_id: str, p_expected_version: Optional[int] = None):
+        unit = next((row for row in self.tables["units"] if row["id"] == p_unit_id), None)
+        incident = next((row for row in self.tables["incidents"] if row["id"] == p_incident_id), None)
+        claimed = (incident is not None and incident.get("status") == "Active"
+                   and unit is not None and unit.get("status") == "Idle"
+                   and (p_expected_version is None or unit.get("version") == p_expected_version))
+        if claimed:
+            now = datetime.now(timezone.utc).isoformat()
+            self._apply(unit, {"status": "Responding", "current_incident_id": p_incident_id}, now)
+            self._apply(incident, {"status": "Dispatched", "assigned_unit_id": p_unit_id}, now)
+        return {"claimed": claimed, "unit": dict(unit) if unit else None,
+                "incident": dict(incident) if incident else None}
+
+    def _rpc_acquire_lease(self, p_name: str, p_holder: str, p_ttl_seconds: float):
+        now = datetime.now(timezone.utc)
+        lease = next((row for row in self.tables["leader_leases"] if row["name"] == p_name), None)
+        if lease is None:
+            lease = {"name": p_name}
+            self.tables["leader_leases"].append(lease)
+        elif lease["holder"] != p_holder and datetime.fromisoformat(lease["expires_at"]) >= now:
+            return dict(lease)
+        lease.update(holder=p_holder, expires_at=(now + timedelta(seconds=p_ttl_seconds)).isoformat())
+        return dict(lease)
+
+    def _rpc_release_lease(self, p_name: str, p_holder: str):
+        for lease in self.tables["leader_leases"]:
+            if lease["name"] == p_name and lease["holder"] == p_holder:
+                lease["expires_at"] = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+        return []
+
+    def _rpc_claim_work(self, p_worker: str, p_limit: int, p_lease_seconds: float, p_max_attempts: int = 5):
+        now = datetime.now(timezone.utc)
+        until = (now + timedelta(seconds=p_lease_seconds)).isoformat()
+        claimed = []
+        for item in self.tables["work_queue"]:
+            if len(claimed) >= p_limit:
+                break
+            if item["attempts"] >= p_max_attempts:
+                continue
+            if item["claimed_until"] is None or datetime.fromisoformat(item["claimed_until"]) < now:
+                item.update(claimed_by=p_worker, claimed_until=until, attempts=item["attempts"] + 1)
+                claimed.append(dict(item))
+        return claimed
+
+    def _rpc_complete_work(self, p_worker: str, p_ids: List[Any]):
+        ids = set(p_ids)
+        queue = self.tables["work_queue"]
+        kept = [item for item in queue if item["id"] not in ids or item["claimed_by"] != p_worker]
+        done = len(queue) - len(kept)
+        queue[:] = kept
+        return done
+
+    def _rpc_renew_work(self, p_worker: str, p_ids: List[Any], p_lease_seconds: float):
+        ids = set(p_ids)
+        until = (datetime.now(timezone.utc) + timedelta(seconds=p_lease_seconds)).isoformat()
+        renewed = 0
+        for item in self.tables["work_queue"]:
+            if item["id"] in ids and item["claimed_by"] == p_worker:
+                item["claimed_until"] = until
+                renewed += 1
+        return renewed
+
+    def _rpc_dead_letter_work(self, p_worker: str, p_ids: List[Any], p_error: str, p_max_attempts: int = 5):
+        ids = set(p_ids)
+        now = datetime.now(timezone.utc)
+        queue, kept = self.tables["work_queue"], []
+        for item in queue:
+            if item["id"] in ids and item["claimed_by"] == p_worker:
+                error = p_error
+            elif item["attempts"] >= p_max_attempts and item["claimed_until"] is not None \
+                    and datetime.fromisoformat(item["claimed_until"]) < now:
+                error = "lease expired on the last attempt"
+            else:
+                kept.append(item)
+                continue
+            self.tables["work_dead_letter"].append({
+                "id": item["id"], "kind": item["kind"], "payload": item["payload"], "attempts": item["attempts"],
+                "last_worker": item["claimed_by"], "error": error, "created_at": item.get("created_at"),
+                "dead_at": now.isoformat(),
+            })
+        moved = len(queue) - len(kept)
+        queue[:] = kept
+        return moved
+
+    async def list_bias_checks(self, limit: int = 50) -> List[BiasCheckRow]:
+        checks = await self._select("bias_checks", order="created_at", desc=True, limit=limit)
+        incidents = {row["id"]: row for row in self.tables["incidents"]}
+        for check in checks:
+            incident = incidents.get(check["incident_id"])
+            check["incidents"] = {
+                key: incident.get(key) for key in ("type", "location", "severity", "created_at")
+            } if incident else None
+        return checks
+
+
+def create_repository() -> Repository:
+    """
+    Build the configured backend: Supabase, or in-memory when DATABASE_BACKEND=memory.
+    Missing Supabase credentials are an error rather than a silent switch to
+    memory, which would accept writes and lose them on restart.
+    """
+    if os.environ.get("DATABASE_BACKEND", "supabase").lower() == "memory":
+        latency_ms = float(os.environ.get("MEMORY_DB_LATENCY_MS", "0"))
+        return InMemoryRepository(latency=latency_ms / 1000)
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_KEY")
+    if not url or not key:
+        raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set (or DATABASE_BACKEND=memory for a local stand-in)")
+    return SupabaseRepository(url, key)
+
+
+_repository: Optional[Repository] = None
+
+
+def get_repository() -> Repository:
+    """Process-wide repository shared by the API, pipeline and monitors."""
+    global _repository
+    if _repository is None:
+        _repository = create_repository()
+    return _repository
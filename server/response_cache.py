@@ -0,0 +1,142 @@
+"""
+Response Cache for Community Shield
+Read-through cache for the dashboard GET endpoints. Entries hold the
+pre-serialized JSON body and its ETag, and are dropped when the server
+writes to a table they were built from (via repository change listeners),
+so a repeat read is one dict lookup and an unchanged poll is a 304.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from fastapi import Request, Response
+
+from leader import DEPLOYMENT_MODE
+
+# Backstop for writers outside this process (e.g. incident_simulator.py against the
+# same Supabase project). 0 disables it: entries live until a local write invalidates them.
+RESPONSE_CACHE_MAX_AGE = float(os.environ.get("RESPONSE_CACHE_MAX_AGE", "0"))
+# In cluster mode most writes come from other workers, which never invalidate this one's entries
+RESPONSE_CACHE_CLUSTER_MAX_AGE = float(os.environ.get("RESPONSE_CACHE_CLUSTER_MAX_AGE", "5"))
+if DEPLOYMENT_MODE == "cluster" and RESPONSE_CACHE_MAX_AGE <= 0:
+    RESPONSE_CACHE_MAX_AGE = RESPONSE_CACHE_CLUSTER_MAX_AGE
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    tables: Tuple[str, ...]
+    created: float
+
+
+class ResponseCache:
+    """
+    Keys are (endpoint, params). Each table has a generation counter bumped
+    on every write; a body built while one of its tables changed is served
+    but not stored, so an invalidation can never be overwritten by a stale build.
+    Concurrent misses for the same key share one build.
+    """
+
+    def __init__(self, max_age: float = RESPONSE_CACHE_MAX_AGE):
+        self.max_age = max_age
+        self._entries: Dict[Tuple, CachedResponse] = {}
+        self._by_table: Dict[str, set] = {}
+        self._generations: Dict[str, int] = {}
+        self._building: Dict[Tuple, asyncio.Future] = {}
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def on_change(self, table: str, op: str, rows: List[Dict]):
+        """Repository change listener."""
+        self.invalidate(table)
+
+    def invalidate(self, table: str):
+        self._generations[table] = self._generations.get(table, 0) + 1
+        keys = self._by_table.pop(table, ())
+        for key in keys:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        for table in list(self._by_table):
+            self.invalidate(table)
+
+    def _get(self, key: Tuple) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is not None and self.max_age and time.monotonic() - entry.created > self.max_age:
+            self._entries.pop(key, None)
+            return None
+        return entry
+
+    async def get_or_build(self, key: Tuple, tables: Iterable[str],
+                           build: Callable[[], Awaitable[Any]]) -> CachedResponse:
+        entry = self._get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        pending = self._building.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        tables = tuple(tables)
+        future = asyncio.get_running_loop().create_future()
+        self._building[key] = future
+        try:
+            generations = [self._generations.get(table, 0) for table in tables]
+            body = json.dumps(await build(), separators=(",", ":"), default=str).encode("utf-8")
+            entry = CachedResponse(body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+                                   tables, time.monotonic())
+            if generations == [self._generations.get(table, 0) for table in tables]:
+                self._entries[key] = entry
+                for table in tables:
+                    self._by_table.setdefault(table, set()).add(key)
+            future.set_result(entry)
+            return entry
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when no one else was waiting
+            raise
+        finally:
+            del self._building[key]
+
+    async def respond(self, request: Request, key: Tuple, tables: Iterable[str],
+                      build: Callable[[], Awaitable[Any]]) -> Response:
+        """JSON response for key, or 304 when the client's If-None-Match is still current."""
+        entry = await self.get_or_build(key, tables, build)
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        if entry.etag in request.headers.get("if-none-match", ""):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide cache for the dashboard GET endpoints."""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
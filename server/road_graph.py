@@ -0,0 +1,525 @@
+"""
+Road Network Routing for Community Shield
+A directed road graph held in CSR arrays (edge offsets per node, edge
+targets, travel seconds, metres) with ALT landmark distances precomputed
+when the graph is built. A route query is an A* search guided by the
+landmark lower bounds, so it expands a corridor between the two points
+instead of the whole city; ranking candidate units for an incident is one
+backward Dijkstra from the incident that stops once the fastest k units
+are settled.
+
+Build the graph once, from an OSM extract or a synthetic street grid for
+local runs, and point ROAD_GRAPH_PATH at the result:
+    python road_graph.py build nairobi.osm .cache/nairobi_roads.npz
+    python road_graph.py synthetic .cache/nairobi_roads.npz
+"""
+import argparse
+import heapq
+import math
+import os
+import random
+import threading
+import time
+import xml.etree.ElementTree as ET
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from gazetteer import NAIROBI_BOUNDS
+from spatial_index import KM_PER_DEG_LAT, haversine_km
+
+ROAD_GRAPH_PATH = os.environ.get("ROAD_GRAPH_PATH", "")  # Empty: no graph, dispatch ranks by straight-line distance
+ROAD_LANDMARKS = int(os.environ.get("ROAD_LANDMARKS", "12"))
+ROUTE_ACTIVE_LANDMARKS = 4  # Landmarks giving the best bound for a query's endpoints
+OFF_ROAD_SPEED_KMH = float(os.environ.get("OFF_ROAD_SPEED_KMH", "15"))  # From a point to its nearest road node
+GRAPH_FORMAT = "community-shield-roads/1"
+SNAP_CELL_KM = 0.25
+
+# Free-flow speeds by OSM highway class, for ways without a usable maxspeed tag
+HIGHWAY_SPEEDS_KMH = {
+    "motorway": 80, "trunk": 70, "primary": 50, "secondary": 40, "tertiary": 35,
+    "motorway_link": 50, "trunk_link": 40, "primary_link": 35, "secondary_link": 30, "tertiary_link": 30,
+    "unclassified": 25, "residential": 20, "living_street": 10, "service": 15, "road": 25,
+}
+
+
+class Route(NamedTuple):
+    seconds: float
+    meters: float
+    polyline: List[List[float]]  # [[lat, lng], ...] from origin to destination
+
+
+def _parse_maxspeed(value: Optional[str]) -> Optional[float]:
+    """'50', '50 km/h' or '30 mph' in km/h; None for 'signals', 'walk' and the like."""
+    if not value:
+        return None
+    number, _, unit = value.strip().partition(" ")
+    try:
+        speed = float(number)
+    except ValueError:
+        return None
+    return speed * 1.609344 if unit.strip() == "mph" else speed
+
+
+def simplify(polyline: List[List[float]], tolerance_m: float) -> List[List[float]]:
+    """Ramer-Douglas-Peucker: drop points closer than tolerance_m to the line through their neighbours."""
+    if tolerance_m <= 0 or len(polyline) < 3:
+        return polyline
+    points = np.asarray(polyline, dtype=float)
+    scale = np.array([1.0, math.cos(math.radians(points[0, 0]))]) * KM_PER_DEG_LAT * 1000
+    xy = points * scale
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = xy[first], xy[last]
+        segment = end - start
+        length = np.hypot(*segment)
+        inner = xy[first + 1:last] - start
+        if length == 0:
+            offsets = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            offsets = np.abs(inner[:, 0] * segment[1] - inner[:, 1] * segment[0]) / length
+        farthest = int(np.argmax(offsets))
+        if offsets[farthest] > tolerance_m:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack += [(first, split), (split, last)]
+    return points[keep].tolist()
+
+
+class RoadGraph:
+    """
+    Node i is at (lat[i], lng[i]); its outgoing edges are
+    offsets[i]:offsets[i + 1] in targets / seconds / meters. A reverse CSR
+    built on load serves backward searches. Searches index memoryviews of
+    the arrays, which hand back plain Python numbers without per-element
+    NumPy overhead.
+    """
+
+    def __init__(self, lat, lng, offsets, targets, seconds, meters, landmarks=None,
+                 from_landmark=None, to_landmark=None):
+        self.lat = np.ascontiguousarray(lat, dtype=np.float64)
+        self.lng = np.ascontiguousarray(lng, dtype=np.float64)
+        self.offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+        self.targets = np.ascontiguousarray(targets, dtype=np.int32)
+        self.seconds = np.ascontiguousarray(seconds, dtype=np.float64)
+        self.meters = np.ascontiguousarray(meters, dtype=np.float32)
+        self.n = len(self.lat)
+
+        # Reverse CSR: edges grouped by target node
+        sources = np.repeat(np.arange(self.n, dtype=np.int32), np.diff(self.offsets))
+        order = np.argsort(self.targets, kind="stable")
+        self.reverse_offsets = np.concatenate([[0], np.cumsum(np.bincount(self.targets, minlength=self.n))])
+        self.reverse_targets = np.ascontiguousarray(sources[order])
+        self.reverse_seconds = np.ascontiguousarray(self.seconds[order])
+        self._forward = (memoryview(self.offsets), memoryview(self.targets), memoryview(self.seconds))
+        self._backward = (memoryview(self.reverse_offsets), memoryview(self.reverse_targets),
+                          memoryview(self.reverse_seconds))
+
+        # ALT tables: from_landmark[l, v] = d(landmark l, v), to_landmark[l, v] = d(v, landmark l)
+        self.landmarks = np.asarray(landmarks if landmarks is not None else [], dtype=np.int32)
+        self.from_landmark = np.asarray(from_landmark if from_landmark is not None else np.zeros((0, self.n)),
+                                        dtype=np.float32)
+        self.to_landmark = np.asarray(to_landmark if to_landmark is not None else np.zeros((0, self.n)),
+                                      dtype=np.float32)
+
+        self._build_snap_grid()
+
+        # Counters
+        self.routes = 0
+        self.rankings = 0
+        self.settled = 0
+
+    # --- building -------------------------------------------------------
+    @classmethod
+    def from_edges(cls, lat, lng, sources, targets, seconds, meters, main_component: bool = True) -> "RoadGraph":
+        """CSR graph from parallel edge arrays, keeping only the largest strongly connected component."""
+        lat, lng = np.asarray(lat, dtype=float), np.asarray(lng, dtype=float)
+        sources, targets = np.asarray(sources, dtype=np.int64), np.asarray(targets, dtype=np.int64)
+        seconds, meters = np.asarray(seconds, dtype=float), np.asarray(meters, dtype=float)
+        order = np.argsort(sources, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=len(lat)))])
+        graph = cls(lat, lng, offsets, targets[order], seconds[order], meters[order])
+        if not main_component:
+            return graph
+
+        # Every node must reach and be reachable from every other, or landmark bounds turn infinite
+        keep = graph._main_component()
+        if keep.all():
+            return graph
+        relabel = np.full(len(lat), -1, dtype=np.int64)
+        relabel[keep] = np.arange(int(keep.sum()))
+        edges = keep[sources] & keep[targets]
+        return cls.from_edges(lat[keep], lng[keep], relabel[sources[edges]], relabel[targets[edges]],
+                              seconds[edges], meters[edges], main_component=False)
+
+    @classmethod
+    def from_osm(cls, path: str) -> "RoadGraph":
+        """Drivable ways from an OSM XML extract, one graph node per way node."""
+        coordinates: Dict[int, Tuple[float, float]] = {}
+        ways = []
+        for _, element in ET.iterparse(path, events=("end",)):
+            if element.tag == "node":
+                coordinates[int(element.get("id"))] = (float(element.get("lat")), float(element.get("lon")))
+                element.clear()
+            elif element.tag == "way":
+                tags = {tag.get("k"): tag.get("v") for tag in element.iter("tag")}
+                highway = tags.get("highway")
+                if highway in HIGHWAY_SPEEDS_KMH and tags.get("access") not in ("private", "no"):
+                    speed = _parse_maxspeed(tags.get("maxspeed")) or HIGHWAY_SPEEDS_KMH[highway]
+                    oneway = tags.get("oneway", "yes" if highway == "motorway"
+                                      or tags.get("junction") == "roundabout" else "no")
+                    ways.append(([int(nd.get("ref")) for nd in element.iter("nd")], speed, oneway))
+                element.clear()
+
+        index: Dict[int, int] = {}
+        lat, lng, sources, targets, seconds, meters = [], [], [], [], [], []
+
+        def node(ref: int) -> int:
+            if ref not in index:
+                index[ref] = len(lat)
+                lat.append(coordinates[ref][0])
+                lng.append(coordinates[ref][1])
+            return index[ref]
+
+        for refs, speed, oneway in ways:
+            refs = [ref for ref in refs if ref in coordinates]
+            for a, b in zip(refs, refs[1:]):
+                u, v = node(a), node(b)
+                length = haversine_km(lat[u], lng[u], lat[v], lng[v]) * 1000
+                travel = length / (speed / 3.6)
+                if oneway != "-1":
+                    sources.append(u), targets.append(v), seconds.append(travel), meters.append(length)
+                if oneway in ("no", "false", "0", "-1"):
+                    sources.append(v), targets.append(u), seconds.append(travel), meters.append(length)
+        return cls.from_edges(lat, lng, sources, targets, seconds, meters)
+
+    def _reachable(self, start: int, reverse: bool) -> np.ndarray:
+        offsets, targets, _ = self._backward if reverse else self._forward
+        seen = bytearray(self.n)
+        seen[start] = 1
+        stack = [start]
+        while stack:
+            v = stack.pop()
+            for e in range(offsets[v], offsets[v + 1]):
+                w = targets[e]
+                if not seen[w]:
+                    seen[w] = 1
+                    stack.append(w)
+        return np.frombuffer(bytes(seen), dtype=bool)
+
+    def _main_component(self, attempts: int = 5) -> np.ndarray:
+        """Strongly connected component around the best of a few sampled nodes; road networks have one giant one."""
+        rng = random.Random(0)
+        best = np.zeros(self.n, dtype=bool)
+        for _ in range(attempts):
+            start = rng.randrange(self.n)
+            if best[start]:
+                continue
+            component = self._reachable(start, False) & self._reachable(start, True)
+            if component.sum() > best.sum():
+                best = component
+            if best.sum() > self.n / 2:
+                break
+        return best
+
+    def precompute_landmarks(self, count: int = ROAD_LANDMARKS, seed: int = 0):
+        """Pick landmarks farthest-first and store shortest times to and from each."""
+        start = random.Random(seed).randrange(self.n)
+        spread = self._dijkstra_all(start, reverse=False)
+        landmarks, forward, backward = [], [], []
+        closest = np.full(self.n, np.inf)
+        for _ in range(min(count, self.n)):
+            landmark = int(np.argmax(spread if not landmarks else closest))
+            landmarks.append(landmark)
+            forward.append(self._dijkstra_all(landmark, reverse=False))
+            backward.append(self._dijkstra_all(landmark, reverse=True))
+            closest = np.minimum(closest, forward[-1] + backward[-1])
+        self.landmarks = np.asarray(landmarks, dtype=np.int32)
+        self.from_landmark = np.asarray(forward, dtype=np.float32)
+        self.to_landmark = np.asarray(backward, dtype=np.float32)
+
+    # --- persistence ----------------------------------------------------
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez_compressed(f, format=np.array(GRAPH_FORMAT), lat=self.lat, lng=self.lng,
+                                offsets=self.offsets, targets=self.targets, seconds=self.seconds.astype(np.float32),
+                                meters=self.meters, landmarks=self.landmarks, from_landmark=self.from_landmark,
+                                to_landmark=self.to_landmark)
+
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        with np.load(path) as data:
+            if str(data["format"]) != GRAPH_FORMAT:
+                raise ValueError(f"{path} is not a {GRAPH_FORMAT} road graph")
+            return cls(data["lat"], data["lng"], data["offsets"], data["targets"], data["seconds"], data["meters"],
+                       data["landmarks"], data["from_landmark"], data["to_landmark"])
+
+    # --- snapping -------------------------------------------------------
+    def _build_snap_grid(self):
+        self._dlat = SNAP_CELL_KM / KM_PER_DEG_LAT
+        self._dlng = self._dlat / max(math.cos(math.radians(float(np.mean(self.lat)) if self.n else 0.0)), 0.01)
+        self._origin = (float(self.lat.min()), float(self.lng.min())) if self.n else (0.0, 0.0)
+        rows = ((self.lat - self._origin[0]) / self._dlat).astype(np.int64)
+        cols = ((self.lng - self._origin[1]) / self._dlng).astype(np.int64)
+        self._rows, self._cols = int(rows.max(initial=0)) + 1, int(cols.max(initial=0)) + 1
+        cells = rows * self._cols + cols
+        self._cell_nodes = np.argsort(cells, kind="stable").astype(np.int32)
+        self._cell_starts = np.searchsorted(cells[self._cell_nodes], np.arange(self._rows * self._cols + 1))
+
+    def snap(self, lat: float, lng: float) -> Tuple[int, float]:
+        """Nearest graph node to a point, as (node, km away)."""
+        row = int((lat - self._origin[0]) / self._dlat)
+        col = int((lng - self._origin[1]) / self._dlng)
+        cos_lat = math.cos(math.radians(lat))
+        ring = 0
+        while True:
+            r0, r1 = max(row - ring, 0), min(row + ring, self._rows - 1)
+            c0, c1 = max(col - ring, 0), min(col + ring, self._cols - 1)
+            whole_grid = r0 == 0 and c0 == 0 and r1 == self._rows - 1 and c1 == self._cols - 1
+            if r0 <= r1 and c0 <= c1:
+                nodes = np.concatenate([self._cell_nodes[self._cell_starts[r * self._cols + c0]:
+                                                         self._cell_starts[r * self._cols + c1 + 1]]
+                                        for r in range(r0, r1 + 1)])
+                if len(nodes):
+                    dist = KM_PER_DEG_LAT * np.hypot(self.lat[nodes] - lat, (self.lng[nodes] - lng) * cos_lat)
+                    best = int(np.argmin(dist))
+                    # Nodes outside the searched square are at least ring cells away
+                    if dist[best] <= ring * SNAP_CELL_KM or whole_grid:
+                        return int(nodes[best]), float(dist[best])
+            if whole_grid:
+                raise ValueError("Road graph has no nodes")
+            ring += 1
+
+    # --- searches -------------------------------------------------------
+    def _dijkstra_all(self, source: int, reverse: bool) -> np.ndarray:
+        offsets, targets, seconds = self._backward if reverse else self._forward
+        dist = [math.inf] * self.n
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, v = heapq.heappop(heap)
+            if d > dist[v]:
+                continue
+            for e in range(offsets[v], offsets[v + 1]):
+                w = targets[e]
+                candidate = d + seconds[e]
+                if candidate < dist[w]:
+                    dist[w] = candidate
+                    heapq.heappush(heap, (candidate, w))
+        return np.array(dist)
+
+    def _heuristic(self, source: int, target: int):
+        """ALT lower bound on d(v, target) from the landmarks that bound d(source, target) best."""
+        if not len(self.landmarks):
+            return lambda v: 0.0
+        bounds = np.maximum(self.from_landmark[:, target] - self.from_landmark[:, source],
+                            self.to_landmark[:, source] - self.to_landmark[:, target])
+        active = np.argsort(-bounds)[:ROUTE_ACTIVE_LANDMARKS]
+        tables = [(memoryview(self.from_landmark[l]), memoryview(self.to_landmark[l]),
+                   float(self.from_landmark[l, target]), float(self.to_landmark[l, target])) for l in active]
+
+        def bound(v: int) -> float:
+            best = 0.0
+            for from_l, to_l, from_target, to_target in tables:
+                best = max(best, from_target - from_l[v], to_l[v] - to_target)
+            return best
+
+        return bound
+
+    def shortest_path(self, source: int, target: int) -> Tuple[float, List[int]]:
+        """A* with ALT bounds: (seconds, node path). Raises ValueError if target is unreachable."""
+        offsets, targets, seconds = self._forward
+        h = self._heuristic(source, target)
+        dist = {source: 0.0}
+        parent = {source: -1}
+        heap = [(h(source), 0.0, source)]
+        settled = 0
+        while heap:
+            _, d, v = heapq.heappop(heap)
+            if d > dist[v]:
+                continue
+            settled += 1
+            if v == target:
+                break
+            for e in range(offsets[v], offsets[v + 1]):
+                w = targets[e]
+                candidate = d + seconds[e]
+                if candidate < dist.get(w, math.inf):
+                    dist[w] = candidate
+                    parent[w] = v
+                    heapq.heappush(heap, (candidate + h(w), candidate, w))
+        self.settled += settled
+        if target not in dist:
+            raise ValueError(f"Node {target} is unreachable from {source}")
+        path = [target]
+        while parent[path[-1]] != -1:
+            path.append(parent[path[-1]])
+        return dist[target], path[::-1]
+
+    def route(self, from_lat: float, from_lng: float, to_lat: float, to_lng: float,
+              tolerance_m: float = 0.0) -> Route:
+        """Fastest drive between two points, including the off-road legs to and from the nearest nodes."""
+        self.routes += 1
+        source, source_km = self.snap(from_lat, from_lng)
+        target, target_km = self.snap(to_lat, to_lng)
+        road_seconds, path = self.shortest_path(source, target)
+        meters = (source_km + target_km) * 1000
+        for u, v in zip(path, path[1:]):
+            edges = range(self.offsets[u], self.offsets[u + 1])
+            meters += float(min(self.meters[e] for e in edges if self.targets[e] == v))
+        polyline = ([[from_lat, from_lng]] + [[float(self.lat[v]), float(self.lng[v])] for v in path]
+                    + [[to_lat, to_lng]])
+        off_road = (source_km + target_km) / OFF_ROAD_SPEED_KMH * 3600
+        return Route(road_seconds + off_road, meters, simplify(polyline, tolerance_m))
+
+    def travel_times(self, to_lat: float, to_lng: float, origins: Sequence[Tuple[float, float]],
+                     k: Optional[int] = None) -> List[Optional[float]]:
+        """
+        Seconds from each origin to the destination, from one backward Dijkstra.
+        With k, the search stops once the k fastest origins are known and the
+        rest come back as None.
+        """
+        self.rankings += 1
+        target, target_km = self.snap(to_lat, to_lng)
+        waiting: Dict[int, List[int]] = {}
+        off_road = []
+        for i, (lat, lng) in enumerate(origins):
+            node, km = self.snap(lat, lng)
+            waiting.setdefault(node, []).append(i)
+            off_road.append((km + target_km) / OFF_ROAD_SPEED_KMH * 3600)
+
+        results: List[Optional[float]] = [None] * len(origins)
+        found: List[float] = []
+        k = len(origins) if k is None else min(k, len(origins))
+        offsets, targets, seconds = self._backward
+        dist = {target: 0.0}
+        heap = [(0.0, target)]
+        settled = 0
+        while heap and waiting:
+            d, v = heapq.heappop(heap)
+            if d > dist[v]:
+                continue
+            # Any origin settled later has at least d seconds of road left, so the k fastest are final
+            if len(found) >= k and d >= found[k - 1]:
+                break
+            settled += 1
+            for i in waiting.pop(v, ()):
+                results[i] = d + off_road[i]
+                found.append(results[i])
+                found.sort()
+            for e in range(offsets[v], offsets[v + 1]):
+                w = targets[e]
+                candidate = d + seconds[e]
+                if candidate < dist.get(w, math.inf):
+                    dist[w] = candidate
+                    heapq.heappush(heap, (candidate, w))
+        self.settled += settled
+        if len(found) > k:
+            cutoff = found[k - 1]
+            results = [value if value is not None and value <= cutoff else None for value in results]
+        return results
+
+    def stats(self) -> Dict:
+        return {
+            "nodes": self.n,
+            "edges": len(self.targets),
+            "landmarks": len(self.landmarks),
+            "routes": self.routes,
+            "rankings": self.rankings,
+            "settled": self.settled,
+        }
+
+
+def synthetic_grid(bounds=NAIROBI_BOUNDS, spacing_km: float = 0.25, arterial_every: int = 8,
+                   closed: float = 0.08, one_way: float = 0.1, seed: int = 0) -> RoadGraph:
+    """
+    A jittered street grid over bounds for running without an OSM extract:
+    arterials every few blocks at 60 km/h, 30 km/h streets in between, with
+    some streets closed or one-way so fastest and straightest routes differ.
+    """
+    rng = np.random.default_rng(seed)
+    min_lat, min_lng, max_lat, max_lng = bounds
+    dlat = spacing_km / KM_PER_DEG_LAT
+    dlng = dlat / math.cos(math.radians((min_lat + max_lat) / 2))
+    rows, cols = int((max_lat - min_lat) / dlat) + 1, int((max_lng - min_lng) / dlng) + 1
+    grid_row, grid_col = np.divmod(np.arange(rows * cols), cols)
+    lat = min_lat + grid_row * dlat + rng.uniform(-0.2, 0.2, rows * cols) * dlat
+    lng = min_lng + grid_col * dlng + rng.uniform(-0.2, 0.2, rows * cols) * dlng
+
+    node = np.arange(rows * cols).reshape(rows, cols)
+    east = (node[:, :-1].ravel(), node[:, 1:].ravel(), grid_row.reshape(rows, cols)[:, :-1].ravel())
+    north = (node[:-1, :].ravel(), node[1:, :].ravel(), grid_col.reshape(rows, cols)[:-1, :].ravel())
+    a = np.concatenate([east[0], north[0]])
+    b = np.concatenate([east[1], north[1]])
+    arterial = np.concatenate([east[2], north[2]]) % arterial_every == 0
+
+    draw = rng.random(len(a))
+    open_street = arterial | (draw >= closed)
+    a, b, arterial, draw = a[open_street], b[open_street], arterial[open_street], draw[open_street]
+    forward_only = ~arterial & (draw < closed + one_way / 2)
+    backward_only = ~arterial & ~forward_only & (draw < closed + one_way)
+
+    meters = np.array([haversine_km(lat[u], lng[u], lat[v], lng[v]) for u, v in zip(a, b)]) * 1000
+    seconds = meters / (np.where(arterial, 60.0, 30.0) / 3.6)
+    sources = np.concatenate([a[~backward_only], b[~forward_only]])
+    targets = np.concatenate([b[~backward_only], a[~forward_only]])
+    return RoadGraph.from_edges(lat, lng, sources, targets,
+                                np.concatenate([seconds[~backward_only], seconds[~forward_only]]),
+                                np.concatenate([meters[~backward_only], meters[~forward_only]]))
+
+
+_road_graph: Optional[RoadGraph] = None
+_road_graph_loaded = False
+_road_graph_lock = threading.Lock()
+
+
+def get_road_graph() -> Optional[RoadGraph]:
+    """Process-wide road graph from ROAD_GRAPH_PATH, or None when routing is not configured."""
+    global _road_graph, _road_graph_loaded
+    with _road_graph_lock:
+        if not _road_graph_loaded:
+            _road_graph_loaded = True
+            if ROAD_GRAPH_PATH:
+                try:
+                    _road_graph = RoadGraph.load(ROAD_GRAPH_PATH)
+                    print(f"🛣️ Road graph loaded: {_road_graph.n} nodes, {len(_road_graph.targets)} edges")
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"⚠️ Road graph unavailable ({e}); dispatch uses straight-line distance")
+    return _road_graph
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Build from an OSM XML extract")
+    build.add_argument("osm")
+    build.add_argument("output")
+    synthetic = commands.add_parser("synthetic", help="Build a synthetic street grid over Nairobi")
+    synthetic.add_argument("output")
+    synthetic.add_argument("--spacing-km", type=float, default=0.25)
+    synthetic.add_argument("--seed", type=int, default=0)
+    for command in (build, synthetic):
+        command.add_argument("--landmarks", type=int, default=ROAD_LANDMARKS)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.command == "build":
+        graph = RoadGraph.from_osm(args.osm)
+    else:
+        graph = synthetic_grid(spacing_km=args.spacing_km, seed=args.seed)
+    print(f"Graph: {graph.n} nodes, {len(graph.targets)} edges ({time.perf_counter() - started:.1f}s)")
+    started = time.perf_counter()
+    graph.precompute_landmarks(args.landmarks)
+    print(f"Landmarks: {len(graph.landmarks)} ({time.perf_counter() - started:.1f}s)")
+    graph.save(args.output)
+    print(f"Saved {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
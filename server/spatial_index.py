@@ -0,0 +1,140 @@
+"""
+Spatial Index for Community Shield
+Uniform great-circle grid over lat/lng for nearest-unit and radius queries.
+Cells are roughly cell_km x cell_km on the ground at every latitude, so a
+query only looks at the handful of cells around the incident.
+"""
+import math
+from typing import Dict, Iterator, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = math.pi * EARTH_RADIUS_KM / 180
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM  # Half the circumference
+
+Cell = Tuple[int, int]
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class UnitIndex:
+    """
+    Grid index of unit positions keyed by unit id.
+    upsert/remove are O(1), so the index is kept current as units change
+    status or move instead of being rebuilt per query.
+    """
+
+    def __init__(self, cell_km: float = 1.0):
+        self.cell_km = cell_km
+        self._dlat = cell_km / KM_PER_DEG_LAT
+        self._cells: Dict[Cell, Dict[str, Tuple[float, float]]] = {}
+        self._positions: Dict[str, Tuple[float, float, Cell]] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, unit_id: str) -> bool:
+        return unit_id in self._positions
+
+    # --- grid geometry ------------------------------------------------
+    def _row(self, lat: float) -> int:
+        return math.floor(lat / self._dlat)
+
+    def _lng_width(self, row: int) -> float:
+        """Cell width in degrees of longitude for a grid row."""
+        center_lat = (row + 0.5) * self._dlat
+        return self._dlat / max(math.cos(math.radians(center_lat)), 0.01)
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        row = self._row(lat)
+        return row, math.floor(lng / self._lng_width(row))
+
+    # --- updates ------------------------------------------------------
+    def upsert(self, unit_id: str, lat: float, lng: float):
+        """Insert a unit or move it to a new position."""
+        lat, lng = float(lat), float(lng)
+        cell = self._cell(lat, lng)
+        previous = self._positions.get(unit_id)
+        if previous is not None and previous[2] != cell:
+            self._discard(unit_id, previous[2])
+        self._cells.setdefault(cell, {})[unit_id] = (lat, lng)
+        self._positions[unit_id] = (lat, lng, cell)
+
+    def remove(self, unit_id: str):
+        previous = self._positions.pop(unit_id, None)
+        if previous is not None:
+            self._discard(unit_id, previous[2])
+
+    def _discard(self, unit_id: str, cell: Cell):
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(unit_id, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def clear(self):
+        self._cells.clear()
+        self._positions.clear()
+
+    def position(self, unit_id: str) -> Optional[Tuple[float, float]]:
+        entry = self._positions.get(unit_id)
+        return (entry[0], entry[1]) if entry else None
+
+    # --- queries ------------------------------------------------------
+    def _candidate_cells(self, lat: float, lng: float, radius_km: float) -> Iterator[Dict[str, Tuple[float, float]]]:
+        dlat = radius_km / KM_PER_DEG_LAT
+        row_min, row_max = self._row(lat - dlat), self._row(lat + dlat)
+        max_abs_lat = min(90.0, max(abs(lat - dlat), abs(lat + dlat)))
+        dlng = radius_km / (KM_PER_DEG_LAT * max(math.cos(math.radians(max_abs_lat)), 0.01))
+
+        spans = {}
+        window = 0
+        for row in range(row_min, row_max + 1):
+            width = self._lng_width(row)
+            col_min, col_max = math.floor((lng - dlng) / width), math.floor((lng + dlng) / width)
+            spans[row] = (col_min, col_max)
+            window += col_max - col_min + 1
+            if window > len(self._cells):
+                break
+
+        if window > len(self._cells):
+            # Search window is larger than the occupied grid; filter occupied cells instead
+            for (row, col), bucket in self._cells.items():
+                if row_min <= row <= row_max:
+                    yield bucket
+            return
+
+        for row, (col_min, col_max) in spans.items():
+            for col in range(col_min, col_max + 1):
+                bucket = self._cells.get((row, col))
+                if bucket:
+                    yield bucket
+
+    def within(self, lat: float, lng: float, radius_km: float) -> List[Tuple[float, str]]:
+        """All units within radius_km, as (distance_km, unit_id) sorted nearest first."""
+        lat, lng = float(lat), float(lng)
+        hits = []
+        for bucket in self._candidate_cells(lat, lng, radius_km):
+            for unit_id, (u_lat, u_lng) in bucket.items():
+                dist = haversine_km(lat, lng, u_lat, u_lng)
+                if dist <= radius_km:
+                    hits.append((dist, unit_id))
+        hits.sort()
+        return hits
+
+    def nearest(self, lat: float, lng: float, k: int = 1) -> List[Tuple[float, str]]:
+        """The k nearest units, as (distance_km, unit_id) sorted nearest first."""
+        if not self._positions or k <= 0:
+            return []
+        radius = self.cell_km
+        while True:
+            hits = self.within(lat, lng, radius)
+            if len(hits) >= k or len(hits) == len(self._positions) or radius >= MAX_DISTANCE_KM:
+                return hits[:k]
+            radius = min(radius * 2, MAX_DISTANCE_KM)
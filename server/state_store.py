@@ -0,0 +1,416 @@
+"""
+Live State Store for Community Shield
+The process's authoritative copy of every unit and every open incident,
+indexed by status. Dispatch picks units here without a database round
+trip; changes are queued per row, coalesced, and written behind to the
+repository in bulk. Claims made in the database (claim_unit) are folded
+back in with apply_written. Writes made directly through the repository (other
+endpoints, simulators) flow back in through its change listener.
+"""
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from repository import MAX_PAGE_SIZE, get_repository
+
+STATE_FLUSH_INTERVAL = float(os.environ.get("STATE_FLUSH_INTERVAL", "0.25"))
+STATE_FLUSH_BATCH = int(os.environ.get("STATE_FLUSH_BATCH", "500"))
+
+OPEN_INCIDENT_STATUSES = ("Active", "Dispatched")
+
+RowKey = Tuple[str, str]  # (table, id)
+
+
+class UnitState:
+    __slots__ = ("id", "name", "type", "status", "lat", "lng", "current_incident_id", "version")
+
+    def __init__(self, row: Dict):
+        self.id = str(row["id"])
+        self.name = row.get("name") or self.id
+        self.type = row.get("type", "Patrol")
+        self.status = row.get("status", "Idle")
+        self.lat = float(row["lat"])
+        self.lng = float(row["lng"])
+        self.current_incident_id = row.get("current_incident_id")
+        self.version = row.get("version")  # Database row version, for claim_unit's compare-and-set
+
+    def row(self) -> Dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class IncidentState:
+    __slots__ = ("id", "type", "severity", "location", "lat", "lng", "status", "assigned_unit_id", "report_count",
+                 "created_at")
+
+    def __init__(self, row: Dict):
+        self.id = str(row["id"])
+        for field in self.__slots__[1:]:
+            setattr(self, field, row.get(field))
+        self.lat = float(self.lat) if self.lat is not None else None
+        self.lng = float(self.lng) if self.lng is not None else None
+
+    def row(self) -> Dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+def _normalize(field: str, value):
+    # Supabase hands DECIMAL columns back as strings
+    if field in ("lat", "lng") and value is not None:
+        return float(value)
+    return value
+
+
+# Watcher: callback(unit, origin) after a unit record changed; origin is whoever made the change
+UnitWatcher = Callable[[UnitState, object], None]
+
+
+class StateStore:
+    """
+    Unit writes are flushed as one bulk upsert of the changed units' full
+    rows; incident writes as one PATCH per incident with its coalesced
+    changes. Fields still waiting to be written win over values arriving
+    from the repository, so the echo of an older write never rolls the
+    in-memory state back.
+    """
+
+    def __init__(self, repo=None, flush_interval: float = STATE_FLUSH_INTERVAL,
+                 flush_batch: int = STATE_FLUSH_BATCH):
+        self.repo = repo or get_repository()
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+
+        self.units: Dict[str, UnitState] = {}
+        self.incidents: Dict[str, IncidentState] = {}  # Open incidents only
+        self._units_by_status: Dict[str, Set[str]] = {}
+        self._incidents_by_status: Dict[str, Set[str]] = {}
+        self._watchers: List[UnitWatcher] = []
+
+        self._pending: "OrderedDict[RowKey, Dict]" = OrderedDict()  # Coalesced changes not yet written
+        self._in_flight: Dict[RowKey, Dict] = {}                     # Values of the write under way
+        self._ready: Optional[asyncio.Event] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.changes = 0
+        self.coalesced = 0
+        self.external = 0
+        self.flushes = 0
+        self.written = 0
+        self.failed_flushes = 0
+
+    # --- indexes --------------------------------------------------------
+    @staticmethod
+    def _index(index: Dict[str, Set[str]], record_id: str, old: Optional[str], new: Optional[str]):
+        if old == new:
+            return
+        if old is not None:
+            bucket = index.get(old)
+            if bucket is not None:
+                bucket.discard(record_id)
+        if new is not None:
+            index.setdefault(new, set()).add(record_id)
+
+    def add_watcher(self, callback: UnitWatcher):
+        self._watchers.append(callback)
+
+    def _notify(self, unit: UnitState, origin):
+        for callback in self._watchers:
+            try:
+                callback(unit, origin)
+            except Exception as e:
+                print(f"State watcher error on unit {unit.id}: {e}")
+
+    # --- reads ----------------------------------------------------------
+    def unit(self, unit_id: str) -> Optional[UnitState]:
+        return self.units.get(unit_id)
+
+    def units_with_status(self, status: str) -> List[UnitState]:
+        return [self.units[unit_id] for unit_id in self._units_by_status.get(status, ())]
+
+    def unit_rows(self) -> List[Dict]:
+        return [unit.row() for unit in self.units.values()]
+
+    def incident(self, incident_id: str) -> Optional[IncidentState]:
+        return self.incidents.get(incident_id)
+
+    def incidents_with_status(self, status: str) -> List[IncidentState]:
+        return [self.incidents[incident_id] for incident_id in self._incidents_by_status.get(status, ())]
+
+    # --- loading --------------------------------------------------------
+    def _add_unit(self, row: Dict, origin=None) -> UnitState:
+        unit = UnitState(row)
+        self.units[unit.id] = unit
+        self._index(self._units_by_status, unit.id, None, unit.status)
+        self._notify(unit, origin)
+        return unit
+
+    def _add_incident(self, row: Dict):
+        if row.get("status") not in OPEN_INCIDENT_STATUSES or row.get("id") is None:
+            return
+        incident = IncidentState(row)
+        self.incidents[incident.id] = incident
+        self._index(self._incidents_by_status, incident.id, None, incident.status)
+
+    async def warm(self):
+        """Reconcile with the database: load every unit and every open incident."""
+        units = await self.repo.list_units()
+        incidents, before = [], None
+        while True:
+            page = await self.repo.list_incidents(limit=MAX_PAGE_SIZE, before=before,
+                                                  status=list(OPEN_INCIDENT_STATUSES))
+            incidents += page
+            if len(page) < MAX_PAGE_SIZE:
+                break
+            before = (page[-1]["created_at"], page[-1]["id"])
+
+        for row in units:
+            if str(row["id"]) not in self.units:
+                self._add_unit(row, origin="warm")
+        for row in incidents:
+            if str(row["id"]) not in self.incidents:
+                self._add_incident(row)
+        self._ensure_ready().set()
+        print(f"🗂️ State store loaded {len(self.units)} units and {len(self.incidents)} open incidents")
+
+    def _ensure_ready(self) -> asyncio.Event:
+        if self._ready is None:
+            self._ready = asyncio.Event()
+        return self._ready
+
+    async def ready(self):
+        """Wait for the startup reconcile (immediate once it has run)."""
+        await self._ensure_ready().wait()
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready is not None and self._ready.is_set()
+
+    # --- writes ---------------------------------------------------------
+    def _queue(self, key: RowKey, changes: Dict):
+        self.changes += 1
+        pending = self._pending.get(key)
+        if pending is None:
+            self._pending[key] = dict(changes)
+        else:
+            self.coalesced += 1
+            pending.update(changes)
+        if len(self._pending) >= self.flush_batch and self._wakeup is not None:
+            self._wakeup.set()
+
+    def update_unit(self, unit_id: str, changes: Dict, origin=None) -> Optional[UnitState]:
+        """Apply changes to a unit now and queue them for the database. None for an unknown unit."""
+        unit = self.units.get(unit_id)
+        if unit is None:
+            return None
+        changes = {field: _normalize(field, value) for field, value in changes.items()
+                   if field in UnitState.__slots__ and field != "id"}
+        if "status" in changes:
+            self._index(self._units_by_status, unit_id, unit.status, changes["status"])
+        for field, value in changes.items():
+            setattr(unit, field, value)
+        self._queue(("units", unit_id), changes)
+        self._notify(unit, origin)
+        return unit
+
+    def update_units(self, rows: Iterable[Dict], origin=None):
+        """update_unit for many rows, each carrying its id."""
+        for row in rows:
+            self.update_unit(str(row["id"]), row, origin)
+
+    def update_incident(self, incident_id: str, changes: Dict) -> Optional[IncidentState]:
+        """
+        Apply changes to an open incident and queue them for the database.
+        Incidents that close leave the store once changed; changes to
+        incidents the store does not hold are still written.
+        """
+        incident = self.incidents.get(incident_id)
+        if incident is not None:
+            if "status" in changes:
+                self._index(self._incidents_by_status, incident_id, incident.status, changes["status"])
+            for field, value in changes.items():
+                if field in IncidentState.__slots__ and field != "id":
+                    setattr(incident, field, _normalize(field, value))
+            if incident.status not in OPEN_INCIDENT_STATUSES:
+                self._index(self._incidents_by_status, incident_id, incident.status, None)
+                del self.incidents[incident_id]
+        self._queue(("incidents", incident_id), changes)
+        return incident
+
+    def refresh(self, table: str, rows: List[Dict]):
+        """Fold in rows just read from the database, by the same rules as on_change."""
+        self.on_change(table, "UPDATE", rows)
+
+    def apply_written(self, table: str, row: Dict):
+        """
+        Fold in a row the database has already written (e.g. a claim_unit
+        result). Its fields are dropped from any pending write, so neither
+        echo suppression nor the write-behind can undo it.
+        """
+        key = (table, str(row["id"]))
+        pending = self._pending.get(key)
+        if pending is not None:
+            for field in row:
+                pending.pop(field, None)
+            if not pending:
+                del self._pending[key]
+        self.on_change(table, "UPDATE", [row])
+
+    # --- repository listener --------------------------------------------
+    def on_change(self, table: str, op: str, rows: List[Dict]):
+        """
+        Repository change listener. New rows are added; for updates, only
+        fields that differ from both the store and any write of ours still
+        queued or under way are applied, so our own echoes are no-ops.
+        """
+        if table not in ("units", "incidents"):
+            return
+        for row in rows:
+            record_id = row.get("id")
+            if record_id is None:
+                continue
+            record_id = str(record_id)
+            if table == "units":
+                unit = self.units.get(record_id)
+                if unit is None:
+                    if row.get("lat") is not None and row.get("lng") is not None:
+                        self._add_unit(row)
+                    continue
+                changes = self._external_changes(("units", record_id), unit, row)
+                if changes:
+                    self.external += 1
+                    if "status" in changes:
+                        self._index(self._units_by_status, record_id, unit.status, changes["status"])
+                    for field, value in changes.items():
+                        setattr(unit, field, value)
+                    self._notify(unit, None)
+            else:
+                incident = self.incidents.get(record_id)
+                if incident is None:
+                    if op == "INSERT":
+                        self._add_incident(row)
+                    continue
+                changes = self._external_changes(("incidents", record_id), incident, row)
+                if changes:
+                    self.external += 1
+                    if "status" in changes:
+                        self._index(self._incidents_by_status, record_id, incident.status, changes["status"])
+                    for field, value in changes.items():
+                        setattr(incident, field, value)
+                    if incident.status not in OPEN_INCIDENT_STATUSES:
+                        self._index(self._incidents_by_status, record_id, incident.status, None)
+                        del self.incidents[record_id]
+
+    def _external_changes(self, key: RowKey, record, row: Dict) -> Dict:
+        pending = self._pending.get(key, {})
+        in_flight = self._in_flight.get(key, {})
+        changes = {}
+        for field in record.__slots__[1:]:
+            if field not in row or field in pending:
+                continue
+            value = _normalize(field, row[field])
+            if field in in_flight and _normalize(field, in_flight[field]) == value:
+                continue
+            if getattr(record, field) != value:
+                changes[field] = value
+        return changes
+
+    # --- write-behind ---------------------------------------------------
+    async def flush(self) -> bool:
+        """
+        Write up to one batch of pending rows. Returns False if any write
+        failed; failed rows are queued again behind newer changes.
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending:
+                return True
+            batch = [self._pending.popitem(last=False) for _ in range(min(self.flush_batch, len(self._pending)))]
+            unit_rows = [self.units[record_id].row() for (table, record_id), _ in batch
+                         if table == "units" and record_id in self.units]
+            for row in unit_rows:
+                del row["version"]  # Owned by the database's update trigger
+            incident_changes = [(record_id, changes) for (table, record_id), changes in batch if table == "incidents"]
+            self._in_flight = {("units", row["id"]): row for row in unit_rows}
+            self._in_flight.update({("incidents", record_id): changes for record_id, changes in incident_changes})
+
+            failed: List[Tuple[RowKey, Dict]] = []
+            try:
+                if unit_rows:
+                    try:
+                        await self.repo.upsert_units(unit_rows)
+                    except Exception as e:
+                        print(f"Error writing unit state: {e}")
+                        failed += [(key, changes) for key, changes in batch if key[0] == "units"]
+                results = await asyncio.gather(*(self.repo.update_incident(record_id, changes)
+                                                 for record_id, changes in incident_changes),
+                                               return_exceptions=True)
+                for (record_id, changes), result in zip(incident_changes, results):
+                    if isinstance(result, Exception):
+                        print(f"Error writing incident {record_id}: {result}")
+                        failed.append((("incidents", record_id), changes))
+            except asyncio.CancelledError:
+                # Stopped mid-write: the whole batch goes back for stop() to write again
+                for key, changes in batch:
+                    self._pending[key] = {**changes, **self._pending.get(key, {})}
+                raise
+            finally:
+                self._in_flight = {}
+
+            for key, changes in failed:
+                # Anything changed since goes on top of the failed write
+                self._pending[key] = {**changes, **self._pending.get(key, {})}
+            if failed:
+                self.failed_flushes += 1
+                return False
+            self.flushes += 1
+            self.written += len(batch)
+            return True
+
+    async def _run(self):
+        if not self.is_ready:
+            await self.warm()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._pending:
+                if not await self.flush():
+                    break
+
+    def start(self):
+        """Start writing behind; reconciles with the database first if warm() has not run."""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run(), name="state-store")
+
+    async def stop(self):
+        """Stop the flusher and write everything still pending."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        while self._pending:
+            if not await self.flush():
+                break
+
+    def stats(self) -> Dict:
+        return {
+            "units": len(self.units),
+            "units_by_status": {status: len(ids) for status, ids in self._units_by_status.items() if ids},
+            "open_incidents": len(self.incidents),
+            "pending": len(self._pending),
+            "changes": self.changes,
+            "coalesced": self.coalesced,
+            "external": self.external,
+            "flushes": self.flushes,
+            "written": self.written,
+            "failed_flushes": self.failed_flushes,
+        }
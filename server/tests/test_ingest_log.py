@@ -0,0 +1,120 @@
+"""
+Ingest log tests in a temporary directory: recovery from a torn segment
+tail and redelivery of records left unfinished by the previous run.
+"""
+import asyncio
+import os
+import time
+
+from ingest_log import HEADER, SEGMENT_SUFFIX, IngestLog
+
+
+def _log(path) -> IngestLog:
+    return IngestLog(str(path), fsync_interval=0, commit_interval=0.01, retry_base=0.01, retry_max=0.01)
+
+
+async def _until(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+
+def _segments(path):
+    return sorted(name for name in os.listdir(path) if name.endswith(SEGMENT_SUFFIX))
+
+
+def test_torn_tail_is_truncated_and_intact_records_survive(tmp_path):
+    log = _log(tmp_path)
+    log.open()
+    for n in range(3):
+        log.append("report", {"n": n})
+    log.close()
+
+    segment = os.path.join(tmp_path, _segments(tmp_path)[-1])
+    intact = os.path.getsize(segment)
+    with open(segment, "ab") as f:
+        f.write(HEADER.pack(100, 0) + b'{"kind": "rep')  # A write cut short by a crash
+
+    received = []
+
+    async def handler(payload):
+        received.append(payload["n"])
+
+    async def scenario():
+        reopened = _log(tmp_path)
+        reopened.handle("report", handler)
+        reopened.start()
+        assert reopened.truncated_bytes == HEADER.size + len(b'{"kind": "rep')
+        assert os.path.getsize(segment) == intact
+        assert reopened.next_offset == 3
+        assert reopened.append("report", {"n": 3}) == 3
+        await _until(lambda: reopened.acked == 4)
+        await reopened.stop()
+        return reopened
+
+    reopened = asyncio.run(scenario())
+    assert received == [0, 1, 2, 3]
+    assert reopened.committed_offset() == 4
+
+
+def test_unfinished_records_are_redelivered_after_restart(tmp_path):
+    stuck = {1}
+    received = []
+
+    async def handler(payload):
+        if payload["n"] in stuck:
+            await asyncio.Event().wait()  # Still in flight when the process stops
+        received.append(payload["n"])
+
+    async def first_run():
+        log = _log(tmp_path)
+        log.handle("report", handler)
+        log.start()
+        for n in range(3):
+            await log.put("report", {"n": n})
+        await _until(lambda: log.acked == 2)
+        await log.stop()
+
+    asyncio.run(first_run())
+    assert received == [0, 2]
+
+    stuck.clear()
+    received.clear()
+
+    async def second_run():
+        log = _log(tmp_path)
+        log.handle("report", handler)
+        log.start()
+        assert log.recovered == 1
+        await _until(lambda: log.acked == 1)
+        await log.put("report", {"n": 3})
+        await _until(lambda: log.acked == 2)
+        await log.stop()
+        return log
+
+    log = asyncio.run(second_run())
+    # Only the record that never finished comes back; the ones acked before the restart do not
+    assert received == [1, 3]
+    assert log.committed_offset() == log.next_offset == 4
+
+
+def test_failed_record_is_retried_then_dead_lettered(tmp_path):
+    async def handler(payload):
+        raise RuntimeError("analysis failed")
+
+    async def scenario():
+        log = IngestLog(str(tmp_path), fsync_interval=0, commit_interval=0.01, max_attempts=2,
+                        retry_base=0.01, retry_max=0.01)
+        log.handle("report", handler)
+        log.start()
+        await log.put("report", {"n": 0})
+        await _until(lambda: log.dead_lettered == 1)
+        await log.stop()
+        return log
+
+    log = asyncio.run(scenario())
+    assert (log.failed, log.retried) == (2, 1)
+    assert log.committed_offset() == 1
+    with open(os.path.join(tmp_path, "dead_letter.jsonl")) as f:
+        assert '"error": "analysis failed"' in f.read()
@@ -0,0 +1,112 @@
+"""
+State store tests against the in-memory repository: echo suppression of
+our own writes and folding in rows the database already wrote.
+"""
+import asyncio
+
+from repository import InMemoryRepository
+from state_store import StateStore
+
+
+async def _store():
+    repo = InMemoryRepository()
+    store = StateStore(repo)
+    repo.add_listener(store.on_change)
+    await store.warm()
+    return repo, store
+
+
+def _unit_row(repo, unit_id):
+    return next(row for row in repo.tables["units"] if row["id"] == unit_id)
+
+
+def test_own_write_echo_is_not_an_external_change():
+    async def scenario():
+        repo, store = await _store()
+        unit = store.units_with_status("Idle")[0]
+        store.update_unit(unit.id, {"status": "Patrolling", "lat": "-1.2"})
+        assert await store.flush()
+
+        # The echo only brings in the version the update trigger bumped
+        assert store.unit(unit.id).version == _unit_row(repo, unit.id)["version"] == 1
+        assert store.unit(unit.id).status == "Patrolling"
+        assert store.unit(unit.id).lat == -1.2
+        assert _unit_row(repo, unit.id)["status"] == "Patrolling"
+        assert store.stats()["pending"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_stale_echo_does_not_roll_back_a_pending_write():
+    async def scenario():
+        repo, store = await _store()
+        unit = store.units_with_status("Idle")[0]
+        store.update_unit(unit.id, {"status": "Returning"})
+
+        # Another writer's older value arrives while ours is still queued
+        await repo.update_unit(unit.id, {"status": "Idle", "lat": -1.25})
+        assert store.unit(unit.id).status == "Returning"
+        assert store.unit(unit.id).lat == -1.25  # Fields we are not writing still come through
+        assert unit.id not in {u.id for u in store.units_with_status("Idle")}
+
+        assert await store.flush()
+        assert _unit_row(repo, unit.id)["status"] == "Returning"
+
+    asyncio.run(scenario())
+
+
+def test_external_change_is_applied_and_reindexed():
+    async def scenario():
+        repo, store = await _store()
+        unit = store.units_with_status("Idle")[0]
+        await repo.update_unit(unit.id, {"status": "Offline"})
+
+        assert store.external == 1
+        assert store.unit(unit.id).status == "Offline"
+        assert [u.id for u in store.units_with_status("Offline")] == [unit.id]
+
+    asyncio.run(scenario())
+
+
+def test_apply_written_wins_over_a_queued_write():
+    async def scenario():
+        repo, store = await _store()
+        incident = await repo.insert_incident({"type": "Fire", "severity": "High", "location": "CBD",
+                                               "lat": -1.28, "lng": 36.82})
+        assert store.incident(incident["id"]).status == "Active"
+        unit = store.units_with_status("Idle")[0]
+        store.update_unit(unit.id, {"status": "Idle", "lat": -1.3, "current_incident_id": None})
+
+        result = await repo.claim_unit(unit.id, incident["id"], unit.version)
+        assert result["claimed"]
+        # The listener leaves the queued status alone; apply_written takes the claim
+        assert store.unit(unit.id).status == "Idle"
+        store.apply_written("units", result["unit"])
+        store.apply_written("incidents", result["incident"])
+
+        assert store.unit(unit.id).status == "Responding"
+        assert store.unit(unit.id).current_incident_id == incident["id"]
+        assert store.unit(unit.id).version == result["unit"]["version"]
+        assert store.incident(incident["id"]).status == "Dispatched"
+        # Every field the claim returned replaces the queued one, so nothing is left to write back
+        assert store.stats()["pending"] == 0
+
+        assert await store.flush()
+        row = _unit_row(repo, unit.id)
+        assert row["status"] == "Responding"
+        assert row["current_incident_id"] == incident["id"]
+
+    asyncio.run(scenario())
+
+
+def test_apply_written_closing_incident_leaves_the_store():
+    async def scenario():
+        repo, store = await _store()
+        incident = await repo.insert_incident({"type": "Theft", "severity": "Low", "location": "Westlands",
+                                               "lat": -1.26, "lng": 36.80})
+        store.apply_written("incidents", dict(incident, status="Resolved"))
+
+        assert store.incident(incident["id"]) is None
+        assert store.incidents_with_status("Active") == []
+
+    asyncio.run(scenario())
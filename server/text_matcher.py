@@ -0,0 +1,120 @@
+"""
+Multi-pattern Text Matcher for Community Shield
+Aho-Corasick automaton that finds every registered phrase in one pass over
+the text, with optional word-boundary checks ("gang" does not match "Gangway").
+"""
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class Match(NamedTuple):
+    start: int
+    end: int
+    pattern: str
+    payload: Any
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class KeywordAutomaton:
+    """
+    Case-insensitive phrase matcher. Patterns are added with a payload and
+    compiled once with build(); matching is O(len(text) + matches) no matter
+    how many patterns are registered.
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]] = (), word_boundary: bool = True):
+        self.word_boundary = word_boundary
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        self._delta: List[Dict[str, int]] = [{}]
+        self._patterns: List[Tuple[str, Any]] = []
+        self._built = False
+        for pattern, payload in patterns:
+            self.add(pattern, payload)
+        if self._patterns:
+            self.build()
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def add(self, pattern: str, payload: Any = None):
+        pattern = pattern.lower().strip()
+        if not pattern:
+            return
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[state][ch] = next_state
+            state = next_state
+        self._out[state].append(len(self._patterns))
+        self._patterns.append((pattern, payload))
+        self._built = False
+
+    def build(self):
+        """Compute failure links breadth-first and merge output sets."""
+        queue = []
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+        # Fold failure links into a full transition table so matching is one dict lookup per character
+        self._delta = [dict() for _ in self._goto]
+        self._delta[0] = dict(self._goto[0])
+        for state in queue:
+            self._delta[state] = {**self._delta[self._fail[state]], **self._goto[state]}
+        self._built = True
+
+    def find_all(self, text: str) -> List[Match]:
+        """Every (possibly overlapping) match, in order of end position."""
+        if not self._built:
+            self.build()
+        lowered = text.lower()
+        delta, out, patterns = self._delta, self._out, self._patterns
+        matches = []
+        state = 0
+        for i, ch in enumerate(lowered):
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                for index in out[state]:
+                    pattern, payload = patterns[index]
+                    start, end = i - len(pattern) + 1, i + 1
+                    if self.word_boundary and (
+                        (start > 0 and _is_word_char(lowered[start - 1]) and _is_word_char(pattern[0])) or
+                        (end < len(lowered) and _is_word_char(lowered[end]) and _is_word_char(pattern[-1]))
+                    ):
+                        continue
+                    matches.append(Match(start, end, pattern, payload))
+        return matches
+
+    def find_longest(self, text: str) -> List[Match]:
+        """Leftmost-longest, non-overlapping matches ("thika road mall" wins over "thika road")."""
+        selected = []
+        last_end = -1
+        for match in sorted(self.find_all(text), key=lambda m: (m.start, -(m.end - m.start))):
+            if match.start >= last_end:
+                selected.append(match)
+                last_end = match.end
+        return selected
+
+    def first(self, text: str) -> Optional[Match]:
+        matches = self.find_longest(text)
+        return matches[0] if matches else None
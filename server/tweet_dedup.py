@@ -0,0 +1,194 @@
+"""
+Tweet De-duplication Store for Community Shield
+Remembers which tweets were already analyzed, in constant memory and across
+restarts: an exact LRU of recent IDs, a file-backed Bloom filter for older
+ones, and the newest seen ID to pass to search_recent_tweets as since_id.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+TWEET_DEDUP_PATH = os.environ.get(
+    "TWEET_DEDUP_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "tweet_dedup.bin")
+)
+TWEET_DEDUP_LRU = int(os.environ.get("TWEET_DEDUP_LRU", "5000"))
+TWEET_DEDUP_BLOOM_CAPACITY = int(os.environ.get("TWEET_DEDUP_BLOOM_CAPACITY", "100000"))
+TWEET_DEDUP_ERROR_RATE = float(os.environ.get("TWEET_DEDUP_ERROR_RATE", "0.001"))
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, k probes by double hashing one blake2b digest."""
+
+    def __init__(self, capacity: int, error_rate: float, bits: Optional[bytearray] = None, count: int = 0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+        self.count = count
+
+    def _probes(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for bit in self._probes(key):
+            self.bits[bit >> 3] |= 1 << (bit & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[bit >> 3] & (1 << (bit & 7)) for bit in self._probes(key))
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+
+class TweetDedupStore:
+    """
+    Two Bloom generations keep memory constant: when the current one reaches
+    capacity it becomes the previous one and a fresh filter takes its place,
+    so an ID is remembered for between one and two capacities' worth of tweets.
+    A false positive (default 0.1%) skips a genuinely new tweet; nothing is
+    ever analyzed twice while it is remembered.
+    """
+
+    def __init__(self, path: Optional[str] = TWEET_DEDUP_PATH, lru_capacity: int = TWEET_DEDUP_LRU,
+                 bloom_capacity: int = TWEET_DEDUP_BLOOM_CAPACITY, error_rate: float = TWEET_DEDUP_ERROR_RATE):
+        self.path = path
+        self.lru_capacity = lru_capacity
+        self._lock = threading.Lock()
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        self._current = BloomFilter(bloom_capacity, error_rate)
+        self._previous: Optional[BloomFilter] = None
+        self.since_id: Optional[str] = None
+        self._dirty = False
+
+        # Counters
+        self.checked = 0
+        self.duplicates = 0
+        self.rotations = 0
+
+        if path and os.path.exists(path):
+            try:
+                self._load(path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Could not load tweet dedup store {path}: {e}. Starting empty.")
+
+    def seen(self, tweet_id) -> bool:
+        key = str(tweet_id)
+        with self._lock:
+            if key in self._recent:
+                self._recent.move_to_end(key)
+                return True
+            return key in self._current or (self._previous is not None and key in self._previous)
+
+    def add(self, tweet_id):
+        key = str(tweet_id)
+        with self._lock:
+            self._recent[key] = None
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.lru_capacity:
+                self._recent.popitem(last=False)
+            if self._current.full:
+                self._previous = self._current
+                self._current = BloomFilter(self._previous.capacity, self._previous.error_rate)
+                self.rotations += 1
+            self._current.add(key)
+            self._dirty = True
+
+    def filter_new(self, tweet_ids: Iterable) -> List:
+        """IDs not seen before. They are not marked: add() each once it has been handled."""
+        fresh = []
+        for tweet_id in tweet_ids:
+            self.checked += 1
+            if self.seen(tweet_id):
+                self.duplicates += 1
+                continue
+            fresh.append(tweet_id)
+        return fresh
+
+    def update_since_id(self, newest_id):
+        """Advance since_id; tweet IDs are snowflakes, so larger means newer."""
+        if newest_id is None:
+            return
+        with self._lock:
+            if self.since_id is None or int(newest_id) > int(self.since_id):
+                self.since_id = str(newest_id)
+                self._dirty = True
+
+    def reset_since_id(self):
+        with self._lock:
+            self.since_id = None
+            self._dirty = True
+
+    # --- persistence ------------------------------------------------------
+    def save(self):
+        """Write atomically (temp file + rename) if anything changed."""
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            header = {
+                "since_id": self.since_id,
+                "recent": list(self._recent),
+                "filters": [
+                    {"capacity": f.capacity, "error_rate": f.error_rate, "count": f.count, "bytes": len(f.bits)}
+                    for f in (self._current, self._previous) if f is not None
+                ],
+            }
+            blobs = [self._current.bits] + ([self._previous.bits] if self._previous is not None else [])
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(json.dumps(header).encode("utf-8") + b"\n")
+                for blob in blobs:
+                    f.write(blob)
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+    def _load(self, path: str):
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            filters = []
+            for spec in header["filters"]:
+                bits = bytearray(f.read(spec["bytes"]))
+                bloom = BloomFilter(spec["capacity"], spec["error_rate"], bits, spec["count"])
+                if len(bits) != len(bloom.bits) or len(bits) != (bloom.size + 7) // 8:
+                    raise ValueError("truncated Bloom filter")
+                filters.append(bloom)
+        self.since_id = header.get("since_id")
+        for key in header.get("recent", [])[-self.lru_capacity:]:
+            self._recent[key] = None
+        if filters:
+            self._current = filters[0]
+            self._previous = filters[1] if len(filters) > 1 else None
+
+    def stats(self) -> Dict:
+        return {
+            "recent": len(self._recent),
+            "bloom_count": self._current.count,
+            "bloom_capacity": self._current.capacity,
+            "bloom_bytes": len(self._current.bits) + (len(self._previous.bits) if self._previous else 0),
+            "since_id": self.since_id,
+            "checked": self.checked,
+            "duplicates": self.duplicates,
+            "rotations": self.rotations,
+        }
+
+
+_tweet_dedup: Optional[TweetDedupStore] = None
+
+
+def get_tweet_dedup() -> TweetDedupStore:
+    """Process-wide dedup store used by the Twitter monitor."""
+    global _tweet_dedup
+    if _tweet_dedup is None:
+        _tweet_dedup = TweetDedupStore()
+    return _tweet_dedup
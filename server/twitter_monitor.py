@@ -7,26 +7,35 @@ import os
 import asyncio
 from datetime import datetime
 from groq import Groq
-from supabase import create_client
 import json
+from typing import Awaitable, Callable, Optional
+
+import gazetteer
+from agents.hotspot_manager import get_hotspot_manager
+from incident_clusters import get_incident_clusterer
+from repository import get_repository
+from log_sink import get_log_sink
+from llm_batcher import MicroBatcher, build_batch_messages, parse_batch_response
+from rate_limits import get_rate_limiter, limited_completion
+from tweet_dedup import get_tweet_dedup
 
 # Initialize clients
 groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-supabase = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_KEY")
-)
 
 # Twitter API credentials
 TWITTER_API_KEY = os.getenv("TWITTER_API_KEY")
 TWITTER_API_SECRET = os.getenv("TWITTER_API_SECRET")
 TWITTER_BEARER_TOKEN = os.getenv("TWITTER_BEARER_TOKEN")  # Required for API v2
 
+# Search polling follows the quota Twitter reports, within these bounds (seconds)
+TWITTER_MIN_POLL_INTERVAL = float(os.getenv("TWITTER_MIN_POLL_INTERVAL", "60"))
+TWITTER_MAX_POLL_INTERVAL = float(os.getenv("TWITTER_MAX_POLL_INTERVAL", "900"))
+
 # Keywords to monitor
 SEARCH_QUERY = "(robbery OR theft OR mugging OR carjacking OR assault) (Nairobi OR CBD OR Westlands OR Kibera OR Eastleigh) -is:retweet lang:en"
 
-# Track processed tweets to avoid duplicates
-processed_tweets = set()
+# Track processed tweets to avoid duplicates (bounded LRU + Bloom filter, persisted with since_id)
+processed_tweets = get_tweet_dedup()
 
 def analyze_tweet_with_ai(tweet_text: str) -> dict:
     """Analyze tweet with Groq AI to extract incident details"""
@@ -53,7 +62,8 @@ Respond in JSON format:
 
 If not a real incident, set is_incident to false."""
 
-        response = groq_client.chat.completions.create(
+        response = limited_completion(
+            "groq", "twitter", "single", groq_client.chat.completions,
             model="llama-3.3-70b-versatile",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.3
@@ -76,32 +86,54 @@ If not a real incident, set is_incident to false."""
             return None
             
     except Exception as e:
+        # A failed call is not a verdict on the tweet: raise so it can be retried
         print(f"Error analyzing tweet: {e}")
-        return None
+        raise
+
+BATCH_TWEET_PROMPT = """Each input is a tweet that may describe a security incident in Nairobi, Kenya.
+
+For each tweet extract:
+1. Type (Theft, Robbery, Assault, Carjacking, or Other)
+2. Location (specific area in Nairobi - CBD, Westlands, Kibera, etc.)
+3. Severity (Low, Medium, High, Critical)
+4. Summary (brief 1-sentence description)
+5. Is this a real incident? (true/false)
+
+Each result object has the fields "is_incident", "type", "location", "severity" and "summary".
+If a tweet is not a real incident, set is_incident to false."""
+
+def analyze_tweets_with_ai(tweet_texts: list) -> list:
+    """Analyze several tweets with one Groq call; malformed items come back as None"""
+    response = limited_completion(
+        "groq", "twitter", "batch", groq_client.chat.completions,
+        model="llama-3.3-70b-versatile",
+        messages=build_batch_messages(BATCH_TWEET_PROMPT, tweet_texts),
+        temperature=0.3
+    )
+    results = parse_batch_response(response.choices[0].message.content, len(tweet_texts),
+                                    ("is_incident", "type", "location", "severity", "summary"))
+    # Keep non-incidents as a falsy-but-present answer so they are not retried one by one
+    return [
+        (item if item.get("is_incident") else {}) if item is not None else None
+        for item in results
+    ]
+
+tweet_batcher = MicroBatcher(analyze_tweets_with_ai, analyze_tweet_with_ai, max_items=10, name="twitter",
+                             limiter=get_rate_limiter("groq"))
 
 def get_coordinates_for_location(location: str) -> tuple:
     """Get approximate coordinates for Nairobi locations"""
-    locations = {
-        "cbd": (-1.286389, 36.817223),
-        "westlands": (-1.2674, 36.8075),
-        "kibera": (-1.3133, 36.7828),
-        "eastleigh": (-1.2833, 36.8500),
-        "karen": (-1.3197, 36.7078),
-        "parklands": (-1.2667, 36.8333),
-        "south c": (-1.3167, 36.8333),
-        "industrial area": (-1.3167, 36.8500),
-    }
-    
-    location_lower = location.lower()
-    for key, coords in locations.items():
-        if key in location_lower:
-            return coords
+    place = gazetteer.locate(location)
+    if place:
+        return (place["lat"], place["lng"])
     
     # Default to CBD if location not found
-    return (-1.286389, 36.817223)
+    cbd = gazetteer.coords("cbd")
+    return (cbd["lat"], cbd["lng"])
 
-def create_incident_from_tweet(tweet_data: dict, tweet_text: str):
-    """Create incident in Supabase from analyzed tweet"""
+async def create_incident_from_tweet(tweet_data: dict, tweet_text: str):
+    """Create incident in Supabase from analyzed tweet (raises if the write fails)"""
+    repo = get_repository()
     try:
         lat, lng = get_coordinates_for_location(tweet_data['location'])
         
@@ -114,25 +146,75 @@ def create_incident_from_tweet(tweet_data: dict, tweet_text: str):
             "severity": tweet_data['severity'],
             "source": "Twitter",
             "status": "Active",
-            "bias_score": 0.0,
-            "raw_data": tweet_text[:500]  # Store original tweet (truncated)
+            "raw_text": tweet_text[:500]  # Store original tweet (truncated)
         }
         
-        result = supabase.table("incidents").insert(incident).execute()
+        # Reports of an event already known from another source merge into its incident
+        created, merged = await get_incident_clusterer().merge_or_insert(repo, incident, tweet_text)
+        if merged:
+            get_log_sink().emit(f"🔗 Merged Twitter report into existing {tweet_data['type']} incident "
+                                f"in {tweet_data['location']}", "analysis", (created or {}).get("id"))
+            print(f"🔗 Tweet matches an existing incident: {tweet_data['summary']}")
+            return created
+        
+        get_hotspot_manager().add_incident(lat, lng, incident["severity"], created.get("created_at"))
         
         # Log the creation
         log_message = f"🐦 New incident from Twitter: {tweet_data['type']} in {tweet_data['location']}"
-        supabase.table("logs").insert({"message": log_message}).execute()
+        get_log_sink().emit(log_message)
         
         print(f"✅ Created incident from tweet: {tweet_data['summary']}")
-        return result.data[0] if result.data else None
+        return created
         
     except Exception as e:
         print(f"Error creating incident: {e}")
-        return None
+        raise
+
+def next_poll_delay() -> float:
+    """
+    Seconds until the next search: the search budget Twitter reports as left,
+    spread over its window (the longest interval until it has reported one)
+    """
+    spacing = get_rate_limiter("twitter").spacing()
+    if spacing is None:
+        return TWITTER_MAX_POLL_INTERVAL
+    return min(max(spacing, TWITTER_MIN_POLL_INTERVAL), TWITTER_MAX_POLL_INTERVAL)
 
-async def monitor_twitter():
-    """Monitor Twitter for security incidents"""
+def _search(client: tweepy.Client, **params):
+    """One recent-search call through the shared Twitter limiter (runs in a worker thread, inside admit())"""
+    with get_rate_limiter("twitter").request():
+        return client.search_recent_tweets(**params)
+
+async def process_tweet(tweet: dict):
+    """Analyze one fetched tweet ({"id", "text"}) and create or merge its incident; raises on failure"""
+    print(f"\n📱 Analyzing tweet: {tweet['text'][:100]}...")
+    # Concurrent calls share one batched completion
+    incident_data = await tweet_batcher.submit(tweet["text"])
+    if incident_data:
+        print(f"✅ Incident detected: {incident_data['type']} in {incident_data['location']}")
+        await create_incident_from_tweet(incident_data, tweet["text"])
+    else:
+        print("❌ Not a valid incident")
+
+def _advance_since_id(fetched_ids: list, failed_ids: set, newest_id):
+    """
+    Move since_id past this page, but never past a tweet that was not handed
+    off: with failures, only up to the newest fetched tweet older than all of them.
+    """
+    if not failed_ids:
+        processed_tweets.update_since_id(newest_id)
+        return
+    oldest_failed = min(int(tweet_id) for tweet_id in failed_ids)
+    older = [int(tweet_id) for tweet_id in fetched_ids if int(tweet_id) < oldest_failed]
+    if older:
+        processed_tweets.update_since_id(max(older))
+
+async def monitor_twitter(ingest: Optional[Callable[[dict], Awaitable]] = None):
+    """
+    Monitor Twitter for security incidents. With ingest (e.g. the durable
+    ingest log), new tweets are handed to it for analysis later; otherwise
+    they are analyzed here and now.
+    """
     try:
         # Check if Bearer token is configured
         if not TWITTER_BEARER_TOKEN:
@@ -140,63 +222,89 @@ async def monitor_twitter():
             print("💡 To enable: Add TWITTER_BEARER_TOKEN to .env file")
             return
         
-        # Initialize Twitter client with Bearer token
+        # Initialize Twitter client with Bearer token; every response's x-rate-limit-* headers size the limiter
         client = tweepy.Client(bearer_token=TWITTER_BEARER_TOKEN)
+        client.session.hooks["response"].append(get_rate_limiter("twitter").response_hook)
         
         print("🐦 Starting Twitter monitoring...")
         print(f"📝 Search query: {SEARCH_QUERY}")
         
         # Search for recent tweets
-        # Twitter API v2 limits: 450 requests per 15 minutes for search
-        # We poll every 15 minutes = 96 requests/day (well within limit)
-        tweets = client.search_recent_tweets(
+        # Twitter API v2 limits search (450 requests per 15 minutes on most tiers);
+        # the poll interval follows what the headers say is left (see next_poll_delay)
+        # since_id asks only for tweets newer than the last poll
+        search = dict(
             query=SEARCH_QUERY,
             max_results=10,  # Limit to 10 tweets per request (reduces noise)
             tweet_fields=['created_at', 'author_id']
         )
+        try:
+            async with get_rate_limiter("twitter").admit():
+                tweets = await asyncio.to_thread(_search, client, since_id=processed_tweets.since_id, **search)
+        except tweepy.BadRequest:
+            if processed_tweets.since_id is None:
+                raise
+            # since_id older than the 7-day search window is rejected; start over without it
+            processed_tweets.reset_since_id()
+            async with get_rate_limiter("twitter").admit():
+                tweets = await asyncio.to_thread(_search, client, **search)
         
+        newest_id = (tweets.meta or {}).get("newest_id")
         if not tweets.data:
             print("No new tweets found")
+            processed_tweets.update_since_id(newest_id)
+            processed_tweets.save()
             return
         
         print(f"Found {len(tweets.data)} tweets")
         
-        for tweet in tweets.data:
-            # Skip if already processed
-            if tweet.id in processed_tweets:
-                continue
-            
-            processed_tweets.add(tweet.id)
-            
-            print(f"\n📱 Analyzing tweet: {tweet.text[:100]}...")
-            
-            # Analyze with AI
-            incident_data = analyze_tweet_with_ai(tweet.text)
-            
-            if incident_data:
-                print(f"✅ Incident detected: {incident_data['type']} in {incident_data['location']}")
-                create_incident_from_tweet(incident_data, tweet.text)
-            else:
-                print("❌ Not a valid incident")
+        # Skip anything already processed; oldest first, so a failure stops since_id just before it
+        fetched_ids = [str(tweet.id) for tweet in tweets.data]
+        fresh_ids = set(processed_tweets.filter_new(tweet.id for tweet in tweets.data))
+        new_tweets = sorted(({"id": str(tweet.id), "text": tweet.text} for tweet in tweets.data if tweet.id in fresh_ids),
+                            key=lambda tweet: int(tweet["id"]))
+        failed_ids = set()
+        
+        if ingest is not None:
+            # Each tweet is marked seen only once handed over, so a failure or crash cannot skip it
+            for position, tweet in enumerate(new_tweets):
+                try:
+                    await ingest(tweet)
+                except Exception as e:
+                    print(f"Error queueing tweet {tweet['id']}: {e}")
+                    failed_ids = {later["id"] for later in new_tweets[position:]}
+                    break
+                processed_tweets.add(tweet["id"])
+            _advance_since_id(fetched_ids, failed_ids, newest_id)
+            processed_tweets.save()
+            print(f"📥 Queued {len(new_tweets) - len(failed_ids)} tweets for analysis")
+            return
         
-        # Keep only last 1000 tweet IDs to prevent memory issues
-        if len(processed_tweets) > 1000:
-            processed_tweets.clear()
+        # Analyze with AI (all new tweets share one batched completion)
+        results = await asyncio.gather(*(process_tweet(tweet) for tweet in new_tweets), return_exceptions=True)
+        for tweet, result in zip(new_tweets, results):
+            if isinstance(result, Exception):
+                print(f"Error processing tweet: {result}")
+                failed_ids.add(tweet["id"])
+            else:
+                processed_tweets.add(tweet["id"])
+        _advance_since_id(fetched_ids, failed_ids, newest_id)
+        processed_tweets.save()
             
     except tweepy.TooManyRequests as e:
         print(f"⚠️ Twitter rate limit exceeded. Waiting before retry...")
-        print(f"💡 This is normal - Twitter limits: 450 requests/15min")
-        # Rate limit hit - will retry on next scheduled check
+        print(f"💡 This is normal - the next poll waits for the window to reset")
+        # Rate limit hit - the limiter holds further searches until x-rate-limit-reset
     except tweepy.Unauthorized as e:
         print(f"⚠️ Twitter authentication failed. Check your Bearer Token.")
     except Exception as e:
         print(f"Error monitoring Twitter: {e}")
 
 async def start_twitter_monitoring():
-    """Start Twitter monitoring loop (runs every 15 minutes)"""
+    """Start Twitter monitoring loop (paced by the search quota, at most every 15 minutes until it is known)"""
     print("🚀 Twitter monitoring service started")
-    print("⏰ Smart rate limiting: Polling every 15 minutes")
-    print("📊 Rate limit: 450 requests/15min | Our usage: ~96 requests/day")
+    print(f"⏰ Smart rate limiting: polling every {TWITTER_MIN_POLL_INTERVAL:.0f}-{TWITTER_MAX_POLL_INTERVAL:.0f}s, "
+          f"following the x-rate-limit headers")
     
     # Wait 60 seconds before first check to avoid rate limit on startup
     print("⏳ Waiting 60 seconds before first Twitter check (prevents rate limit)...")
@@ -208,11 +316,18 @@ async def start_twitter_monitoring():
         except Exception as e:
             print(f"Error in monitoring loop: {e}")
         
-        # Wait 15 minutes before next check
-        # Twitter API v2 rate limit window is 15 minutes
-        # This ensures we stay well under the 450 requests/15min limit
-        await asyncio.sleep(900)  # 900 seconds = 15 minutes
+        # Spread what is left of the search budget over its window
+        await asyncio.sleep(next_poll_delay())
+
+async def _run_once():
+    """Run a single monitoring pass and flush its logs"""
+    sink = get_log_sink()
+    sink.start()
+    try:
+        await monitor_twitter()
+    finally:
+        await sink.stop()
 
 if __name__ == "__main__":
     # Test the monitor
-    asyncio.run(monitor_twitter())
+    asyncio.run(_run_once())
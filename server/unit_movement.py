@@ -0,0 +1,362 @@
+"""
+Unit Movement Engine for Community Shield
+Positions, speeds and route waypoints for the whole fleet live in NumPy
+arrays, and one vectorized step per tick advances every moving unit along
+its route. Arrivals turn Responding units On Scene, and after the on-scene
+time they clear back to Idle. Changed positions are handed to the state
+store (which writes them behind in bulk) once per flush interval, not per
+unit per tick.
+"""
+import asyncio
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from metrics import get_metrics
+from spatial_index import KM_PER_DEG_LAT
+from state_store import StateStore, UnitState
+
+# Movement settings (override via .env)
+UNIT_MOVEMENT_ENABLED = os.environ.get("UNIT_MOVEMENT_ENABLED", "1") != "0"
+UNIT_SPEED_KMH = float(os.environ.get("UNIT_SPEED_KMH", "40"))
+UNIT_TYPE_SPEEDS_KMH = {"Rapid Response": 60.0}
+ON_SCENE_SECONDS = float(os.environ.get("UNIT_ON_SCENE_SECONDS", "600"))
+MOVEMENT_TICK_SECONDS = float(os.environ.get("MOVEMENT_TICK_SECONDS", "1.0"))
+MOVEMENT_TIME_SCALE = float(os.environ.get("MOVEMENT_TIME_SCALE", "1.0"))  # Simulated seconds per real second
+MOVEMENT_FLUSH_INTERVAL = float(os.environ.get("MOVEMENT_FLUSH_INTERVAL", "5.0"))
+MOVEMENT_FLUSH_BATCH = int(os.environ.get("MOVEMENT_FLUSH_BATCH", "500"))
+MOVEMENT_SYNC_INTERVAL = float(os.environ.get("MOVEMENT_SYNC_INTERVAL", "5.0"))  # Cluster mode only
+
+# Codes held in the status array; Patrolling units are tracked but not advanced
+IDLE, RESPONDING, ON_SCENE, PATROLLING = 0, 1, 2, 3
+STATUS_NAMES = ("Idle", "Responding", "On Scene", "Patrolling")
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+
+STEP_SECONDS = get_metrics().histogram("unit_movement_step_duration_seconds", "Time to advance the whole fleet one tick")
+
+Waypoint = Sequence[float]  # (lat, lng)
+
+
+class UnitMovementEngine:
+    """
+    Row i of every array is one unit. Python only loops over units when
+    they change status or are written back, never per tick.
+    """
+
+    def __init__(self, state: StateStore, log: Optional[Callable] = None, capacity: int = 64,
+                 max_waypoints: int = 8, on_scene_seconds: float = ON_SCENE_SECONDS,
+                 tick: float = MOVEMENT_TICK_SECONDS, time_scale: float = MOVEMENT_TIME_SCALE,
+                 flush_interval: float = MOVEMENT_FLUSH_INTERVAL, flush_batch: int = MOVEMENT_FLUSH_BATCH):
+        self.state = state
+        self.log = log
+        self.on_scene_seconds = on_scene_seconds
+        self.tick = tick
+        self.time_scale = time_scale
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+
+        self.count = 0
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.incident_ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self.lat = np.zeros(capacity)
+        self.lng = np.zeros(capacity)
+        self.speed = np.zeros(capacity)                       # km per simulated second
+        self.status = np.zeros(capacity, dtype=np.int8)
+        self.dwell = np.zeros(capacity)                       # On-scene seconds left
+        self.waypoints = np.zeros((capacity, max_waypoints, 2))
+        self.route_len = np.zeros(capacity, dtype=np.int32)
+        self.next_wp = np.zeros(capacity, dtype=np.int32)     # Waypoint being driven to
+        self.dirty = np.zeros(capacity, dtype=bool)
+
+        self._task: Optional[asyncio.Task] = None
+        self._sync_task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.ticks = 0
+        self.dispatched = 0
+        self.arrivals = 0
+        self.cleared = 0
+        self.flushes = 0
+        self.published = 0
+        self.adopted = 0
+        self.last_step_ms = 0.0
+
+    # --- fleet ----------------------------------------------------------
+    def _grow(self, capacity: int):
+        def grown(array):
+            bigger = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            bigger[:self.count] = array[:self.count]
+            return bigger
+
+        for name in ("lat", "lng", "speed", "status", "dwell", "waypoints", "route_len", "next_wp", "dirty"):
+            setattr(self, name, grown(getattr(self, name)))
+
+    def _widen(self, width: int):
+        wider = np.zeros((len(self.waypoints), width, 2))
+        wider[:, :self.waypoints.shape[1]] = self.waypoints
+        self.waypoints = wider
+
+    def add_units(self, rows: List[Dict]):
+        """Track unit rows (as held by the state store); known ids are skipped."""
+        new = [row for row in rows if str(row["id"]) not in self._rows]
+        if not new:
+            return
+        if self.count + len(new) > len(self.lat):
+            self._grow(max(2 * len(self.lat), self.count + len(new)))
+        for row in new:
+            i = self.count
+            unit_id = str(row["id"])
+            self._rows[unit_id] = i
+            self.ids.append(unit_id)
+            self.names.append(row.get("name") or unit_id)
+            self.incident_ids.append(row.get("current_incident_id"))
+            self.lat[i], self.lng[i] = float(row["lat"]), float(row["lng"])
+            self.speed[i] = UNIT_TYPE_SPEEDS_KMH.get(row.get("type"), UNIT_SPEED_KMH) / 3600
+            self.status[i] = STATUS_CODES.get(row.get("status"), IDLE)
+            self.dwell[i] = self.on_scene_seconds if self.status[i] == ON_SCENE else 0.0
+            self.route_len[i] = self.next_wp[i] = 0
+            self.count += 1
+
+    async def warm(self):
+        """Load the fleet from the state store; units still Responding pick their routes back up."""
+        await self.state.ready()
+        self.add_units(self.state.unit_rows())
+        for i in np.nonzero(self.status[:self.count] == RESPONDING)[0].tolist():
+            incident = self.state.incident(self.incident_ids[i]) if self.incident_ids[i] else None
+            if incident is not None and incident.lat is not None and incident.lng is not None:
+                self.dispatch(self.ids[i], incident.id, incident.lat, incident.lng)
+
+    def dispatch(self, unit_id: str, incident_id: str, lat: float, lng: float,
+                 route: Optional[List[Waypoint]] = None) -> bool:
+        """
+        Send a unit to (lat, lng) along route's waypoints, or in a straight
+        line without one. Returns False for an unknown unit.
+        """
+        i = self._rows.get(unit_id)
+        if i is None:
+            return False
+        waypoints = [tuple(point) for point in (route or [])] + [(lat, lng)]
+        if len(waypoints) > self.waypoints.shape[1]:
+            self._widen(max(2 * self.waypoints.shape[1], len(waypoints)))
+        self.waypoints[i, :len(waypoints)] = waypoints
+        self.route_len[i] = len(waypoints)
+        self.next_wp[i] = 0
+        self.status[i] = RESPONDING
+        self.dirty[i] = True
+        self.incident_ids[i] = incident_id
+        self.dispatched += 1
+        return True
+
+    def position(self, unit_id: str) -> Optional[Tuple[float, float]]:
+        i = self._rows.get(unit_id)
+        return None if i is None else (float(self.lat[i]), float(self.lng[i]))
+
+    def route(self, unit_id: str) -> List[List[float]]:
+        """Remaining waypoints, starting from the unit's current position."""
+        i = self._rows.get(unit_id)
+        if i is None:
+            return []
+        remaining = self.waypoints[i, self.next_wp[i]:self.route_len[i]].tolist()
+        return [[float(self.lat[i]), float(self.lng[i])]] + remaining if remaining else []
+
+    # --- simulation -----------------------------------------------------
+    def step(self, dt: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Advance every unit by dt simulated seconds.
+        Returns the rows that arrived on scene and the rows that cleared back to Idle.
+        """
+        n = self.count
+        status, lat, lng = self.status[:n], self.lat[:n], self.lng[:n]
+
+        # On-scene clocks run down first, so a unit arriving this tick spends the full time on scene
+        scene = np.nonzero(status == ON_SCENE)[0]
+        self.dwell[scene] -= dt
+        cleared = scene[self.dwell[scene] <= 0]
+        status[cleared] = IDLE
+
+        # Each moving unit spends speed * dt km, passing as many waypoints as that covers.
+        # Distances are equirectangular: exact enough across a city and cheap to vectorize.
+        rows = np.nonzero((status == RESPONDING) & (self.next_wp[:n] < self.route_len[:n]))[0]
+        self.dirty[rows] = True
+        budget = self.speed[rows] * dt
+        while rows.size:
+            target = self.waypoints[rows, self.next_wp[rows]]
+            dlat = target[:, 0] - lat[rows]
+            dlng = target[:, 1] - lng[rows]
+            dist = KM_PER_DEG_LAT * np.hypot(dlat, dlng * np.cos(np.radians(lat[rows])))
+            reach = dist <= budget
+
+            short = rows[~reach]
+            fraction = budget[~reach] / dist[~reach]
+            lat[short] += dlat[~reach] * fraction
+            lng[short] += dlng[~reach] * fraction
+
+            rows, budget = rows[reach], budget[reach] - dist[reach]
+            lat[rows], lng[rows] = target[reach, 0], target[reach, 1]
+            self.next_wp[rows] += 1
+            more = self.next_wp[rows] < self.route_len[rows]
+            rows, budget = rows[more], budget[more]
+
+        arrived = np.nonzero((status == RESPONDING) & (self.route_len[:n] > 0)
+                             & (self.next_wp[:n] >= self.route_len[:n]))[0]
+        status[arrived] = ON_SCENE
+        self.dwell[arrived] = self.on_scene_seconds
+        self.route_len[arrived] = 0
+        self.dirty[cleared] = True
+        self.arrivals += len(arrived)
+        self.cleared += len(cleared)
+        return arrived, cleared
+
+    def _transition(self, arrived: np.ndarray, cleared: np.ndarray):
+        """Per-unit side effects of status changes: logs, the state store and incident resolution."""
+        for i in arrived.tolist():
+            if self.log is not None:
+                self.log(f"🚓 {self.names[i]} on scene", "dispatch", self.incident_ids[i], self.ids[i])
+        resolved = []
+        for i in cleared.tolist():
+            if self.log is not None:
+                self.log(f"✅ {self.names[i]} cleared the scene and is available", "dispatch",
+                         self.incident_ids[i], self.ids[i])
+            if self.incident_ids[i]:
+                resolved.append(self.incident_ids[i])
+            self.incident_ids[i] = None
+
+        # Publish the status changes now instead of waiting for the next position flush
+        if len(arrived) or len(cleared):
+            self.flush(np.concatenate([arrived, cleared]))
+        for incident_id in resolved:
+            self.state.update_incident(incident_id, {"status": "Resolved"})
+
+    # --- persistence ----------------------------------------------------
+    def flush(self, rows: Optional[np.ndarray] = None):
+        """Hand up to one batch of changed units (or the given rows) to the state store."""
+        if rows is None:
+            rows = np.nonzero(self.dirty[:self.count])[0][:self.flush_batch]
+        if not len(rows):
+            return
+        self.dirty[rows] = False
+        self.state.update_units((
+            {"id": self.ids[i], "status": STATUS_NAMES[status], "lat": round(lat, 7), "lng": round(lng, 7),
+             "current_incident_id": self.incident_ids[i]}
+            for i, status, lat, lng in zip(rows.tolist(), self.status[rows].tolist(),
+                                           self.lat[rows].tolist(), self.lng[rows].tolist())
+        ), origin=self)
+        self.flushes += 1
+        self.published += len(rows)
+
+    def flush_all(self):
+        while self.dirty[:self.count].any():
+            self.flush()
+
+    def on_unit_change(self, unit: UnitState, origin):
+        """
+        State store watcher: pick up new units and status changes made
+        elsewhere (a dispatch, a reset to Idle). Our own updates are skipped.
+        """
+        if origin is self:
+            return
+        i = self._rows.get(unit.id)
+        if i is None:
+            self.add_units([unit.row()])
+            return
+        status = STATUS_CODES.get(unit.status)
+        if status is None or status == self.status[i]:
+            return
+        self.status[i] = status
+        self.incident_ids[i] = unit.current_incident_id
+        if status == ON_SCENE:
+            self.dwell[i] = self.on_scene_seconds
+        elif status != RESPONDING:
+            # Taken off its route: the store's position is the unit's position
+            self.route_len[i] = self.next_wp[i] = 0
+            self.lat[i], self.lng[i] = unit.lat, unit.lng
+
+    # --- background ticking ---------------------------------------------
+    async def _run(self):
+        last = last_flush = time.perf_counter()
+        while True:
+            await asyncio.sleep(self.tick)
+            now = time.perf_counter()
+            arrived, cleared = self.step((now - last) * self.time_scale)
+            last = now
+            self.ticks += 1
+            self.last_step_ms = (time.perf_counter() - now) * 1000
+            STEP_SECONDS.observe(self.last_step_ms / 1000)
+            try:
+                self._transition(arrived, cleared)
+                if now - last_flush >= self.flush_interval:
+                    last_flush = now
+                    self.flush_all()
+            except Exception as e:
+                print(f"Error moving units: {e}")
+
+    async def sync(self, repo) -> int:
+        """
+        Adopt units dispatched by other processes, which this process's state
+        store never hears about: Responding units are read back from the
+        database and those not already on a route here drive straight to
+        their incident. Returns how many were adopted.
+        """
+        rows = await repo.list_units(status="Responding")
+        self.state.refresh("units", rows)
+        waiting = {}
+        for row in rows:
+            i = self._rows.get(str(row["id"]))
+            if i is not None and row.get("current_incident_id") and self.status[i] == RESPONDING \
+                    and self.route_len[i] == 0:
+                waiting[str(row["id"])] = str(row["current_incident_id"])
+        if not waiting:
+            return 0
+        incidents = await repo.list_incidents(limit=len(waiting), ids=list(set(waiting.values())),
+                                              columns="id,lat,lng")
+        targets = {str(row["id"]): row for row in incidents if row.get("lat") is not None}
+        adopted = 0
+        for unit_id, incident_id in waiting.items():
+            incident = targets.get(incident_id)
+            if incident is not None and self.dispatch(unit_id, incident_id, incident["lat"], incident["lng"]):
+                adopted += 1
+        self.adopted += adopted
+        return adopted
+
+    async def _run_sync(self, repo, interval: float):
+        while True:
+            try:
+                await self.sync(repo)
+            except Exception as e:
+                print(f"Error syncing dispatched units: {e}")
+            await asyncio.sleep(interval)
+
+    def start(self, repo=None, sync_interval: float = MOVEMENT_SYNC_INTERVAL):
+        """Start ticking; with repo, also adopt other processes' dispatches every sync_interval."""
+        self._task = asyncio.create_task(self._run(), name="unit-movement")
+        if repo is not None:
+            self._sync_task = asyncio.create_task(self._run_sync(repo, sync_interval), name="unit-sync")
+
+    async def stop(self):
+        """Stop ticking and hand every unpublished position to the state store."""
+        for task in (self._task, self._sync_task):
+            if task:
+                task.cancel()
+        await asyncio.gather(*(task for task in (self._task, self._sync_task) if task), return_exceptions=True)
+        self._task = self._sync_task = None
+        self.flush_all()
+
+    def stats(self) -> Dict:
+        counts = np.bincount(self.status[:self.count], minlength=len(STATUS_NAMES))
+        return {
+            "units": self.count,
+            **{name: int(count) for name, count in zip(STATUS_NAMES, counts)},
+            "ticks": self.ticks,
+            "last_step_ms": round(self.last_step_ms, 3),
+            "dispatched": self.dispatched,
+            "arrivals": self.arrivals,
+            "cleared": self.cleared,
+            "unpublished": int(self.dirty[:self.count].sum()),
+            "flushes": self.flushes,
+            "published": self.published,
+            "adopted": self.adopted,
+        }
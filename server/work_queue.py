@@ -0,0 +1,168 @@
+"""
+Shared Work Queue for Community Shield
+In cluster mode the leader's producers write raw reports to the work_queue
+table instead of feeding only their own pipeline. Every worker claims small
+batches from the table (FOR UPDATE SKIP LOCKED, so claims never wait on each
+other) and hands them to its local pipeline, which spreads Analyst and
+BiasGuard load across all workers. A claim is a lease: an item is deleted
+only once the pipeline is done with it, so items held by a worker that
+dies, or whose handling fails, become claimable again once it runs out.
+The lease is renewed while an item is still being handled. Items that fail
+on their last attempt are moved to the work_dead_letter table.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from leader import WORKER_ID
+from repository import get_repository
+
+WORK_QUEUE_BATCH = int(os.environ.get("WORK_QUEUE_BATCH", "20"))
+WORK_QUEUE_POLL_INTERVAL = float(os.environ.get("WORK_QUEUE_POLL_INTERVAL", "1"))
+WORK_QUEUE_LEASE_SECONDS = float(os.environ.get("WORK_QUEUE_LEASE_SECONDS", "60"))
+WORK_QUEUE_MAX_ATTEMPTS = int(os.environ.get("WORK_QUEUE_MAX_ATTEMPTS", "5"))
+
+Handler = Callable[[Dict], Awaitable[Any]]
+
+
+class WorkQueue:
+    """
+    Producer and consumer side of the work_queue table. Handlers are
+    registered per item kind and a claimed batch is handled concurrently; an
+    item is deleted once its handler returns, and left to be claimed again
+    (up to max_attempts) if it raises; after that it is dead-lettered. room,
+    if given, caps each claim at what the local pipeline can take without
+    waiting, so a busy worker leaves items for idle ones.
+    """
+
+    def __init__(self, repo=None, worker_id: str = WORKER_ID, room: Optional[Callable[[], int]] = None,
+                 batch: int = WORK_QUEUE_BATCH, poll_interval: float = WORK_QUEUE_POLL_INTERVAL,
+                 lease_seconds: float = WORK_QUEUE_LEASE_SECONDS, max_attempts: int = WORK_QUEUE_MAX_ATTEMPTS):
+        self.repo = repo or get_repository()
+        self.worker_id = worker_id
+        self.room = room
+        self.batch = batch
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.handlers: Dict[str, Handler] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._swept_at = 0.0
+
+        # Counters
+        self.enqueued = 0
+        self.claimed = 0
+        self.completed = 0
+        self.failed = 0
+        self.renewed = 0
+        self.dead_lettered = 0
+
+    def handle(self, kind: str, handler: Handler):
+        self.handlers[kind] = handler
+
+    async def put(self, kind: str, payload: Dict):
+        """Queue one item for whichever worker claims it first."""
+        await self.repo.enqueue_work([{"kind": kind, "payload": payload}])
+        self.enqueued += 1
+
+    async def poll(self) -> int:
+        """Claim and handle one batch; returns how many items were claimed."""
+        limit = self.batch if self.room is None else min(self.batch, self.room())
+        if limit <= 0:
+            return 0
+        items = await self.repo.claim_work(self.worker_id, limit, self.lease_seconds, self.max_attempts)
+        self.claimed += len(items)
+        if not items:
+            await self._sweep()
+            return 0
+
+        pending = {item["id"] for item in items}
+
+        async def handle(item: Dict) -> Optional[Exception]:
+            try:
+                return await self._handle(item)
+            finally:
+                pending.discard(item["id"])
+
+        renewal = asyncio.create_task(self._renew(pending), name="work-queue-renew")
+        try:
+            errors = await asyncio.gather(*(handle(item) for item in items))
+        finally:
+            renewal.cancel()
+            await asyncio.gather(renewal, return_exceptions=True)
+
+        done = [item["id"] for item, error in zip(items, errors) if error is None]
+        if done:
+            self.completed += await self.repo.complete_work(self.worker_id, done)
+        for item, error in zip(items, errors):
+            if error is not None and item["attempts"] >= self.max_attempts:
+                self.dead_lettered += await self.repo.dead_letter_work(self.worker_id, [item["id"]], str(error),
+                                                                       self.max_attempts)
+        return len(items)
+
+    async def _handle(self, item: Dict) -> Optional[Exception]:
+        """Run the item's handler; returns the error if it failed."""
+        handler = self.handlers.get(item["kind"])
+        try:
+            if handler is None:
+                raise ValueError(f"no handler for {item['kind']!r}")
+            await handler(item["payload"])
+            return None
+        except Exception as e:
+            self.failed += 1
+            print(f"Error handling work item {item['id']} (attempt {item['attempts']}): {e}")
+            return e
+
+    async def _renew(self, pending: set):
+        """Keep extending the lease on items still being handled, well before it runs out."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not pending:
+                continue
+            try:
+                self.renewed += await self.repo.renew_work(self.worker_id, list(pending), self.lease_seconds)
+            except Exception as e:
+                print(f"Error renewing work queue leases: {e}")
+
+    async def _sweep(self):
+        """
+        While idle, dead-letter items whose last attempt ran out its lease (the
+        worker died). They only appear once a lease expires, so once per lease.
+        """
+        now = time.monotonic()
+        if now - self._swept_at < self.lease_seconds:
+            return
+        self._swept_at = now
+        self.dead_lettered += await self.repo.dead_letter_work(self.worker_id, [], "", self.max_attempts)
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await self.poll()
+            except Exception as e:
+                print(f"Error polling work queue: {e}")
+                claimed = 0
+            # A full batch means there is probably more waiting
+            if claimed < self.batch:
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="work-queue")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "worker": self.worker_id,
+            "enqueued": self.enqueued,
+            "claimed": self.claimed,
+            "completed": self.completed,
+            "failed": self.failed,
+            "renewed": self.renewed,
+            "dead_lettered": self.dead_lettered,
+        }